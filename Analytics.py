@@ -0,0 +1,77 @@
+from collections import namedtuple
+import numpy as np
+"""
+Vectorized book analytics over the arrays exported by OrderBook.depthArrays
+
+Every function takes the price and size arrays of one side ordered best first (bids
+descending, asks ascending), so the same function serves both sides. Quantities are in
+the base currency (e.g. BTC) and notionals in the quote currency (e.g. USD).
+"""
+
+# outcome of walking one side of the book, averagePrice is nan when nothing was filled
+Fill = namedtuple("Fill", ["quantity", "notional", "averagePrice", "levels", "complete"])
+
+def cumulativeDepth(prices, sizes):
+    """
+    returns the cumulative size and cumulative notional at each level
+
+    :param prices: the level prices of one side, best first
+    :param sizes: the level sizes of one side, best first
+    :return: tuple of (cumulative sizes, cumulative notionals) arrays
+    """
+    return np.cumsum(sizes), np.cumsum(prices * sizes)
+
+def imbalance(bidSizes, askSizes, levels=None):
+    """
+    returns the order book imbalance (bid - ask) / (bid + ask) over the top levels,
+    +1 when only bids rest, -1 when only asks rest and 0 for an empty book
+
+    :param bidSizes: the bid level sizes, best first
+    :param askSizes: the ask level sizes, best first
+    :param levels: the number of levels per side to include, all of them when None
+    """
+    bid = float(np.sum(bidSizes[:levels]))
+    ask = float(np.sum(askSizes[:levels]))
+    total = bid + ask
+    return 0.0 if total == 0 else (bid - ask) / total
+
+def _fill(prices, sizes, cumulative, target, byNotional):
+    # walks the levels until the cumulative column reaches target, the level where
+    # it is crossed is filled partially
+    index = int(np.searchsorted(cumulative, target, side="left"))
+    if index >= len(prices):
+        quantity = float(np.sum(sizes))
+        notional = float(np.dot(prices, sizes))
+        levels, complete = len(prices), False
+    else:
+        quantity = float(np.sum(sizes[:index]))
+        notional = float(np.dot(prices[:index], sizes[:index]))
+        rest = target - (notional if byNotional else quantity)
+        partial = rest / prices[index] if byNotional else rest
+        quantity += partial
+        notional += partial * prices[index]
+        levels, complete = index + 1, True
+    averagePrice = notional / quantity if quantity else float("nan")
+    return Fill(quantity, notional, averagePrice, levels, complete)
+
+def sweepCost(prices, sizes, quantity):
+    """
+    returns the Fill of a market order for a quantity swept through one side of the book,
+    complete is False when the side holds less than the quantity
+
+    :param prices: the level prices of the side taken from, best first
+    :param sizes: the level sizes of the side taken from, best first
+    :param quantity: the base quantity to sweep
+    """
+    return _fill(prices, sizes, np.cumsum(sizes), quantity, False)
+
+def vwapForNotional(prices, sizes, notional):
+    """
+    returns the Fill of a market order spending a notional on one side of the book,
+    its averagePrice is the volume weighted average price paid
+
+    :param prices: the level prices of the side taken from, best first
+    :param sizes: the level sizes of the side taken from, best first
+    :param notional: the quote amount to spend
+    """
+    return _fill(prices, sizes, np.cumsum(prices * sizes), notional, True)
@@ -0,0 +1,71 @@
+import argparse
+import gc
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Publisher import BookPublisher
+from SyntheticFeed import SyntheticFeed
+"""
+Batch ingestion benchmark
+
+Applies the same parsed messages to a fresh OrderBook once through a processMessage
+loop and once through processBatch in chunks, with a publisher attached so listener
+notification cost is included. Reports messages per second for both.
+
+Usage:
+    python BatchBenchmark.py --messages 500000 --batch 1000
+"""
+
+def perMessage(orders, batchSize):
+    book = OrderBook()
+    BookPublisher(book, interval=None, everyN=1000)
+    processMessage = book.processMessage
+    for order in orders:
+        if order is not None:
+            processMessage(order)
+    return book
+
+def batched(orders, batchSize):
+    book = OrderBook()
+    BookPublisher(book, interval=None, everyN=1000)
+    for start in range(0, len(orders), batchSize):
+        book.processBatch(orders[start:start + batchSize])
+    return book
+
+def throughput(fn, orders, batchSize, repeat):
+    """
+    returns the best messages per second of repeat runs and the resulting book
+    """
+    best = 0
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            book = fn(orders, batchSize)
+            best = max(best, len(orders) / (time.perf_counter() - start))
+    finally:
+        gc.enable()
+    return best, book
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="processBatch vs processMessage benchmark")
+    parser.add_argument("--messages", type=int, default=300000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mp = MessageParser()
+    orders = [mp.parseRaw(frame) for frame in SyntheticFeed().frames(args.messages)]
+
+    before, single = throughput(perMessage, orders, args.batch, args.repeat)
+    after, batch = throughput(batched, orders, args.batch, args.repeat)
+    assert single.depth(10) == batch.depth(10)
+    print(f"messages: {len(orders)}, batch size: {args.batch}")
+    print(f"processMessage loop: {before: >10.0f} msg/s")
+    print(f"processBatch:        {after: >10.0f} msg/s")
+    print(f"speedup: {after / before: .2f}x")
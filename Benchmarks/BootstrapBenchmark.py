@@ -0,0 +1,54 @@
+import argparse
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from Bootstrap import loadSnapshot
+from MessageParser import MessageParser
+from OrderBook import OrderBook, Order
+from SyntheticFeed import SyntheticFeed
+"""
+Snapshot load benchmark
+
+Loads a synthetic level 3 snapshot once through the bulk load path and once by
+sending an open message per order through processMessage, and reports the time
+each one takes.
+
+Usage:
+    python BootstrapBenchmark.py --orders 200000
+"""
+
+def perOrder(parser, snapshot):
+    book = OrderBook()
+    sequence = snapshot["sequence"]
+    for side, key in ((1, "bids"), (0, "asks")):
+        for price, size, iden in snapshot[key]:
+            book.processMessage(Order("open", iden, parser.toPrice(price), parser.toSize(size), side, sequence))
+    return book
+
+def bulk(parser, snapshot):
+    book = OrderBook()
+    loadSnapshot(book, parser, snapshot)
+    return book
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="level 3 snapshot load benchmark")
+    parser.add_argument("--orders", type=int, default=200000)
+    args = parser.parse_args()
+
+    # grow a feed until it rests the requested number of orders
+    feed = SyntheticFeed(levels=2000, target=2 * args.orders)
+    while len(feed.orders) < args.orders:
+        feed._open()
+    snapshot = feed.snapshot()
+    mp = MessageParser()
+
+    results = []
+    for name, fn in (("addOrder per order", perOrder), ("bulkLoad", bulk)):
+        start = time.perf_counter()
+        book = fn(mp, snapshot)
+        results.append(book.depth(10))
+        print(f"{name: <20} {time.perf_counter() - start: >7.3f} s for {len(book.orderBook)} orders")
+    assert results[0] == results[1]
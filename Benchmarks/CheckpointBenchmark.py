@@ -0,0 +1,106 @@
+import argparse
+import os
+import tempfile
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager, checkpointPath
+from Bootstrap import loadSnapshot
+from Checkpoint import Checkpointer
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import FeedRecorder
+from SyntheticFeed import SyntheticFeed
+"""
+Checkpoint benchmark
+
+Builds a book from a synthetic level 3 snapshot, then reports the time to write and
+load a binary checkpoint of it, the size of the file, and how long the processing
+thread is held up when a background checkpoint is started (fork and thread modes).
+Then records --frames frames of two products to a capture and times a warm start of
+both from checkpoints taken at the end of the capture (nothing to replay) and half way
+through it, against loading the checkpoints alone.
+
+Usage:
+    python CheckpointBenchmark.py --orders 200000 --frames 300000
+"""
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="binary checkpoint benchmark")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--frames", type=int, default=300000)
+    args = parser.parse_args()
+
+    feed = SyntheticFeed(levels=2000, target=2 * args.orders)
+    while len(feed.orders) < args.orders:
+        feed._open()
+    snapshot = feed.snapshot()
+    mp = MessageParser()
+    book = OrderBook()
+    start = time.perf_counter()
+    loadSnapshot(book, mp, snapshot)
+    print(f"level 3 snapshot load   {time.perf_counter() - start: >7.3f} s for {len(book.orderBook)} orders")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.ckpt")
+        start = time.perf_counter()
+        book.save_snapshot(path)
+        print(f"save_snapshot           {time.perf_counter() - start: >7.3f} s, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        restored = OrderBook()
+        start = time.perf_counter()
+        restored.load_snapshot(path)
+        print(f"load_snapshot           {time.perf_counter() - start: >7.3f} s")
+        assert restored.depth(10) == book.depth(10)
+
+        for useFork in ((True, False) if hasattr(os, "fork") else (False,)):
+            checkpointer = Checkpointer(book, path, interval=0.0, useFork=useFork)
+            start = time.perf_counter()
+            checkpointer.checkpoint()
+            pause = time.perf_counter() - start
+            checkpointer.wait()
+            print(f"background ({'fork' if useFork else 'thread'}) pause {pause * 1000: >7.1f} ms, "
+                  f"done after {time.perf_counter() - start: .3f} s")
+
+        # warm start: checkpoints of two products plus the capture recorded around them
+        products = ["BTC-USD", "ETH-USD"]
+        # fixed-point books, so the restored level totals match the live ones exactly
+        specs = {productId: ProductSpec(productId, "0.01", "0.00000001") for productId in products}
+        feeds = [SyntheticFeed(productId, seed=index + 1).frames(args.frames // 2) for index, productId in enumerate(products)]
+        frames = [raw for pair in zip(*feeds) for raw in pair]
+        reference = BookManager(products, specs)
+        for raw in frames:
+            reference.onFrame(raw)
+        for label, count in (("nothing to replay", len(frames)), ("half to replay", len(frames) // 2)):
+            capture = os.path.join(directory, f"capture{count}.bin")
+            live = BookManager(products, specs)
+            with FeedRecorder(capture) as recorder:
+                for raw in frames[:count]:
+                    recorder.record(raw)
+                    live.onFrame(raw)
+                for productId in products:
+                    live.book(productId).save_snapshot(checkpointPath(directory, productId), recorder.offset())
+                for raw in frames[count:]:
+                    recorder.record(raw)
+
+            start = time.perf_counter()
+            BookManager(products, specs).warmStart(directory)
+            loadOnly = time.perf_counter() - start
+            start = time.perf_counter()
+            manager = BookManager(products, specs)
+            manager.warmStart(directory, capture)
+            warm = time.perf_counter() - start
+            for productId in products:
+                assert manager.book(productId).depth(50) == reference.book(productId).depth(50)
+            # the same checkpoints without their offset scan the capture from the start
+            for productId in products:
+                live.book(productId).save_snapshot(checkpointPath(directory, productId))
+            start = time.perf_counter()
+            BookManager(products, specs).warmStart(directory, capture)
+            scan = time.perf_counter() - start
+            print(f"warm start, {label: <17} {warm: >7.3f} s from the capture offset, {scan:.3f} s scanning"
+                  f" {len(frames)} frames ({loadOnly:.3f} s loading the checkpoints)")
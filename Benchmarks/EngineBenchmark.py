@@ -0,0 +1,95 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook, sortedSide
+from Replay import readCapture
+from ReplayBenchmark import syntheticCapture
+from TickLadder import ladderEngine
+"""
+Book engine benchmark
+
+Parses a capture once, then applies the same orders to books built on the SortedDict
+engine and on the tick ladder engine, in float and fixed-point mode, and reports orders
+per second for processMessage plus the cost of a best bid/ask read and of depth(10).
+The books are checked to agree at the end. Without a capture a synthetic feed is
+recorded first, so the benchmark runs offline.
+
+Usage:
+    python EngineBenchmark.py --capture capture.bin.gz --product BTC-USD
+    python EngineBenchmark.py --messages 500000 --width 4096
+"""
+
+def apply(orders, spec, engine, repeat):
+    """
+    applies the orders to a fresh book repeat times
+
+    :return: (the last book, best orders per second)
+    """
+    best = None
+    for _ in range(repeat):
+        book = OrderBook(spec, engine)
+        processMessage = book.processMessage
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for order in orders:
+                processMessage(order)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return book, len(orders) / best
+
+def readCost(fn, count=20000):
+    """
+    returns the best per call time of fn in nanoseconds
+    """
+    best = None
+    for _ in range(5):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SortedDict vs tick ladder book engine benchmark")
+    parser.add_argument("--capture", help="capture file, a synthetic one is recorded when omitted")
+    parser.add_argument("--product", default="BTC-USD")
+    parser.add_argument("--messages", type=int, default=300000)
+    parser.add_argument("--width", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    productSpec = ProductSpec(args.product, "0.01", "0.00000001")
+
+    with tempfile.TemporaryDirectory() as directory:
+        capture = args.capture
+        if capture is None:
+            capture = os.path.join(directory, "synthetic.bin")
+            syntheticCapture(capture, args.messages)
+        frames = [raw for _, raw in readCapture(capture)]
+
+    for spec in (None, productSpec):
+        mp = MessageParser(spec)
+        orders = [order for order in map(mp.parseRaw, frames) if order is not None and order.product == args.product]
+        engines = (("sorted", sortedSide), ("ladder", ladderEngine(0.01 if spec is None else None, args.width, spec)))
+        books = []
+        print(f"{'fixed-point' if spec else 'float'} book, {len(orders)} orders")
+        for name, engine in engines:
+            book, rate = apply(orders, spec, engine, args.repeat)
+            books.append(book)
+            print(f"  {name: <7} {rate: >9.0f} orders/s  best bid+ask {readCost(lambda: (book.best_bid(), book.best_ask())): >5.0f} ns"
+                  f"  depth(10) {readCost(lambda: book.depth(10)): >6.0f} ns")
+        assert books[0].depth(50) == books[1].depth(50)
+        recentres = books[1].buyLimits.recentres + books[1].askLimits.recentres
+        print(f"  ladder recentres: {recentres}")
@@ -0,0 +1,73 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from EventLog import EventLog, convertCapture, np
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import readCapture
+from ReplayBenchmark import syntheticCapture
+"""
+Event log replay benchmark
+
+Replays the same feed once from a JSON capture (parseRaw + processMessage) and once
+from the converted binary event log, and reports messages per second for both.
+
+Usage:
+    python EventLogBenchmark.py --capture capture.bin.gz --product BTC-USD
+    python EventLogBenchmark.py --messages 500000
+"""
+
+def timed(fn):
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON capture vs binary event log replay benchmark")
+    parser.add_argument("--capture", help="capture file, a synthetic one is recorded when omitted")
+    parser.add_argument("--product", default="BTC-USD")
+    parser.add_argument("--messages", type=int, default=300000)
+    args = parser.parse_args()
+    spec = ProductSpec(args.product, "0.01", "0.00000001")
+
+    with tempfile.TemporaryDirectory() as directory:
+        capture = args.capture
+        if capture is None:
+            capture = os.path.join(directory, "synthetic.bin")
+            syntheticCapture(capture, args.messages)
+        logPath = os.path.join(directory, "events.bin")
+        events, convertTime = timed(lambda: convertCapture(capture, logPath, spec, args.product))
+
+        def jsonReplay():
+            mp = MessageParser(spec)
+            book = OrderBook(spec)
+            for _, raw in readCapture(capture):
+                order = mp.parseRaw(raw)
+                if order is not None and order.product == args.product:
+                    book.processMessage(order)
+            return book
+
+        jsonBook, jsonTime = timed(jsonReplay)
+        print(f"events: {events} (converted in {convertTime:.2f} s)")
+        print(f"json capture replay: {events / jsonTime: >10.0f} events/s")
+
+        for useNumpy in (False, True):
+            if useNumpy and np is None:
+                continue
+            with EventLog(logPath, useNumpy=useNumpy) as log:
+                book = OrderBook(log.spec)
+                _, logTime = timed(lambda: log.replay(book))
+                assert book.depth(10) == jsonBook.depth(10)
+                print(f"event log replay ({'numpy' if useNumpy else 'struct'}): {events / logTime: >10.0f} events/s")
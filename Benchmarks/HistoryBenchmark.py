@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from History import HistoryStore, buildHistory
+from OrderBook import OrderBook
+from ReplayBenchmark import syntheticCapture
+"""
+Time travel query benchmark
+
+Builds a history directory (event log plus a checkpoint every --interval records) from a
+capture, then reconstructs the book at --queries random sequence numbers with
+HistoryStore.book_at and reports the p50/p99 query latency against replaying the event
+log from the start to the same sequence. Every fifth query is checked against the full
+replay. Without a capture a synthetic feed is recorded to a temporary capture first.
+
+Usage:
+    python HistoryBenchmark.py --capture capture.bin.gz --product BTC-USD
+    python HistoryBenchmark.py --messages 500000 --interval 10000
+"""
+
+def percentile(ordered, fraction):
+    """
+    returns the value at fraction of an ascending list
+    """
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time travel query benchmark")
+    parser.add_argument("--capture", help="capture to build the history from, synthetic when omitted")
+    parser.add_argument("--product", default="BTC-USD")
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--interval", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    spec = ProductSpec(args.product, "0.01", "0.00000001")
+    with tempfile.TemporaryDirectory() as directory:
+        capture = args.capture
+        if capture is None:
+            capture = os.path.join(directory, "capture.bin")
+            syntheticCapture(capture, args.messages)
+
+        start = time.perf_counter()
+        written = buildHistory(capture, os.path.join(directory, "history"), spec, args.product, args.interval)
+        build = time.perf_counter() - start
+        checkpoints = os.path.join(directory, "history", "checkpoints")
+        checkpointBytes = sum(os.path.getsize(os.path.join(checkpoints, name)) for name in os.listdir(checkpoints))
+        print(f"records: {written}  build: {build:.1f} s  checkpoints: {len(os.listdir(checkpoints))}"
+              f" ({checkpointBytes / 2 ** 20:.1f} MiB)")
+
+        with HistoryStore(os.path.join(directory, "history")) as store:
+            rng = random.Random(1)
+            targets = [store.log.sequence(rng.randrange(store.log.count)) for _ in range(args.queries)]
+            queries, replays = [], []
+            for number, sequence in enumerate(targets):
+                start = time.perf_counter()
+                book = store.book_at(sequence)
+                queries.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                full = OrderBook(store.spec)
+                store.log.replay(full, 0, store.log.bisect(sequence))
+                replays.append(time.perf_counter() - start)
+                if number % 5 == 0:
+                    assert book.depth(50) == full.depth(50) and book.currSeqNum == full.currSeqNum
+
+        queries.sort()
+        replays.sort()
+        print(f"book_at:     p50 {percentile(queries, 0.5) * 1e3: >8.1f} ms  p99 {percentile(queries, 0.99) * 1e3: >8.1f} ms")
+        print(f"full replay: p50 {percentile(replays, 0.5) * 1e3: >8.1f} ms  p99 {percentile(replays, 0.99) * 1e3: >8.1f} ms")
@@ -0,0 +1,70 @@
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from SyntheticFeed import SyntheticFeed
+"""
+Order id interning benchmark
+
+Parses raw frames of a synthetic feed (UUID order ids, like the exchange sends) and
+applies them to a book, once with the ids kept as strings and once interned into
+128-bit integers. Reports the bytes retained per resting order, measured while a
+book of --orders open messages is built from raw frames so the id objects created by
+decoding are included, and the parse + apply throughput on --messages frames.
+
+Usage:
+    python IdBenchmark.py --orders 200000 --messages 300000
+"""
+
+def retained(frames, internIds):
+    parser = MessageParser(internIds=internIds)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    book = OrderBook()
+    for raw in frames:
+        book.processMessage(parser.parseRaw(raw))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(book.orderBook)
+
+def throughput(frames, internIds, repeat=3):
+    best = None
+    for _ in range(repeat):
+        parser = MessageParser(internIds=internIds)
+        book = OrderBook()
+        parseRaw = parser.parseRaw
+        processMessage = book.processMessage
+        start = time.perf_counter()
+        for raw in frames:
+            order = parseRaw(raw)
+            if order is not None:
+                processMessage(order)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="string vs interned order id benchmark")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--messages", type=int, default=300000)
+    args = parser.parse_args()
+
+    feed = SyntheticFeed(target=2 * args.orders)
+    opens = []
+    while len(opens) < args.orders:
+        opens += [json.dumps(message) for message in feed._open() if message["type"] == "open"]
+    frames = [json.dumps(message) for message in SyntheticFeed().messages(args.messages)]
+
+    for internIds in (False, True):
+        name = "interned ids" if internIds else "string ids"
+        print(f"{name: <13} {retained(opens, internIds): >7.1f} bytes/order  "
+              f"{throughput(frames, internIds): >9.0f} frames/s")
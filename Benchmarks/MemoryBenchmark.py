@@ -0,0 +1,113 @@
+import argparse
+import random
+import tracemalloc
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from OrderBook import OrderBook, Order
+"""
+Memory benchmark for resting orders
+
+Builds a synthetic full-channel book and reports the bytes used per resting order,
+once with the original representation (the parsed message with a __dict__ stored as
+the linked list node) and once with the slotted RestingOrder/Limit representation.
+
+Usage:
+    python MemoryBenchmark.py --orders 500000
+"""
+
+class LegacyLimit:
+    """
+    Limit as it was before __slots__, kept only for comparison
+    """
+    def __init__(self, price):
+        self.price = price
+        self.head = None
+        self.tail = None
+        self.total_size = 0
+        self.order_count = 0
+
+class LegacyOrder:
+    """
+    Order as it was before the message and the resting node were split, kept only for comparison
+    """
+    def __init__(self, orderType, identifier, price, quantity, side, sequence):
+        self.type = orderType
+        self.id = identifier
+        self.price = price
+        self.quantity = quantity
+        self.side = side
+        self.sequence = sequence
+        self.prev = None
+        self.next = None
+
+class LegacyOrderBook(OrderBook):
+    """
+    OrderBook that stores the parsed message itself as the resting node
+    """
+    def addOrder(self, order, side):
+        price = order.price
+        if price in side:
+            limit = side[price]
+            order.prev = limit.tail
+            limit.tail.next = order
+            limit.tail = order
+        else:
+            limit = LegacyLimit(price)
+            side[price] = limit
+            limit.head = order
+            limit.tail = order
+        limit.total_size += order.quantity
+        limit.order_count += 1
+        self.orderBook[order.id] = order
+
+def syntheticOrders(count, levels=2000, seed=7):
+    """
+    generates the fields of count open messages spread over levels price levels per side
+
+    :param count: the number of orders to generate
+    :param levels: the number of price levels per side
+    :param seed: seed for the random generator so runs are comparable
+    """
+    rng = random.Random(seed)
+    mid = 30000.00
+    for i in range(count):
+        side = i & 1
+        offset = rng.randrange(1, levels + 1) / 100
+        price = round(mid - offset if side else mid + offset, 2)
+        size = round(rng.uniform(0.0001, 2.0), 8)
+        yield ("%032x" % rng.getrandbits(128), price, size, side, i)
+
+def measure(bookClass, messageClass, count):
+    """
+    builds a book of count orders and returns the bytes allocated per resting order
+
+    :param bookClass: the OrderBook class to build
+    :param messageClass: the message class the orders are parsed into
+    :param count: the number of orders to rest in the book
+    """
+    # generate the ids and fields up front so their strings are not counted twice
+    fields = list(syntheticOrders(count))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    book = bookClass()
+    for iden, price, size, side, seq in fields:
+        book.processMessage(messageClass("open", iden, price, size, side, seq))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(book.orderBook) == count
+    return (after - before) / count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bytes per resting order benchmark")
+    parser.add_argument("--orders", type=int, default=500000)
+    args = parser.parse_args()
+
+    legacy = measure(LegacyOrderBook, LegacyOrder, args.orders)
+    slotted = measure(OrderBook, Order, args.orders)
+    print(f"resting orders: {args.orders}")
+    print(f"before (dict message as node): {legacy: >8.1f} bytes/order")
+    print(f"after  (slotted RestingOrder): {slotted: >8.1f} bytes/order")
+    print(f"reduction: {100 * (1 - slotted / legacy): .1f}%")
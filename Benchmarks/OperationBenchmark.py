@@ -0,0 +1,140 @@
+import argparse
+import gc
+import json
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from OrderBook import OrderBook, Order, OPEN, DONE, CHANGE, MATCH
+"""
+Per operation microbenchmarks of the book hot paths
+
+Every case builds a book and a list of messages outside the timed region, then times
+processMessage over the messages and reports nanoseconds per operation (best of
+--repeat runs). Results can be saved as JSON and compared against a saved baseline,
+cases slower than the baseline by more than --tolerance are flagged and make the
+script exit with status 1.
+
+Usage:
+    python OperationBenchmark.py --save baseline.json
+    python OperationBenchmark.py --baseline baseline.json --tolerance 0.1
+"""
+
+LEVELS = 1000
+DEPTH = 10
+
+def restingBook(levels=LEVELS, depth=DEPTH):
+    # asks at 1000.00, 1000.01, ... with depth orders each, ids are "price:position"
+    book = OrderBook()
+    asks = [(1000 + level / 100, 1.0, f"{level}:{position}") for level in range(levels) for position in range(depth)]
+    book.bulkLoad(0, [], asks)
+    return book
+
+def openNewLevel(n):
+    book = restingBook()
+    return book, [Order(OPEN, f"n{i}", 2000 + i / 100, 1.0, 0, i + 1) for i in range(n)]
+
+def openExistingLevel(n):
+    book = restingBook()
+    return book, [Order(OPEN, f"n{i}", 1000 + (i % LEVELS) / 100, 1.0, 0, i + 1) for i in range(n)]
+
+def doneAt(position):
+    def case(n):
+        levels = max(n, LEVELS)
+        book = restingBook(levels)
+        return book, [Order(DONE, f"{level}:{position}", 1000 + level / 100, 0.0, 0, level + 1) for level in range(n)]
+    return case
+
+def doneLastInLevel(n):
+    book = restingBook(n, 1)
+    return book, [Order(DONE, f"{level}:0", 1000 + level / 100, 0.0, 0, level + 1) for level in range(n)]
+
+def doneUnknown(n):
+    book = restingBook()
+    return book, [Order(DONE, f"x{i}", 1000.0, 0.0, 0, i + 1) for i in range(n)]
+
+def matchPartial(n):
+    book = restingBook()
+    return book, [Order(MATCH, f"{i % LEVELS}:0", 1000 + (i % LEVELS) / 100, 1e-6, 0, i + 1) for i in range(n)]
+
+def matchFull(n):
+    book = restingBook(max(n, LEVELS))
+    return book, [Order(MATCH, f"{level}:0", 1000 + level / 100, 1.0, 0, level + 1) for level in range(n)]
+
+def changeSize(n):
+    book = restingBook(max(n, LEVELS))
+    return book, [Order(CHANGE, f"{level}:0", 1000 + level / 100, 0.5, 0, level + 1) for level in range(n)]
+
+def changePrice(n):
+    book = restingBook(max(n, LEVELS))
+    return book, [Order(CHANGE, f"{level}:0", 1000 + (level + 1) / 100, 0.5, 0, level + 1) for level in range(n)]
+
+def ignored(n):
+    book = restingBook()
+    return book, [Order("received", f"x{i}", 1000.0, 0.0, 0, i + 1) for i in range(n)]
+
+CASES = {
+    "open new level": openNewLevel,
+    "open existing level": openExistingLevel,
+    "done head": doneAt(0),
+    "done middle": doneAt(DEPTH // 2),
+    "done tail": doneAt(DEPTH - 1),
+    "done last in level": doneLastInLevel,
+    "done unknown id": doneUnknown,
+    "match partial": matchPartial,
+    "match full": matchFull,
+    "change size": changeSize,
+    "change price": changePrice,
+    "ignored type": ignored,
+}
+
+def measure(case, n, repeat):
+    best = None
+    for _ in range(repeat):
+        book, orders = case(n)
+        processMessage = book.processMessage
+        gc.disable()
+        try:
+            start = time.perf_counter_ns()
+            for order in orders:
+                processMessage(order)
+            elapsed = time.perf_counter_ns() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best / n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per operation book microbenchmarks")
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)
+
+    results = {}
+    regressions = []
+    for name, case in CASES.items():
+        results[name] = nanos = measure(case, args.operations, args.repeat)
+        line = f"{name: <22} {nanos: >8.0f} ns/op"
+        if baseline is not None and name in baseline:
+            change = nanos / baseline[name] - 1
+            line += f"  {change: >+7.1%}"
+            if change > args.tolerance:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as saved:
+            json.dump(results, saved, indent=2)
+    if regressions:
+        sys.exit(1)
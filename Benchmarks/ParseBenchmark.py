@@ -0,0 +1,73 @@
+import argparse
+import gc
+import json
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from MessageParser import MessageParser, loads
+from SyntheticFeed import SyntheticFeed
+"""
+Parse throughput benchmark
+
+Compares decoding every frame with json.loads and dispatching the dict (the original
+main loop) against MessageParser.parseRaw, which drops unconsumed types before decoding
+and uses the fastest installed JSON backend. Reports messages per second over a corpus
+of newline delimited raw frames, or over a synthetic feed when no corpus is given.
+
+Usage:
+    python ParseBenchmark.py --corpus capture.jsonl
+    python ParseBenchmark.py --messages 500000
+"""
+
+def loadCorpus(path):
+    """
+    reads a newline delimited file of raw websocket frames
+
+    :param path: the corpus file
+    """
+    with open(path) as corpus:
+        return [line.rstrip("\n") for line in corpus if line.strip()]
+
+def dictPath(frames, mp):
+    for frame in frames:
+        mp(json.loads(frame))
+
+def rawPath(frames, mp):
+    parseRaw = mp.parseRaw
+    for frame in frames:
+        parseRaw(frame)
+
+def throughput(fn, frames, mp, repeat):
+    """
+    returns the best messages per second of repeat runs of fn over the frames
+    """
+    best = 0
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(frames, mp)
+            best = max(best, len(frames) / (time.perf_counter() - start))
+    finally:
+        gc.enable()
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="message parse throughput benchmark")
+    parser.add_argument("--corpus", help="newline delimited raw frames, synthetic when omitted")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = loadCorpus(args.corpus) if args.corpus else list(SyntheticFeed().frames(args.messages))
+    mp = MessageParser()
+
+    before = throughput(dictPath, frames, mp, args.repeat)
+    after = throughput(rawPath, frames, mp, args.repeat)
+    print(f"frames: {len(frames)}, json backend: {loads.__module__}")
+    print(f"json.loads + dispatch: {before: >10.0f} msg/s")
+    print(f"parseRaw:              {after: >10.0f} msg/s")
+    print(f"speedup: {after / before: .2f}x")
@@ -0,0 +1,91 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import FeedRecorder, readCapture
+from SyntheticFeed import SyntheticFeed
+"""
+Replay throughput and latency benchmark
+
+Replays a capture through MessageParser.parseRaw + OrderBook.processMessage and reports
+messages per second plus the p50/p99/p999 per message latency of parse and apply.
+Without a capture a synthetic feed is recorded to a temporary capture first, so the
+benchmark runs offline.
+
+Usage:
+    python ReplayBenchmark.py --capture capture.bin.gz
+    python ReplayBenchmark.py --messages 500000
+"""
+
+def percentile(ordered, fraction):
+    """
+    returns the value at fraction of an ascending list
+    """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def syntheticCapture(path, messages):
+    """
+    records a synthetic feed to a capture file, spacing frames 250us apart
+    """
+    with FeedRecorder(path) as recorder:
+        timestamp = time.time_ns()
+        for raw in SyntheticFeed().frames(messages):
+            timestamp += 250000
+            recorder.record(raw, timestamp)
+
+def run(frames):
+    """
+    applies the frames to a fresh book, timing each one
+
+    :return: (messages per second, sorted per message latencies in nanoseconds)
+    """
+    mp = MessageParser()
+    ob = OrderBook()
+    parseRaw = mp.parseRaw
+    processMessage = ob.processMessage
+    clock = time.perf_counter_ns
+    latencies = [0] * len(frames)
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for index, raw in enumerate(frames):
+            begin = clock()
+            order = parseRaw(raw)
+            if order is not None:
+                processMessage(order)
+            latencies[index] = clock() - begin
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    latencies.sort()
+    return len(frames) / elapsed, latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="capture replay throughput and latency benchmark")
+    parser.add_argument("--capture", help="capture file, a synthetic one is recorded when omitted")
+    parser.add_argument("--messages", type=int, default=300000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.capture
+        if path is None:
+            path = os.path.join(directory, "synthetic.bin.gz")
+            syntheticCapture(path, args.messages)
+        start = time.perf_counter()
+        frames = [raw for _, raw in readCapture(path)]
+        readTime = time.perf_counter() - start
+
+    rate, latencies = run(frames)
+    print(f"frames: {len(frames)} (capture read in {readTime:.2f} s)")
+    print(f"throughput: {rate: >10.0f} msg/s")
+    for name, fraction in (("p50", 0.5), ("p99", 0.99), ("p999", 0.999)):
+        print(f"{name: <5} latency: {percentile(latencies, fraction) / 1000: >8.2f} us")
+    print(f"max   latency: {latencies[-1] / 1000: >8.2f} us")
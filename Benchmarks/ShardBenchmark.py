@@ -0,0 +1,62 @@
+import argparse
+import os
+import time
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from Sharding import ShardedBookManager
+from SyntheticFeed import SyntheticFeed
+"""
+Sharding scaling benchmark
+
+Replays an interleaved multi product synthetic capture through a single process
+BookManager and through a ShardedBookManager with an increasing number of workers,
+and reports frames per second for each.
+
+Usage:
+    python ShardBenchmark.py --products 16 --messages 50000
+"""
+
+def capture(products, messages):
+    """
+    returns the frames of products synthetic feeds, interleaved round robin
+    """
+    feeds = [list(SyntheticFeed(productId=f"P{index}-USD", seed=index, target=2000).frames(messages))
+             for index in range(products)]
+    return [frame for group in zip(*feeds) for frame in group]
+
+def single(frames, productIds):
+    manager = BookManager(productIds)
+    start = time.perf_counter()
+    for raw in frames:
+        manager.onFrame(raw)
+    return len(frames) / (time.perf_counter() - start)
+
+def sharded(frames, productIds, shards, batchSize):
+    with ShardedBookManager(productIds, shards=shards, batchSize=batchSize) as manager:
+        start = time.perf_counter()
+        for raw in frames:
+            manager.onFrame(raw)
+        # the stats round trip waits for every worker to drain its pipe
+        manager.stats()
+        return len(frames) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sharded book processing benchmark")
+    parser.add_argument("--products", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=50000, help="messages per product")
+    parser.add_argument("--batch", type=int, default=512)
+    parser.add_argument("--max-shards", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    productIds = [f"P{index}-USD" for index in range(args.products)]
+    frames = capture(args.products, args.messages)
+    print(f"frames: {len(frames)}, products: {args.products}")
+    print(f"single process: {single(frames, productIds): >10.0f} frames/s")
+    shards = 1
+    while shards <= min(args.max_shards, args.products):
+        print(f"{shards: >2} shards:      {sharded(frames, productIds, shards, args.batch): >10.0f} frames/s")
+        shards *= 2
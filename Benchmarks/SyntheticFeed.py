@@ -0,0 +1,199 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from sortedcontainers import SortedDict
+"""
+Synthetic full channel feed used by the benchmarks so they run offline
+
+Structure:
+    A SyntheticFeed keeps its own view of the resting orders of one product and emits
+    the messages the exchange would send for it: received/open for new orders, done
+    for cancels, match (plus done once filled) against the touch and the occasional
+    change. Messages are consistent with each other so an OrderBook fed with them stays
+    valid, and the sequence number increments by one per message like the real feed.
+"""
+
+class SyntheticFeed:
+    """
+    Generates a coherent stream of full channel messages for a single product
+
+    Attributes:
+        productId: the product_id stamped on every message
+        rng: seeded random generator so runs are reproducible
+        mid: the mid price in ticks that new orders are placed around
+        levels: how many ticks away from mid new orders may be placed
+        target: the number of resting orders the feed hovers around
+        sequence: the sequence number of the last emitted message
+        orders: the resting orders in the form of id : [side, price ticks, size]
+        queues: per side, the resting order ids in FIFO order in the form of price ticks : [id]
+    """
+    def __init__(self, productId="BTC-USD", seed=1, mid=3000000, levels=400, target=20000, startSequence=1):
+        self.productId = productId
+        self.rng = random.Random(seed)
+        self.mid = mid
+        self.levels = levels
+        self.target = target
+        self.sequence = startSequence - 1
+        self.orders = {}
+        self.queues = {"buy": SortedDict(), "sell": SortedDict()}
+        self.ids = []
+        self.tradeId = 0
+        self.clock = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    def _header(self, msgType):
+        self.sequence += 1
+        self.clock += timedelta(microseconds=250)
+        return {
+            "type": msgType,
+            "time": self.clock.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "product_id": self.productId,
+            "sequence": self.sequence,
+        }
+
+    def _newId(self):
+        return "%08x-%04x-%04x-%04x-%012x" % (self.rng.getrandbits(32), self.rng.getrandbits(16),
+                self.rng.getrandbits(16), self.rng.getrandbits(16), self.rng.getrandbits(48))
+
+    def _price(self, ticks):
+        return "%d.%02d" % divmod(ticks, 100)
+
+    def _size(self, lots):
+        return "%d.%08d" % divmod(lots, 100000000)
+
+    def _pickOrder(self):
+        # ids that were removed are dropped lazily from the candidate list
+        while True:
+            index = self.rng.randrange(len(self.ids))
+            iden = self.ids[index]
+            if iden in self.orders:
+                return iden
+            self.ids[index] = self.ids[-1]
+            self.ids.pop()
+
+    def _rest(self, iden, side, price, size):
+        self.orders[iden] = [side, price, size]
+        self.queues[side].setdefault(price, []).append(iden)
+        self.ids.append(iden)
+
+    def _unrest(self, iden):
+        side, price, size = self.orders.pop(iden)
+        queue = self.queues[side][price]
+        queue.remove(iden)
+        if not queue:
+            del self.queues[side][price]
+        return side, price, size
+
+    def _best(self, side):
+        levels = self.queues[side]
+        if not levels:
+            return None
+        price, queue = levels.peekitem(-1 if side == "buy" else 0)
+        return queue[0], price
+
+    def _open(self):
+        side = "buy" if self.rng.random() < 0.5 else "sell"
+        offset = self.rng.randrange(1, self.levels)
+        price = self.mid - offset if side == "buy" else self.mid + offset
+        size = self.rng.randrange(1, 200000000)
+        iden = self._newId()
+        received = self._header("received")
+        received.update({"order_id": iden, "size": self._size(size), "price": self._price(price),
+                         "side": side, "order_type": "limit", "client_oid": ""})
+        opened = self._header("open")
+        opened.update({"order_id": iden, "price": self._price(price),
+                       "remaining_size": self._size(size), "side": side})
+        self._rest(iden, side, price, size)
+        return [received, opened]
+
+    def _cancel(self):
+        iden = self._pickOrder()
+        side, price, size = self._unrest(iden)
+        done = self._header("done")
+        done.update({"price": self._price(price), "order_id": iden, "reason": "canceled",
+                     "side": side, "remaining_size": self._size(size)})
+        return [done]
+
+    def _match(self):
+        makerSide = "buy" if self.rng.random() < 0.5 else "sell"
+        best = self._best(makerSide)
+        if best is None:
+            return self._open()
+        iden, price = best
+        order = self.orders[iden]
+        fill = min(order[2], self.rng.randrange(1, 100000000))
+        self.tradeId += 1
+        match = self._header("match")
+        match.update({"trade_id": self.tradeId, "maker_order_id": iden, "taker_order_id": self._newId(),
+                      "size": self._size(fill), "price": self._price(price), "side": makerSide})
+        messages = [match]
+        order[2] -= fill
+        if order[2] == 0:
+            self._unrest(iden)
+            done = self._header("done")
+            done.update({"price": self._price(price), "order_id": iden, "reason": "filled",
+                         "side": makerSide, "remaining_size": "0"})
+            messages.append(done)
+        # drift the mid towards the side that traded
+        self.mid += -1 if makerSide == "buy" else 1
+        return messages
+
+    def _change(self):
+        iden = self._pickOrder()
+        order = self.orders[iden]
+        newSize = max(1, order[2] // 2)
+        change = self._header("change")
+        change.update({"reason": "modify_order", "order_id": iden, "side": order[0],
+                       "old_size": self._size(order[2]), "new_size": self._size(newSize),
+                       "old_price": self._price(order[1]), "new_price": self._price(order[1])})
+        order[2] = newSize
+        return [change]
+
+    def step(self):
+        """
+        advances the feed by one action and returns the messages it produced
+        """
+        if len(self.orders) < self.target // 2:
+            return self._open()
+        roll = self.rng.random()
+        if roll < 0.45 or not self.orders:
+            return self._open()
+        elif roll < 0.80:
+            return self._cancel()
+        elif roll < 0.95:
+            return self._match()
+        return self._change()
+
+    def snapshot(self):
+        """
+        returns the current resting orders as an exchange level 3 snapshot
+        """
+        book = {"sequence": self.sequence, "bids": [], "asks": []}
+        for side, key in (("buy", "bids"), ("sell", "asks")):
+            levels = self.queues[side]
+            for price in (reversed(levels) if side == "buy" else levels):
+                for iden in levels[price]:
+                    book[key].append([self._price(price), self._size(self.orders[iden][2]), iden])
+        return book
+
+    def messages(self, count):
+        """
+        yields count messages as dicts
+
+        :param count: the number of messages to generate
+        """
+        produced = 0
+        while produced < count:
+            for message in self.step():
+                yield message
+                produced += 1
+                if produced == count:
+                    return
+
+    def frames(self, count):
+        """
+        yields count messages as compact JSON text, the way they arrive on the websocket
+
+        :param count: the number of messages to generate
+        """
+        for message in self.messages(count):
+            yield json.dumps(message, separators=(",", ":"))
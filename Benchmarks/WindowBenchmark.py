@@ -0,0 +1,79 @@
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from MemoryBenchmark import syntheticOrders
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from WindowedBook import WindowedOrderBook
+"""
+Depth window memory benchmark
+
+Builds the same book of --orders resting orders spread over --levels price levels per
+side once as a full OrderBook and once as a WindowedOrderBook keeping --window full
+levels, in float and fixed-point mode, and reports the bytes retained per book and per
+order plus the time taken to parse and apply the opens. Both books are built again with
+internIds, the order ids are canonical UUIDs like the feed's so they are interned into
+integers. The opens are parsed from raw frames inside the measurement, so the id, price
+and size objects each order keeps are counted. The top --window levels of the books are
+checked to agree.
+
+Usage:
+    python WindowBenchmark.py --orders 200000 --levels 2000 --window 50
+"""
+
+def build(makeBook, spec, frames, internIds=False):
+    """
+    builds a book from raw open frames
+
+    :return: (the book, bytes retained, seconds taken)
+    """
+    parser = MessageParser(spec, internIds)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    book = makeBook(spec)
+    start = time.perf_counter()
+    for raw in frames:
+        book.processMessage(parser.parseRaw(raw))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return book, after - before, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="full vs depth windowed book memory benchmark")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--levels", type=int, default=2000)
+    parser.add_argument("--window", type=int, default=50)
+    args = parser.parse_args()
+
+    frames = [
+        json.dumps({"type": "open", "product_id": "BTC-USD", "sequence": seq,
+                    "order_id": f"{iden[:8]}-{iden[8:12]}-{iden[12:16]}-{iden[16:20]}-{iden[20:]}",
+                    "price": f"{price:.2f}", "remaining_size": f"{size:.8f}", "side": "buy" if side else "sell"})
+        for iden, price, size, side, seq in syntheticOrders(args.orders, args.levels)
+    ]
+    print(f"resting orders: {args.orders} over {args.levels} levels per side, window {args.window}")
+    windowedBook = lambda spec: WindowedOrderBook(spec, args.window)
+    for spec in (None, ProductSpec("BTC-USD", "0.01", "0.00000001")):
+        print("fixed-point" if spec else "float")
+        full, fullBytes, _ = build(OrderBook, spec, frames)
+        reference = full.depth(args.window)
+        del full
+        for label, makeBook, internIds in (("full book:", OrderBook, False), ("full, internIds:", OrderBook, True),
+                                           ("windowed book:", windowedBook, False), ("windowed, internIds:", windowedBook, True)):
+            book, used, elapsed = build(makeBook, spec, frames, internIds)
+            assert book.depth(args.window) == reference
+            assert book.orderCount() == args.orders
+            print(f"  {label: <21}{used / 2 ** 20: >7.1f} MiB  {used / args.orders: >6.1f} bytes/order  {elapsed: .2f} s"
+                  f"  reduction {100 * (1 - used / fullBytes): >5.1f}%")
+            del book
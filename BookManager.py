@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import os
+import time
+from MessageParser import MessageParser, messageProduct, messageSequence
+from OrderBook import OrderBook, sortedSide
+from Bootstrap import Bootstrapper
+from Sequencer import Sequencer
+from Checkpoint import warmStart, replayCapture
+from Metrics import InstrumentedMessageParser, InstrumentedOrderBook
+from WindowedBook import WindowedOrderBook
+from Trades import TradeTape
+"""
+Multi product book manager
+
+Structure:
+    One websocket subscription carries the full channel of many products. A BookManager
+    owns one ProductBook per product id: its own MessageParser (so each product can use
+    its own ProductSpec), OrderBook, Sequencer and, when a snapshot source is given,
+    Bootstrapper. Frames are routed by their product_id, which is read from the raw text
+    before anything is decoded, so frames for other products cost a single scan.
+    Each ProductBook counts its frames and the time spent on them so hot products
+    show up in stats().
+
+    A frame that fails to parse or apply is logged and counted in the product's errors,
+    the frames around it are processed as usual. The failed frame never reaches the
+    sequencer, so its product sees a gap and resyncs (or skips over it without a
+    snapshot source), the other products are not affected.
+
+Warm restart:
+    warmStart() restores each product from its checkpoint (see Checkpoint.py) and the
+    capture recorded since, read once for every product, instead of waiting for a REST
+    snapshot. The book is ready at once and the sequencer expects the sequence right
+    after the restored one, if the live feed has moved on the gap is detected and the
+    product resyncs from a snapshot.
+"""
+
+logger = logging.getLogger(__name__)
+
+def checkpointPath(checkpointDir, productId):
+    """
+    returns the checkpoint file of a product in a checkpoint directory
+
+    :param checkpointDir: the checkpoint directory
+    :param productId: the product id
+    """
+    return os.path.join(checkpointDir, productId + ".ckpt")
+
+class ProductBook:
+    """
+    Represents the processing state of a single product
+
+    Attributes:
+        productId: the product id, e.g. "BTC-USD"
+        parser: the MessageParser for the product's messages
+        book: the OrderBook of the product
+        bootstrapper: the Bootstrapper of the product, None when running without snapshots
+        trades: the TradeTape of the product, None when trades are not recorded
+        sequencer: the Sequencer the product's frames go through
+        frames: the number of frames routed to the product
+        errors: the number of the product's frames that failed to parse or apply
+        nanos: the total time spent processing the product's frames in nanoseconds
+
+    When a Metrics registry is given the parser and the book are the instrumented
+    variants from Metrics.py, labelled with the product id. With internIds the book is
+    keyed by integer order id handles, see MessageParser. engine selects the data
+    structure of the book's sides, see OrderBook and TickLadder.py. With a window the
+    book is a WindowedOrderBook that keeps full queues for that many levels per side,
+    see WindowedBook.py, it can not be combined with metrics. With trades a TradeTape
+    records every match the sequencer passes on, including the ones received while a
+    snapshot is fetched, see Trades.py, and the parser decodes match times.
+    """
+    def __init__(self, productId, spec=None, source=None, metrics=None, internIds=False, engine=sortedSide, window=None, trades=False):
+        self.productId = productId
+        if window is not None and metrics is not None:
+            raise ValueError("a depth windowed book can not be instrumented")
+        if metrics is None:
+            self.parser = MessageParser(spec, internIds, trades)
+            if window is None:
+                self.book = OrderBook(spec, engine)
+            else:
+                self.book = WindowedOrderBook(spec, window, engine)
+        else:
+            self.parser = InstrumentedMessageParser(spec, metrics, internIds, trades, product=productId)
+            self.book = InstrumentedOrderBook(spec, metrics, engine, product=productId)
+        if source is not None:
+            self.bootstrapper = Bootstrapper(self.book, self.parser, source, productId)
+            deliver = self.bootstrapper.onMessage
+        else:
+            self.bootstrapper = None
+            deliver = self.book.processMessage
+        # the tape taps the sequenced stream ahead of the bootstrapper, so the matches a
+        # snapshot makes redundant for the book are still recorded
+        self.trades = None
+        if trades:
+            self.trades = TradeTape(spec=spec)
+            deliver = self.trades.tap(deliver)
+        self.sequencer = Sequencer(deliver, resync=None if self.bootstrapper is None else self.bootstrapper.start)
+        self.frames = 0
+        self.errors = 0
+        self.nanos = 0
+
+    def warmStart(self, checkpointPath, capturePath=None):
+        """
+        restores the book from a checkpoint and a capture recorded after it
+
+        :param checkpointPath: the product's checkpoint file
+        :param capturePath: optional capture of the frames received since the checkpoint
+        :return: True if a checkpoint was loaded
+        """
+        book, parser, record = self.replayTarget()
+        if not warmStart(book, parser, checkpointPath, capturePath, self.productId, record):
+            return False
+        self.resume()
+        return True
+
+    def replayTarget(self):
+        """
+        returns the (book, parser, record) captured frames are replayed with, see Checkpoint.replayCapture
+        """
+        return self.book, self.parser, None if self.trades is None else self.trades.recordOrder
+
+    def resume(self):
+        """
+        continues from the book's sequence after the book was restored, the live stream is
+        expected to carry on right after it and no snapshot is needed
+        """
+        self.sequencer.reset()
+        self.sequencer.expected = self.book.currSeqNum + 1
+        if self.bootstrapper is not None:
+            self.bootstrapper.snapshotSequence = self.book.currSeqNum
+            self.bootstrapper.ready = True
+
+    def stats(self):
+        """
+        returns the processing counters of the product
+        """
+        stats = {
+            "frames": self.frames,
+            "errors": self.errors,
+            "seconds": self.nanos / 1e9,
+            "orders": self.book.orderCount(),
+            "bidLevels": len(self.book.buyLimits),
+            "askLevels": len(self.book.askLimits),
+            "sequence": self.book.currSeqNum,
+            "ready": self.bootstrapper is None or self.bootstrapper.ready,
+        }
+        if self.bootstrapper is not None:
+            stats["snapshotFailures"] = self.bootstrapper.failures
+        if self.trades is not None:
+            stats["trades"] = self.trades.total
+        stats.update(self.sequencer.stats())
+        return stats
+
+class BookManager:
+    """
+    Routes the frames of one multi product subscription to per product books
+
+    Attributes:
+        products: the per product state in the form of product id : ProductBook
+
+    specs, engines and windows are optional dicts of product id : ProductSpec, product id :
+    book engine and product id : depth window, products missing from engines use the
+    SortedDict engine and products missing from windows keep every order in full. With
+    trades every product records its matches in a TradeTape.
+    """
+    def __init__(self, productIds, specs=None, source=None, metrics=None, internIds=False, engines=None, windows=None, trades=False):
+        specs = specs or {}
+        engines = engines or {}
+        windows = windows or {}
+        self.products = {
+            productId: ProductBook(productId, specs.get(productId), source, metrics, internIds,
+                                   engines.get(productId, sortedSide), windows.get(productId), trades)
+            for productId in productIds
+        }
+
+    def subscription(self):
+        """
+        returns the subscribe message for every managed product
+        """
+        return {"type": "subscribe", "product_ids": list(self.products), "channels": ["full"]}
+
+    def start(self):
+        """
+        starts the snapshot bootstrap of every product that was not warm started, call it
+        from the event loop once the subscription is confirmed, every bootstrapper is bound
+        to the loop so resyncs on a pipeline thread can fetch there
+        """
+        loop = asyncio.get_running_loop()
+        for product in self.products.values():
+            if product.bootstrapper is not None:
+                product.bootstrapper.loop = loop
+                if not product.bootstrapper.ready:
+                    product.bootstrapper.start()
+
+    def warmStart(self, checkpointDir, capturePath=None):
+        """
+        restores every product that has a checkpoint in a directory, call it before start(),
+        the capture is read once for all the restored products, from the checkpoints'
+        capture offset when they have one
+
+        :param checkpointDir: the directory holding one checkpoint per product, see checkpointPath()
+        :param capturePath: optional capture of the frames received since the checkpoints
+        :return: the product ids that were restored
+        """
+        offsets = {}
+        for productId, product in self.products.items():
+            path = checkpointPath(checkpointDir, productId)
+            if os.path.exists(path):
+                offsets[productId] = product.book.load_snapshot(path)
+        if capturePath is not None and offsets:
+            # start at the oldest checkpoint's capture offset, the sequences filter out
+            # what the newer checkpoints already hold
+            offset = None if None in offsets.values() else min(offsets.values())
+            replayCapture(capturePath, {productId: self.products[productId].replayTarget() for productId in offsets}, offset)
+        for productId in offsets:
+            self.products[productId].resume()
+        return list(offsets)
+
+    def book(self, productId):
+        """
+        returns the OrderBook of a product
+
+        :param productId: the product id
+        """
+        return self.products[productId].book
+
+    def onFrame(self, raw):
+        """
+        routes a raw JSON frame to the book of its product, frames of other products are ignored
+
+        :param raw: the JSON text received from the websocket
+        :return: the ProductBook the frame was routed to, or None
+        """
+        product = self.products.get(messageProduct(raw))
+        if product is None:
+            return None
+        start = time.perf_counter_ns()
+        try:
+            product.sequencer.push(messageSequence(raw), product.parser.parseRaw(raw))
+        except Exception:
+            product.errors += 1
+            logger.exception("failed to process a %s frame: %.200s", product.productId, raw)
+        product.nanos += time.perf_counter_ns() - start
+        product.frames += 1
+        return product
+
+    def onMessage(self, message):
+        """
+        routes an already decoded message to the book of its product
+
+        :param message: the decoded message dict
+        :return: the ProductBook the message was routed to, or None
+        """
+        product = self.products.get(message.get("product_id"))
+        if product is None:
+            return None
+        start = time.perf_counter_ns()
+        try:
+            sequence = message.get("sequence")
+            product.sequencer.push(None if sequence is None else int(sequence), product.parser(message))
+        except Exception:
+            product.errors += 1
+            logger.exception("failed to process a %s message: %.200r", product.productId, message)
+        product.nanos += time.perf_counter_ns() - start
+        product.frames += 1
+        return product
+
+    def stats(self):
+        """
+        returns the processing counters of every product, busiest first
+        """
+        ranked = sorted(self.products.values(), key=lambda product: product.nanos, reverse=True)
+        return {product.productId: product.stats() for product in ranked}
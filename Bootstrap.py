@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import urllib.request
+from MessageParser import uuidToInt
+"""
+Full channel bootstrap: level 3 snapshot load plus buffered message replay
+
+Structure:
+    The full channel only sends deltas, so a book built from an empty state misses every
+    order that was resting before we connected. A Bootstrapper starts buffering parsed
+    messages as soon as the subscription is confirmed, fetches a level 3 snapshot from a
+    snapshot source in the background, bulk loads it into the OrderBook and then replays
+    the buffered messages whose sequence is greater than the snapshot sequence. From then
+    on messages are applied directly.
+
+    A snapshot source is any object with an async fetch(productId) method that returns
+    the level 3 book as sent by the exchange:
+        {"sequence": int, "bids": [[price, size, order_id], ...], "asks": [...]}
+    A fetch that fails (timeout, 5xx, bad JSON, a snapshot that does not load, ...) is
+    logged and retried after a delay that doubles with every consecutive failure, the
+    messages keep buffering meanwhile.
+
+    Fetches always run on the event loop. The messages (and so a resync after a sequence
+    gap) may be processed on a pipeline thread, see Pipeline.py, the fetch is then handed
+    to the loop the bootstrapper was first started or bound on with call_soon_threadsafe.
+"""
+
+logger = logging.getLogger(__name__)
+
+class RestSnapshotSource:
+    """
+    Fetches level 3 snapshots from the exchange REST endpoint
+
+    Attributes:
+        url: the endpoint template, formatted with the product id
+        timeout: seconds to wait for the response
+    """
+    def __init__(self, url="https://api.exchange.coinbase.com/products/{}/book?level=3", timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def _get(self, productId):
+        request = urllib.request.Request(self.url.format(productId), headers={"User-Agent": "orderbook"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    async def fetch(self, productId):
+        """
+        fetches the snapshot without blocking the event loop
+
+        :param productId: the product to fetch, e.g. "BTC-USD"
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, productId)
+
+class FileSnapshotSource:
+    """
+    Reads level 3 snapshots from local JSON files, stands in for the REST endpoint
+    in tests and offline replays
+
+    Attributes:
+        path: the file path, may contain {} which is formatted with the product id
+    """
+    def __init__(self, path):
+        self.path = path
+
+    async def fetch(self, productId):
+        """
+        reads the snapshot for a product
+
+        :param productId: the product to read
+        """
+        with open(self.path.format(productId)) as snapshotFile:
+            return json.load(snapshotFile)
+
+def loadSnapshot(book, parser, snapshot):
+    """
+    bulk loads an exchange level 3 snapshot into a book, prices, sizes and ids are converted
+    the same way the parser converts messages so both agree on the book units and keys
+
+    :param book: the OrderBook to load into
+    :param parser: the MessageParser used for the live messages
+    :param snapshot: dict with "sequence", "bids" and "asks"
+    """
+    toPrice = parser.toPrice
+    toSize = parser.toSize
+    toId = uuidToInt if parser.internIds else (lambda iden: iden)
+    book.bulkLoad(
+        int(snapshot["sequence"]),
+        ((toPrice(price), toSize(size), toId(iden)) for price, size, iden in snapshot["bids"]),
+        ((toPrice(price), toSize(size), toId(iden)) for price, size, iden in snapshot["asks"]),
+    )
+
+class Bootstrapper:
+    """
+    Buffers messages while a snapshot is fetched, then loads it and replays the buffer
+
+    Attributes:
+        book: the OrderBook being bootstrapped
+        parser: the MessageParser the messages were parsed with
+        source: the snapshot source
+        productId: the product being bootstrapped
+        buffer: parsed messages received while the snapshot was being fetched
+        ready: True once the snapshot is loaded and the buffer replayed
+        snapshotSequence: the sequence of the loaded snapshot
+        retryDelay: seconds before the first retry of a failed fetch, doubled per failure
+        maxRetryDelay: the longest delay between two fetches
+        attempts: the consecutive failed fetches of the current bootstrap
+        failures: the number of failed fetches
+        lastError: the exception of the last failed fetch, None if none failed
+        loop: the event loop the fetches run on, remembered from the first call on it
+    """
+    def __init__(self, book, parser, source, productId, retryDelay=1.0, maxRetryDelay=60.0):
+        self.book = book
+        self.parser = parser
+        self.source = source
+        self.productId = productId
+        self.retryDelay = retryDelay
+        self.maxRetryDelay = maxRetryDelay
+        self.buffer = []
+        self.ready = False
+        self.snapshotSequence = None
+        self.task = None
+        self.attempts = 0
+        self.failures = 0
+        self.lastError = None
+        self.loop = None
+
+    def start(self):
+        """
+        starts buffering and fetching the snapshot in the background, call it right
+        after the subscription has been confirmed, resyncs may call it from any thread
+        """
+        self.buffer = []
+        self.ready = False
+        self.attempts = 0
+        self.task = None
+        self.schedule(0)
+
+    def schedule(self, delay):
+        """
+        starts a fetch on the event loop after a delay, called off the loop the fetch is
+        handed to it and self.task stays None (messages keep buffering) until it runs
+
+        :param delay: seconds to wait before fetching
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self.loop = loop
+            self.task = loop.create_task(self._fetch(delay))
+        elif self.loop is not None:
+            self.loop.call_soon_threadsafe(self.schedule, delay)
+        else:
+            raise RuntimeError("the snapshot fetch needs an event loop, start or bind the bootstrapper on one first")
+
+    async def _fetch(self, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        return await self.source.fetch(self.productId)
+
+    def onMessage(self, order):
+        """
+        applies a parsed message, or buffers it while the snapshot is outstanding
+
+        :param order: the parsed message, None is accepted so the parser output can be passed directly
+        """
+        if self.ready:
+            if order is not None:
+                self.book.processMessage(order)
+            return
+        if order is not None:
+            self.buffer.append(order)
+        task = self.task
+        if task is not None and task.done():
+            try:
+                self.finish(task.result())
+            except (Exception, asyncio.CancelledError) as error:
+                self.retry(error)
+
+    def retry(self, error):
+        """
+        records a failed fetch and starts the next one after the backoff delay
+
+        :param error: the exception the fetch or the snapshot load raised
+        """
+        self.lastError = error
+        self.failures += 1
+        self.attempts += 1
+        delay = min(self.retryDelay * 2 ** (self.attempts - 1), self.maxRetryDelay)
+        logger.warning("snapshot fetch for %s failed (%r), retrying in %.1f s", self.productId, self.lastError, delay)
+        self.task = None
+        self.schedule(delay)
+
+    def finish(self, snapshot):
+        """
+        loads the snapshot and replays every buffered message newer than it
+
+        :param snapshot: the level 3 snapshot
+        """
+        loadSnapshot(self.book, self.parser, snapshot)
+        self.snapshotSequence = self.book.currSeqNum
+        buffered = self.buffer
+        self.buffer = []
+        self.book.processBatch([order for order in buffered if order.sequence > self.snapshotSequence])
+        self.task = None
+        self.ready = True
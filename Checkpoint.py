@@ -0,0 +1,322 @@
+import os
+import struct
+import threading
+import time
+from Replay import readCapture
+"""
+Binary book checkpoints, periodic background checkpointing and warm restart
+
+File format (little endian):
+    header: magic b"CBSN", version (uint16), price decimals (uint8), size decimals (uint8),
+            sequence (int64), bid order count (uint64), ask order count (uint64),
+            capture offset (int64, version 2 only)
+            the decimals are 255 for a float book, the capture offset is the position in
+            the capture (see Replay.py) up to which every frame is in the book, -1 for none
+    orders: the bids then the asks, level by level in ascending price and in FIFO order
+            within a level, each one as price and size (two float64, or two int64 for a
+            fixed-point book) followed by the order id:
+                kind 0, a string: length (uint16) + UTF-8 bytes
+                kind 1, an integer: byte count (uint8) + unsigned little endian bytes
+
+    Files are written to path + ".tmp" and renamed over path, a reader never sees a
+    partial checkpoint. Version 1 files (no capture offset) are still read.
+
+Background checkpoints:
+    A Checkpointer writes a checkpoint every interval seconds from poll(), which the
+    processing loop calls between messages. Where os.fork is available the checkpoint is
+    written by a forked child from its copy-on-write view of the book, so the parent only
+    pays for the fork. Elsewhere the book is captured into a list of entries on the
+    processing thread and the file is written on a background thread.
+
+Warm restart:
+    warmStart() loads a checkpoint and replays the frames of the capture that are newer
+    than it, replayCapture() does the same for several books in one pass over the
+    capture. Reading starts at the checkpoint's capture offset when it has one, and the
+    frames are filtered on the product id and sequence read from the raw text, so only
+    the frames that are replayed are decoded.
+"""
+
+MAGIC = b"CBSN"
+VERSION = 2
+HEADER = struct.Struct("<4sHBBqQQq")
+V1_HEADER = struct.Struct("<4sHBBqQQ")
+FLOAT_MODE = 255
+STR_ID = struct.Struct("<BH")
+INT_ID = struct.Struct("<BB")
+
+def captureEntries(book):
+    """
+    returns the orders of a book as (bids, asks) lists of (price, size, id) in file order
+
+    :param book: the OrderBook to capture
+    """
+    sides = []
+    for side in (book.buyLimits, book.askLimits):
+        entries = []
+        for limit in side.values():
+            order = limit.head
+            while order is not None:
+                entries.append((order.price, order.quantity, order.id))
+                order = order.next
+        sides.append(entries)
+    return sides
+
+def encodeSnapshot(spec, sequence, bids, asks, captureOffset=None):
+    """
+    encodes captured entries into the checkpoint format
+
+    :param spec: the ProductSpec of the book, None for a float book
+    :param sequence: the sequence number of the book
+    :param bids: list of (price, size, id) on the buy side
+    :param asks: list of (price, size, id) on the sell side
+    :param captureOffset: optional capture position up to which every frame is in the book
+    """
+    if spec is None:
+        priceDecimals = sizeDecimals = FLOAT_MODE
+        quote = struct.Struct("<dd").pack
+    else:
+        priceDecimals, sizeDecimals = spec.priceDecimals, spec.sizeDecimals
+        quote = struct.Struct("<qq").pack
+    chunks = [HEADER.pack(MAGIC, VERSION, priceDecimals, sizeDecimals, sequence, len(bids), len(asks),
+                          -1 if captureOffset is None else captureOffset)]
+    append = chunks.append
+    strId = STR_ID.pack
+    intId = INT_ID.pack
+    for entries in (bids, asks):
+        for price, size, iden in entries:
+            append(quote(price, size))
+            if isinstance(iden, str):
+                encoded = iden.encode()
+                append(strId(0, len(encoded)))
+                append(encoded)
+            else:
+                encoded = iden.to_bytes((iden.bit_length() + 7) // 8 or 1, "little")
+                append(intId(1, len(encoded)))
+                append(encoded)
+    return b"".join(chunks)
+
+def writeSnapshot(path, data):
+    """
+    atomically writes an encoded checkpoint
+
+    :param path: the checkpoint file
+    :param data: the encoded checkpoint
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as checkpoint:
+        checkpoint.write(data)
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(tmp, path)
+
+def readSnapshot(path, spec):
+    """
+    reads a checkpoint written for a book with the given spec
+
+    :param path: the checkpoint file
+    :param spec: the ProductSpec of the book being loaded, None for a float book
+    :return: (sequence, bids, asks, captureOffset) with bids and asks lists of (price, size, id)
+             and captureOffset None when the checkpoint has none
+    :raises ValueError: if the file is not a checkpoint or was written with another spec
+    """
+    with open(path, "rb") as checkpoint:
+        data = checkpoint.read()
+    magic, version, priceDecimals, sizeDecimals, sequence, bidCount, askCount = V1_HEADER.unpack_from(data)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"{path} is not a version 1 or {VERSION} checkpoint")
+    header, captureOffset = V1_HEADER, -1
+    if version == VERSION:
+        header = HEADER
+        captureOffset = HEADER.unpack_from(data)[-1]
+    expected = (FLOAT_MODE, FLOAT_MODE) if spec is None else (spec.priceDecimals, spec.sizeDecimals)
+    if (priceDecimals, sizeDecimals) != expected:
+        raise ValueError(f"{path} was written with decimals {(priceDecimals, sizeDecimals)}, the book uses {expected}")
+
+    quote = struct.Struct("<dd" if spec is None else "<qq")
+    unpackQuote = quote.unpack_from
+    quoteSize = quote.size
+    fromBytes = int.from_bytes
+    offset = header.size
+    sides = []
+    for count in (bidCount, askCount):
+        entries = []
+        for _ in range(count):
+            price, size = unpackQuote(data, offset)
+            offset += quoteSize
+            kind = data[offset]
+            if kind == 0:
+                length = data[offset + 1] | (data[offset + 2] << 8)
+                offset += 3
+                iden = data[offset:offset + length].decode()
+            else:
+                length = data[offset + 1]
+                offset += 2
+                iden = fromBytes(data[offset:offset + length], "little")
+            offset += length
+            entries.append((price, size, iden))
+        sides.append(entries)
+    return sequence, sides[0], sides[1], None if captureOffset < 0 else captureOffset
+
+class Checkpointer:
+    """
+    Writes checkpoints of a book in the background at a fixed interval
+
+    Attributes:
+        book: the OrderBook being checkpointed
+        path: the checkpoint file
+        interval: seconds between checkpoints
+        useFork: True to write from a forked child, False to write from a thread
+        lastTime: the monotonic time the last checkpoint was started
+        lastSequence: the book sequence of the last checkpoint started
+        written: the number of checkpoints started
+        offset: optional callable returning the capture position up to which every frame
+                is in the book, e.g. FeedRecorder.offset, stored with each checkpoint
+    """
+    def __init__(self, book, path, interval=60.0, useFork=None, offset=None):
+        self.book = book
+        self.path = path
+        self.interval = interval
+        self.offset = offset
+        self.useFork = hasattr(os, "fork") if useFork is None else useFork
+        self.lastTime = time.monotonic()
+        self.lastSequence = None
+        self.written = 0
+        self.child = None
+        self.thread = None
+
+    def busy(self):
+        """
+        returns True while a checkpoint is being written, reaping a finished child
+        """
+        if self.child is not None:
+            pid, _ = os.waitpid(self.child, os.WNOHANG)
+            if pid == 0:
+                return True
+            self.child = None
+        if self.thread is not None:
+            if self.thread.is_alive():
+                return True
+            self.thread = None
+        return False
+
+    def poll(self):
+        """
+        starts a checkpoint if the interval has elapsed and the book has changed,
+        meant to be called between messages by the processing loop
+
+        :return: True if a checkpoint was started
+        """
+        if time.monotonic() - self.lastTime < self.interval:
+            return False
+        if self.book.currSeqNum == self.lastSequence or self.busy():
+            return False
+        self.checkpoint()
+        return True
+
+    def checkpoint(self):
+        """
+        starts writing a checkpoint of the book as it is now
+        """
+        self.lastTime = time.monotonic()
+        self.lastSequence = self.book.currSeqNum
+        self.written += 1
+        captureOffset = None if self.offset is None else self.offset()
+        if self.useFork:
+            pid = os.fork()
+            if pid == 0:
+                # child: write from the copy-on-write view of the book and leave
+                # without running any of the parent's cleanup
+                status = 1
+                try:
+                    self.book.save_snapshot(self.path, captureOffset)
+                    status = 0
+                finally:
+                    os._exit(status)
+            self.child = pid
+        else:
+            bids, asks = self.book.snapshotEntries()
+            args = (self.path, self.book.spec, self.book.currSeqNum, bids, asks, captureOffset)
+            self.thread = threading.Thread(target=self._write, args=args, name="Checkpointer", daemon=True)
+            self.thread.start()
+
+    def _write(self, path, spec, sequence, bids, asks, captureOffset):
+        writeSnapshot(path, encodeSnapshot(spec, sequence, bids, asks, captureOffset))
+
+    def wait(self):
+        """
+        blocks until the checkpoint being written is on disk
+        """
+        if self.child is not None:
+            os.waitpid(self.child, 0)
+            self.child = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+def warmStart(book, parser, checkpointPath, capturePath=None, productId=None, record=None):
+    """
+    loads a checkpoint into a book and replays the frames of a capture recorded after it
+
+    :param book: the OrderBook to restore
+    :param parser: the MessageParser for the book's product
+    :param checkpointPath: the checkpoint file
+    :param capturePath: optional capture (see Replay.py) holding frames after the checkpoint
+    :param productId: only replay frames of this product, all frames when None
+    :param record: optional callable invoked with every replayed order, e.g. TradeTape.recordOrder
+    :return: False if there was no checkpoint to load, True otherwise
+    """
+    if not os.path.exists(checkpointPath):
+        return False
+    captureOffset = book.load_snapshot(checkpointPath)
+    if capturePath is not None:
+        replayCapture(capturePath, {productId: (book, parser, record)}, captureOffset)
+    return True
+
+def replayCapture(capturePath, books, offset=None, batchSize=4096):
+    """
+    replays the frames of a capture that are newer than the books they belong to, reading
+    the capture once for every book. The product id and the sequence are read from the
+    raw text, so only the frames that are replayed are decoded.
+
+    :param capturePath: the capture (see Replay.py), a missing file replays nothing
+    :param books: the books to replay into as product id : (book, parser, record), record
+                  is an optional callable invoked with every replayed order, the product id
+                  None takes the frames of every product
+    :param offset: optional capture position to start reading at, every frame before it
+                   must already be in the books
+    :param batchSize: the number of orders applied to a book per processBatch call
+    :return: the number of frames replayed
+    """
+    # MessageParser imports OrderBook, which imports this module
+    from MessageParser import messageProduct, messageSequence
+
+    if not os.path.exists(capturePath):
+        return 0
+    # per product: the book, the parser, the record callable, the restored sequence and
+    # the orders waiting to be applied
+    targets = {productId: [book, parser.parseRaw, record, book.currSeqNum, []]
+               for productId, (book, parser, record) in books.items()}
+    anyProduct = targets.get(None)
+    replayed = 0
+    for _, raw in readCapture(capturePath, offset):
+        target = targets.get(messageProduct(raw), anyProduct)
+        if target is None:
+            continue
+        sequence = messageSequence(raw)
+        if sequence is None or sequence <= target[3]:
+            continue
+        order = target[1](raw)
+        if order is None:
+            continue
+        if target[2] is not None:
+            target[2](order)
+        pending = target[4]
+        pending.append(order)
+        replayed += 1
+        if len(pending) >= batchSize:
+            target[0].processBatch(pending)
+            target[4] = []
+    for target in targets.values():
+        if target[4]:
+            target[0].processBatch(target[4])
+    return replayed
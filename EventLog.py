@@ -0,0 +1,209 @@
+import mmap
+import struct
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import Order, OPEN, DONE, CHANGE, MATCH
+from Replay import readCapture
+try:
+    import numpy as np
+except ImportError:
+    np = None
+"""
+Memory mapped binary event log for fast historical replay
+
+Replaying JSON captures spends most of its time decoding. The event log stores the
+book relevant messages of one product already parsed, as fixed width records, so a
+replay only has to read integers out of a memory mapped file.
+
+File format:
+    header (16 bytes): magic b"CBEV", version (uint16), price decimals (uint8),
+                       size decimals (uint8), 8 reserved bytes
+    records (32 bytes each, little endian):
+        type code (uint8), side (uint8), 2 pad bytes, order index (uint32),
+        price units (int64), size units (int64), sequence (int64)
+
+    Prices and sizes are fixed-point integers (see FixedPoint.py). Order ids are interned
+    into dense indexes, the id strings are kept in a sidecar file, path + ".ids", one per
+    line with the line number as the index. Replayed books are keyed by the index.
+"""
+
+MAGIC = b"CBEV"
+VERSION = 1
+HEADER = struct.Struct("<4sHBB8x")
+EVENT = struct.Struct("<BBxxIqqq")
+SEQUENCE = struct.Struct("<q")
+SEQUENCE_OFFSET = 24
+
+# type codes stored in the log, the position is the code
+TYPE_NAMES = (OPEN, DONE, CHANGE, MATCH)
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+# numpy view of a record, matches EVENT
+EVENT_DTYPE = None if np is None else np.dtype([
+    ("type", "u1"), ("side", "u1"), ("pad", "V2"), ("order", "<u4"),
+    ("price", "<i8"), ("size", "<i8"), ("sequence", "<i8"),
+])
+
+def incrementOf(decimals):
+    """
+    returns the increment string for a number of decimal places, e.g. 2 -> "0.01"
+
+    :param decimals: the number of decimal places
+    """
+    return "0." + "0" * (decimals - 1) + "1" if decimals else "1"
+
+def convertCapture(capturePath, logPath, spec, productId=None):
+    """
+    converts a JSON capture (see Replay.py) into an event log
+
+    :param capturePath: the capture to convert
+    :param logPath: the event log to write, the id table is written to logPath + ".ids"
+    :param spec: the ProductSpec the prices and sizes are scaled with
+    :param productId: only convert frames of this product, all frames when None
+    :return: the number of events written
+    """
+    parser = MessageParser(spec)
+    ids = {}
+    count = 0
+    pack = EVENT.pack
+    with open(logPath, "wb") as log, open(logPath + ".ids", "w") as idTable:
+        log.write(HEADER.pack(MAGIC, VERSION, spec.priceDecimals, spec.sizeDecimals))
+        for _, raw in readCapture(capturePath):
+            order = parser.parseRaw(raw)
+            if order is None or (productId is not None and order.product != productId):
+                continue
+            index = ids.get(order.id)
+            if index is None:
+                index = ids[order.id] = len(ids)
+                idTable.write(order.id + "\n")
+            log.write(pack(TYPE_CODES[order.type], order.side, index, order.price, order.quantity, order.sequence))
+            count += 1
+    return count
+
+class EventLog:
+    """
+    Read access to a memory mapped event log
+
+    Attributes:
+        path: the event log file
+        spec: the ProductSpec matching the log's price and size decimals
+        count: the number of events in the log
+        useNumpy: True to decode through a NumPy structured view when NumPy is installed
+    """
+    def __init__(self, path, useNumpy=True):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, priceDecimals, sizeDecimals = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} event log")
+        self.spec = ProductSpec(None, incrementOf(priceDecimals), incrementOf(sizeDecimals))
+        self.count = (len(self.map) - HEADER.size) // EVENT.size
+        self.useNumpy = useNumpy and np is not None
+        self.ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        unmaps and closes the log
+        """
+        self.map.close()
+        self.file.close()
+
+    def array(self):
+        """
+        returns the records as a NumPy structured array backed by the mapped file, no copy is made
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for EventLog.array")
+        return np.frombuffer(self.map, dtype=EVENT_DTYPE, count=self.count, offset=HEADER.size)
+
+    def events(self, chunk=65536, start=0, stop=None):
+        """
+        yields (type code, side, order index, price, size, sequence) for every record
+
+        :param chunk: the number of records decoded at a time on the NumPy path
+        :param start: the index of the first record
+        :param stop: the index after the last record, the end of the log when None
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        if self.useNumpy:
+            records = self.array()[["type", "side", "order", "price", "size", "sequence"]]
+            for first in range(start, stop, chunk):
+                yield from records[first:min(first + chunk, stop)].tolist()
+        else:
+            view = memoryview(self.map)[HEADER.size + start * EVENT.size:HEADER.size + stop * EVENT.size]
+            try:
+                yield from EVENT.iter_unpack(view)
+            finally:
+                view.release()
+
+    def orders(self, start=0, stop=None):
+        """
+        yields every record as an Order message, the same Order object is reused for every
+        record, which is safe because the book never keeps the messages it is given
+
+        :param start: the index of the first record
+        :param stop: the index after the last record, the end of the log when None
+        """
+        order = Order(None, None, None, None, None, None)
+        for orderType, side, index, price, size, sequence in self.events(start=start, stop=stop):
+            order.type = TYPE_NAMES[orderType]
+            order.id = index
+            order.price = price
+            order.quantity = size
+            order.side = side
+            order.sequence = sequence
+            yield order
+
+    def replay(self, book, start=0, stop=None):
+        """
+        applies the records to a book created with the log's spec in a single batch
+
+        :param book: the OrderBook to replay into
+        :param start: the index of the first record
+        :param stop: the index after the last record, the end of the log when None
+        """
+        book.processBatch(self.orders(start, stop))
+
+    def sequence(self, index):
+        """
+        returns the sequence number of a record
+
+        :param index: the index of the record
+        """
+        return SEQUENCE.unpack_from(self.map, HEADER.size + index * EVENT.size + SEQUENCE_OFFSET)[0]
+
+    def bisect(self, sequence):
+        """
+        returns the index of the first record with a sequence number above sequence, the
+        records are in sequence order so this is a binary search over the mapped file
+
+        :param sequence: the sequence number
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.sequence(middle) <= sequence:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def orderId(self, index):
+        """
+        returns the original order id string of an interned index
+
+        :param index: the order index used as the book key
+        """
+        if self.ids is None:
+            with open(self.path + ".ids") as idTable:
+                self.ids = idTable.read().split("\n")
+        return self.ids[index]
@@ -0,0 +1,100 @@
+from decimal import Decimal
+"""
+Integer fixed-point support for prices and sizes
+
+Structure:
+    A ProductSpec describes the price (quote) and size (base) increments of a product.
+    When a MessageParser and an OrderBook are given a spec, decimal strings from the feed
+    are parsed straight into scaled integers (no float in between), so every book key and
+    every size calculation is integer and exact. The spec converts the scaled integers
+    back to Decimal for output.
+
+    e.g. with a quote increment of "0.01" the price "30000.01" becomes 3000001
+"""
+
+def decimalPlaces(increment: str):
+    """
+    returns the number of decimal places used by an increment string such as "0.00000001"
+
+    :param increment: the increment as sent by the exchange
+    """
+    if "." not in increment:
+        return 0
+    return len(increment.rstrip("0").partition(".")[2])
+
+def toUnits(text: str, decimals: int):
+    """
+    parses a decimal string into an integer scaled by 10 ** decimals without going through float
+
+    :param text: the decimal string to be parsed, e.g. "200.20"
+    :param decimals: the number of decimal places the result is scaled by
+    :raises ValueError: if the string has non zero digits past the supported precision
+    """
+    whole, _, frac = text.partition(".")
+    if len(frac) != decimals:
+        if len(frac) > decimals:
+            if frac[decimals:].strip("0"):
+                raise ValueError(f"{text} has more than {decimals} decimal places")
+            frac = frac[:decimals]
+        else:
+            frac = frac + "0" * (decimals - len(frac))
+    return int(whole + frac)
+
+class ProductSpec:
+    """
+    Represents the fixed-point configuration of a single product
+
+    Attributes:
+        productId: the product this spec applies to, e.g. "BTC-USD"
+        priceDecimals: the number of decimal places prices are scaled by
+        sizeDecimals: the number of decimal places sizes are scaled by
+        tick: the quote increment expressed in price units
+        lot: the base increment expressed in size units
+    """
+    def __init__(self, productId: str, quoteIncrement: str, baseIncrement: str):
+        self.productId = productId
+        self.priceDecimals = decimalPlaces(quoteIncrement)
+        self.sizeDecimals = decimalPlaces(baseIncrement)
+        self.tick = toUnits(quoteIncrement, self.priceDecimals)
+        self.lot = toUnits(baseIncrement, self.sizeDecimals)
+
+    @classmethod
+    def fromProduct(cls, product):
+        """
+        builds a spec from a product entry of the exchange's /products endpoint
+
+        :param product: dict with "id", "quote_increment" and "base_increment"
+        """
+        return cls(product["id"], product["quote_increment"], product["base_increment"])
+
+    def priceUnits(self, text: str):
+        """
+        parses a price string into price units
+
+        :param text: the price as sent by the exchange
+        """
+        return toUnits(text, self.priceDecimals)
+
+    def sizeUnits(self, text: str):
+        """
+        parses a size string into size units
+
+        :param text: the size as sent by the exchange
+        """
+        return toUnits(text, self.sizeDecimals)
+
+    def price(self, units: int):
+        """
+        converts price units back to a Decimal price
+
+        :param units: the scaled integer price
+        """
+        return Decimal(units).scaleb(-self.priceDecimals)
+
+    def size(self, units: int):
+        """
+        converts size units back to a Decimal size
+
+        :param units: the scaled integer size
+        """
+        return Decimal(units).scaleb(-self.sizeDecimals)
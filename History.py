@@ -0,0 +1,251 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from EventLog import EventLog, HEADER, EVENT, MAGIC, VERSION, TYPE_CODES
+from MessageParser import MessageParser, loads, parseTime
+from OrderBook import OrderBook
+from Replay import readCapture
+"""
+Indexed book history for time travel queries
+
+Structure:
+    A history directory holds the book relevant messages of one product and periodic
+    checkpoints of the book they build:
+        events.bin: an event log (see EventLog.py), one fixed width record per message in
+                    sequence order, order ids interned into dense indexes (events.bin.ids)
+        events.bin.times: the time of every record as int64 nanoseconds since the epoch,
+                    non decreasing, so it can be binary searched like the sequences
+        checkpoints/<events>.ckpt: the book after its first <events> records, written
+                    with OrderBook.save_snapshot every interval records
+        index.json: the interval and the checkpoints as [sequence, events, time, file]
+
+    book_at(sequence) finds the records up to sequence with a binary search over the
+    mapped log, loads the last checkpoint taken before them and replays only the records
+    after it, so a query costs one checkpoint load plus at most interval records whatever
+    the position in the day. book_at_time(timestamp) does the same from the times file.
+    The books are fixed-point and keyed by the dense order indexes, orderId() gives the
+    original id back.
+
+    A HistoryWriter builds the directory from parsed orders as they arrive, buildHistory()
+    feeds it a capture (see Replay.py).
+"""
+
+LOG_FILE = "events.bin"
+INDEX_FILE = "index.json"
+CHECKPOINT_DIR = "checkpoints"
+TIME = struct.Struct("<q")
+
+class HistoryWriter:
+    """
+    Appends parsed orders to a history directory and checkpoints the book they build
+
+    Attributes:
+        directory: the history directory
+        interval: the number of records between two checkpoints
+        book: the OrderBook built from the records, keyed by the dense order indexes
+        ids: the dense index of every order id seen, as id : index
+        count: the number of records written
+        lastTime: the time of the last record in nanoseconds
+        checkpoints: the checkpoints written as [sequence, events, time, file]
+    """
+    def __init__(self, directory, spec, interval=10000):
+        if interval < 1:
+            raise ValueError("the checkpoint interval needs at least one record")
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(os.path.join(directory, CHECKPOINT_DIR), exist_ok=True)
+        self.book = OrderBook(spec)
+        logPath = os.path.join(directory, LOG_FILE)
+        self.log = open(logPath, "wb")
+        self.log.write(HEADER.pack(MAGIC, VERSION, spec.priceDecimals, spec.sizeDecimals))
+        self.idTable = open(logPath + ".ids", "w")
+        self.times = open(logPath + ".times", "wb")
+        self.ids = {}
+        self.count = 0
+        self.lastTime = 0
+        self.checkpoints = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, order, timestamp):
+        """
+        appends a parsed order and applies it to the book, the order's id is replaced by
+        its dense index
+
+        :param order: the Order parsed with the writer's spec
+        :param timestamp: the time of the message in nanoseconds since the epoch, times
+                          earlier than the previous record are raised to it
+        """
+        index = self.ids.get(order.id)
+        if index is None:
+            index = self.ids[order.id] = len(self.ids)
+            self.idTable.write(f"{order.id}\n")
+        self.log.write(EVENT.pack(TYPE_CODES[order.type], order.side, index, order.price, order.quantity, order.sequence))
+        self.lastTime = max(self.lastTime, timestamp)
+        self.times.write(TIME.pack(self.lastTime))
+        order.id = index
+        self.book.processMessage(order)
+        self.count += 1
+        if self.count % self.interval == 0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        writes a checkpoint of the book after the records written so far
+        """
+        name = f"{self.count:012d}.ckpt"
+        self.book.save_snapshot(os.path.join(self.directory, CHECKPOINT_DIR, name))
+        self.checkpoints.append([self.book.currSeqNum, self.count, self.lastTime, name])
+
+    def close(self):
+        """
+        closes the files and writes the index
+        """
+        self.log.close()
+        self.idTable.close()
+        self.times.close()
+        with open(os.path.join(self.directory, INDEX_FILE), "w") as index:
+            json.dump({"interval": self.interval, "checkpoints": self.checkpoints}, index)
+
+def buildHistory(capturePath, directory, spec, productId=None, interval=10000):
+    """
+    builds a history directory from a capture
+
+    :param capturePath: the capture to read, see Replay.py
+    :param directory: the history directory to write
+    :param spec: the ProductSpec prices and sizes are scaled with
+    :param productId: only keep messages of this product, all messages when None
+    :param interval: the number of records between two checkpoints
+    :return: the number of records written
+    """
+    parser = MessageParser(spec)
+    with HistoryWriter(directory, spec, interval) as writer:
+        for timestamp, raw in readCapture(capturePath):
+            order = parser.parseRaw(raw)
+            if order is None or (productId is not None and order.product != productId):
+                continue
+            if timestamp is None:
+                # newline delimited captures have no receive time, use the message time
+                text = loads(raw).get("time")
+                timestamp = int(parseTime(text) * 1e9) if text else writer.lastTime
+            writer.append(order, timestamp)
+        return writer.count
+
+class HistoryStore:
+    """
+    Random access to the book state of a history directory
+
+    Attributes:
+        directory: the history directory
+        log: the EventLog of the records
+        spec: the ProductSpec of the books returned
+        interval: the number of records between two checkpoints
+        checkpoints: the checkpoints as [sequence, events, time, file], in order
+    """
+    def __init__(self, directory, useNumpy=True):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as index:
+            index = json.load(index)
+        self.interval = index["interval"]
+        self.checkpoints = index["checkpoints"]
+        self.checkpointEvents = [checkpoint[1] for checkpoint in self.checkpoints]
+        self.log = EventLog(os.path.join(directory, LOG_FILE), useNumpy=useNumpy)
+        self.spec = self.log.spec
+        self.timesFile = open(os.path.join(directory, LOG_FILE + ".times"), "rb")
+        self.times = mmap.mmap(self.timesFile.fileno(), 0, access=mmap.ACCESS_READ) if self.log.count else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        unmaps and closes the files
+        """
+        if self.times is not None:
+            self.times.close()
+        self.timesFile.close()
+        self.log.close()
+
+    def __len__(self):
+        return self.log.count
+
+    def time(self, index):
+        """
+        returns the time of a record in nanoseconds since the epoch
+
+        :param index: the index of the record
+        """
+        return TIME.unpack_from(self.times, index * TIME.size)[0]
+
+    def bisectTime(self, timestamp):
+        """
+        returns the number of records at or before a time
+
+        :param timestamp: nanoseconds since the epoch
+        """
+        low, high = 0, self.log.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.time(middle) <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def sequenceAt(self, timestamp):
+        """
+        returns the sequence number of the last record at or before a time, None if there is none
+
+        :param timestamp: nanoseconds since the epoch
+        """
+        events = self.bisectTime(timestamp)
+        return self.log.sequence(events - 1) if events else None
+
+    def bookAfter(self, events):
+        """
+        returns a new OrderBook holding the state after the first events records
+
+        :param events: the number of records applied
+        """
+        book = OrderBook(self.spec)
+        position = bisect_right(self.checkpointEvents, events)
+        start = 0
+        if position:
+            sequence, start, _, name = self.checkpoints[position - 1]
+            book.load_snapshot(os.path.join(self.directory, CHECKPOINT_DIR, name))
+        self.log.replay(book, start, events)
+        return book
+
+    def book_at(self, sequence):
+        """
+        returns a new OrderBook holding the state after every message up to and including
+        a sequence number
+
+        :param sequence: the sequence number
+        """
+        return self.bookAfter(self.log.bisect(sequence))
+
+    def book_at_time(self, timestamp):
+        """
+        returns a new OrderBook holding the state after every message at or before a time
+
+        :param timestamp: nanoseconds since the epoch
+        """
+        return self.bookAfter(self.bisectTime(timestamp))
+
+    def orderId(self, index):
+        """
+        returns the original order id of a dense index used as a book key
+
+        :param index: the order index
+        """
+        return self.log.orderId(index)
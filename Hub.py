@@ -0,0 +1,355 @@
+import asyncio
+from collections import deque
+from L2Diff import L2DiffStream
+from MessageParser import loads
+try:
+    from orjson import dumps as _dumps
+except ImportError:
+    import json
+    _dumps = None
+"""
+Local distribution hub that fans the books of one feed out to many client processes
+
+Structure:
+    A BookHub attaches an L2DiffStream to the book of every product of a BookManager and
+    serves clients over TCP or a Unix socket with newline delimited JSON. A client sends
+        {"op": "subscribe", "products": ["BTC-USD"]}   (or "unsubscribe")
+    and receives, per product, a snapshot followed by incremental updates:
+        {"type": "snapshot", "product": "BTC-USD", "sequence": 1, "bids": [[price, size], ...], "asks": [...]}
+        {"type": "l2", "product": "BTC-USD", "sequence": 2, "changes": [[side, price, size], ...]}
+    side is 1 for buy and 0 for sell, a size of 0 removes the level. Fixed-point books
+    send prices and sizes as decimal strings. Every update is encoded once and the same
+    bytes are queued for every subscriber, fan-out costs one append per client.
+    A product's stream is only attached to its book while it has subscribers, books
+    nobody listens to pay nothing. The stream shares the book's level log with any other
+    L2DiffStream of the book, see L2Diff.py.
+
+    Each client has a bounded send queue drained by its own writer task, so a slow
+    reader never blocks the book. When a client's queue is full the slow consumer policy
+    decides what happens:
+        disconnect: the client is dropped
+        resnapshot: the queued updates are discarded and replaced by fresh snapshots of
+                    the client's products, the client catches up at the cost of a reset
+    The streams are fed by book listeners, so the books must be processed on the hub's
+    event loop (a FeedPipeline with threaded=False).
+"""
+
+DISCONNECT = "disconnect"
+RESNAPSHOT = "resnapshot"
+
+def dumps(message):
+    """
+    encodes a message as one line of compact JSON
+
+    :param message: the message dict
+    :return: the encoded line as bytes, newline included
+    """
+    if _dumps is not None:
+        return _dumps(message) + b"\n"
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+class HubClient:
+    """
+    Send side of one connected client
+
+    Attributes:
+        writer: the asyncio StreamWriter of the connection
+        maxQueue: the maximum number of messages waiting to be written
+        products: the product ids the client is subscribed to
+        queue: encoded messages waiting to be written
+        sent: the number of messages written
+        resnapshots: the number of times the queue overflowed and was replaced by snapshots
+    """
+    def __init__(self, writer, maxQueue):
+        self.writer = writer
+        self.maxQueue = maxQueue
+        self.products = set()
+        self.queue = deque()
+        self.sent = 0
+        self.resnapshots = 0
+        self.wakeup = asyncio.Event()
+
+    def send(self, data):
+        """
+        queues an encoded message
+
+        :param data: the encoded message
+        :return: False if the queue is full and the message was not queued
+        """
+        if len(self.queue) >= self.maxQueue:
+            return False
+        self.queue.append(data)
+        self.wakeup.set()
+        return True
+
+    async def run(self):
+        """
+        writes queued messages until the connection is closed, everything queued since the
+        last write goes out in a single write
+        """
+        queue = self.queue
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while queue:
+                count = len(queue)
+                self.writer.write(b"".join(queue))
+                queue.clear()
+                self.sent += count
+                await self.writer.drain()
+
+class BookHub:
+    """
+    Serves snapshots and L2 updates of the books of a BookManager to local clients
+
+    Attributes:
+        manager: the BookManager whose books are served
+        depth: the number of levels per side served, None for the whole book, the books of
+               a depth windowed product are served up to their window, see streamDepth
+        maxQueue: the send queue bound of each client
+        policy: the slow consumer policy, DISCONNECT or RESNAPSHOT
+        streams: the L2DiffStream of each product with subscribers as product id : stream
+        subscribers: the clients subscribed to each product as product id : set of HubClient
+        clients: every connected client
+        handlers: the tasks serving the connections
+        servers: the listening asyncio servers
+        updates: the number of updates encoded
+        disconnects: the number of clients dropped by the slow consumer policy
+        resnapshots: the number of snapshot resets caused by the slow consumer policy
+    """
+    def __init__(self, manager, depth=None, maxQueue=1000, policy=RESNAPSHOT):
+        if policy not in (DISCONNECT, RESNAPSHOT):
+            raise ValueError(f"unknown slow consumer policy {policy}")
+        self.manager = manager
+        self.depth = depth
+        self.maxQueue = maxQueue
+        self.policy = policy
+        self.streams = {}
+        self.subscribers = {productId: set() for productId in manager.products}
+        self.clients = set()
+        self.handlers = set()
+        self.servers = []
+        self.updates = 0
+        self.disconnects = 0
+        self.resnapshots = 0
+
+    async def start(self, host=None, port=None, path=None):
+        """
+        starts listening on a TCP address and/or a Unix socket path
+
+        :param host: the TCP host, e.g. "127.0.0.1"
+        :param port: the TCP port, 0 picks a free one
+        :param path: the Unix socket path
+        """
+        if port is not None:
+            self.servers.append(await asyncio.start_server(self.handle, host, port))
+        if path is not None:
+            self.servers.append(await asyncio.start_unix_server(self.handle, path))
+
+    def addresses(self):
+        """
+        returns the addresses the hub is listening on
+        """
+        return [socket.getsockname() for server in self.servers for socket in server.sockets]
+
+    async def close(self):
+        """
+        stops listening, disconnects every client and detaches the streams from the books
+        """
+        for server in self.servers:
+            server.close()
+        for client in list(self.clients):
+            client.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        for productId in list(self.streams):
+            self.streams.pop(productId).close()
+
+    def stats(self):
+        """
+        returns the fan-out counters of the hub
+        """
+        return {
+            "clients": len(self.clients),
+            "streams": len(self.streams),
+            "subscriptions": {productId: len(clients) for productId, clients in self.subscribers.items()},
+            "updates": self.updates,
+            "sent": sum(client.sent for client in self.clients),
+            "queued": sum(len(client.queue) for client in self.clients),
+            "disconnects": self.disconnects,
+            "resnapshots": self.resnapshots,
+        }
+
+    def encodeLevels(self, productId, levels):
+        # converts (price, size) pairs to their wire form
+        book = self.manager.book(productId)
+        if book.spec is None:
+            return levels
+        return [[str(book.priceOf(price)), str(book.sizeOf(size))] for price, size in levels]
+
+    def snapshotMessage(self, productId):
+        """
+        returns the encoded snapshot of a product
+
+        :param productId: the product id
+        """
+        update = self.streams[productId].snapshot()
+        bids = [[price, size] for side, price, size in update.deltas if side]
+        asks = [[price, size] for side, price, size in update.deltas if not side]
+        return dumps({
+            "type": "snapshot", "product": productId, "sequence": update.sequence,
+            "bids": self.encodeLevels(productId, bids), "asks": self.encodeLevels(productId, asks),
+        })
+
+    def onUpdate(self, productId, update):
+        """
+        L2DiffStream sink, encodes the update once and queues it for every subscriber
+
+        :param productId: the product the update belongs to
+        :param update: the L2Update
+        """
+        subscribers = self.subscribers[productId]
+        if not subscribers:
+            return
+        if update.reset:
+            data = self.snapshotMessage(productId)
+        else:
+            book = self.manager.book(productId)
+            if book.spec is None:
+                changes = update.deltas
+            else:
+                changes = [[side, str(book.priceOf(price)), str(book.sizeOf(size))] for side, price, size in update.deltas]
+            data = dumps({"type": "l2", "product": productId, "sequence": update.sequence, "changes": changes})
+        self.updates += 1
+        for client in list(subscribers):
+            if not client.send(data):
+                self.slowConsumer(client)
+
+    def slowConsumer(self, client):
+        """
+        applies the slow consumer policy to a client whose queue is full
+
+        :param client: the HubClient
+        """
+        if self.policy == DISCONNECT:
+            self.disconnects += 1
+            self.drop(client)
+            client.writer.close()
+        else:
+            self.resnapshots += 1
+            client.resnapshots += 1
+            client.queue.clear()
+            for productId in client.products:
+                client.send(self.snapshotMessage(productId))
+
+    def streamDepth(self, productId):
+        """
+        returns the depth of a product's stream, a WindowedOrderBook only has the levels of
+        its window in full so the depth is clamped to it
+
+        :param productId: the product id
+        """
+        window = getattr(self.manager.book(productId), "window", None)
+        if window is None:
+            return self.depth
+        return window if self.depth is None else min(self.depth, window)
+
+    def subscribe(self, client, productId):
+        # adds a subscriber and sends it the snapshot, the first one attaches the stream
+        if productId not in self.streams:
+            stream = L2DiffStream(self.manager.book(productId), depth=self.streamDepth(productId))
+            stream.subscribe(lambda update: self.onUpdate(productId, update))
+            self.streams[productId] = stream
+        client.products.add(productId)
+        self.subscribers[productId].add(client)
+        client.send(self.snapshotMessage(productId))
+
+    def unsubscribe(self, client, productId):
+        # removes a subscriber, the last one detaches the stream
+        client.products.discard(productId)
+        subscribers = self.subscribers[productId]
+        subscribers.discard(client)
+        if not subscribers and productId in self.streams:
+            self.streams.pop(productId).close()
+
+    def drop(self, client):
+        # forgets every subscription of a client
+        for productId in list(client.products):
+            self.unsubscribe(client, productId)
+        self.clients.discard(client)
+
+    async def handle(self, reader, writer):
+        """
+        serves one client connection, requests are read until the client disconnects
+
+        :param reader: the asyncio StreamReader of the connection
+        :param writer: the asyncio StreamWriter of the connection
+        """
+        client = HubClient(writer, self.maxQueue)
+        self.clients.add(client)
+        handler = asyncio.current_task()
+        self.handlers.add(handler)
+        sender = asyncio.ensure_future(client.run())
+        try:
+            while not reader.at_eof() and client in self.clients:
+                line = await reader.readline()
+                if line.strip():
+                    self.request(client, line)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.drop(client)
+            self.handlers.discard(handler)
+            sender.cancel()
+            writer.close()
+
+    def request(self, client, line):
+        """
+        handles one request line of a client
+
+        :param client: the HubClient that sent the request
+        :param line: the raw request line
+        """
+        try:
+            request = loads(line)
+            op = request["op"]
+            products = request["products"]
+        except (ValueError, KeyError, TypeError):
+            client.send(dumps({"type": "error", "message": "malformed request"}))
+            return
+        unknown = [productId for productId in products if productId not in self.subscribers]
+        if unknown:
+            client.send(dumps({"type": "error", "message": "unknown products", "products": unknown}))
+        for productId in products:
+            if productId not in self.subscribers:
+                continue
+            if op == "subscribe" and productId not in client.products:
+                self.subscribe(client, productId)
+            elif op == "unsubscribe" and productId in client.products:
+                self.unsubscribe(client, productId)
+
+async def hubMessages(products, host=None, port=None, path=None):
+    """
+    connects to a BookHub, subscribes to products and yields every decoded message
+
+    :param products: the product ids to subscribe to
+    :param host: the TCP host of the hub
+    :param port: the TCP port of the hub
+    :param path: the Unix socket path of the hub, used instead of host and port when given
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 24)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+    try:
+        writer.write(dumps({"op": "subscribe", "products": list(products)}))
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            yield loads(line)
+    finally:
+        writer.close()
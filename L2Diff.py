@@ -0,0 +1,199 @@
+from collections import namedtuple
+"""
+Incremental L2 diff stream built from the level changes of an OrderBook
+
+Structure:
+    The first L2DiffStream of a book hands it a LevelLog as its levelLog. addOrder,
+    removeOrder and matchOrder (and changeOrder through them) append a (side, price,
+    total_size) delta for every level they touch, side 1 for buy and 0 for sell,
+    total_size 0 once the level is gone. The LevelLog is a book listener, so after every
+    processMessage and once per processBatch it hands the logged deltas to every stream
+    of the book and then clears them, each stream turns them into an L2Update for its
+    sinks. Streams with different depths or coalescing (the Hub's and a Publisher's, say)
+    therefore share one book, the last one closed detaches the log. The work done per
+    update is proportional to the levels that changed, not to the size of the book.
+
+    coalesce: the deltas of one update are merged so each level appears once with its
+        final size, a level that was added and removed again inside a batch is still sent
+        with size 0 as a consumer can not know it never existed
+    depth: the stream only covers the top depth levels of each side. The window is
+        compared against the previously sent one, levels that leave it are sent with
+        size 0 and levels that enter it are sent with their size, whether or not they
+        changed themselves.
+
+    When bulkLoad replaces the book (a bootstrap or resync) the next update is a reset:
+    its deltas are the full book (or window) and consumers must drop their levels first.
+"""
+
+# deltas is a list of (side, price, size), prices and sizes in book units
+L2Update = namedtuple("L2Update", ["sequence", "deltas", "reset"])
+
+class LevelLog(list):
+    """
+    The level changes of a book, shared by all its L2DiffStreams
+
+    Attributes:
+        book: the OrderBook logging into the list
+        streams: the L2DiffStreams the logged changes are handed to
+    """
+    def __init__(self, book):
+        super().__init__()
+        self.book = book
+        self.streams = []
+        book.levelLog = self
+        book.addListener(self.onUpdate)
+
+    def onUpdate(self, book):
+        """
+        book listener, hands the logged level changes to every stream and clears them
+
+        :param book: the OrderBook that was updated
+        """
+        if not self:
+            return
+        for stream in self.streams:
+            stream.publish(self)
+        self.clear()
+
+    def detach(self, stream):
+        """
+        removes a stream, the last one stops the book from logging level changes
+
+        :param stream: the L2DiffStream to remove
+        """
+        self.streams.remove(stream)
+        if not self.streams:
+            self.book.removeListener(self.onUpdate)
+            self.book.levelLog = None
+
+class L2DiffStream:
+    """
+    Publishes the level changes of an OrderBook as L2Updates
+
+    Attributes:
+        book: the OrderBook being streamed
+        depth: the number of levels per side covered, None for the whole book
+        coalesce: True to merge the deltas of an update so each level appears once
+        sinks: callables that receive each L2Update
+        window: the levels last sent for each side as price : size, only kept with a depth
+        updates: the number of L2Updates published
+        deltas: the number of deltas published
+        log: the book's LevelLog, shared with the book's other streams
+    """
+    def __init__(self, book, depth=None, coalesce=True):
+        log = book.levelLog
+        if log is None:
+            log = LevelLog(book)
+        elif not isinstance(log, LevelLog):
+            raise ValueError("the book's level log is not shared through a LevelLog")
+        self.book = book
+        self.depth = depth
+        self.coalesce = coalesce or depth is not None
+        self.sinks = []
+        self.window = (self._levels(0), self._levels(1)) if depth is not None else None
+        self.updates = 0
+        self.deltas = 0
+        self.log = log
+        log.streams.append(self)
+
+    def subscribe(self, sink):
+        """
+        adds a sink that receives every L2Update
+
+        :param sink: callable taking an L2Update
+        """
+        self.sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        """
+        removes a previously subscribed sink
+
+        :param sink: the sink to be removed
+        """
+        self.sinks.remove(sink)
+
+    def close(self):
+        """
+        detaches the stream from the book, the book stops logging level changes once its
+        last stream is closed
+        """
+        self.log.detach(self)
+
+    def snapshot(self):
+        """
+        returns the levels covered by the stream as a reset L2Update, used to start a new
+        consumer before it applies the following updates
+        """
+        if self.window is not None:
+            levels = self.window
+        else:
+            levels = (self._levels(0), self._levels(1))
+        deltas = [(side, price, size) for side in (1, 0) for price, size in levels[side].items()]
+        return L2Update(self.book.currSeqNum, deltas, True)
+
+    def publish(self, log):
+        """
+        turns the level changes logged since the last update into an L2Update, called by
+        the book's LevelLog which clears the log once every stream has read it
+
+        :param log: the logged (side, price, size) deltas, starting with None after a bulkLoad
+        """
+        reset = log[0] is None
+        if reset:
+            deltas = None
+        elif self.window is not None:
+            deltas = self._windowDeltas(log)
+        elif self.coalesce and len(log) > 1:
+            merged = {}
+            for side, price, size in log:
+                merged[side, price] = size
+            deltas = [(side, price, size) for (side, price), size in merged.items()]
+        else:
+            deltas = log[:]
+
+        if reset:
+            if self.window is not None:
+                self.window = (self._levels(0), self._levels(1))
+            update = self.snapshot()
+        else:
+            if not deltas:
+                return
+            update = L2Update(self.book.currSeqNum, deltas, False)
+        self.updates += 1
+        self.deltas += len(update.deltas)
+        for sink in self.sinks:
+            sink(update)
+
+    def _levels(self, side):
+        # the covered levels of a side as price : size, best first
+        if side:
+            limits = self.book.buyLimits.values()
+            limits = reversed(limits[-self.depth:] if self.depth is not None else limits)
+        else:
+            limits = self.book.askLimits.values()
+            limits = limits[:self.depth] if self.depth is not None else limits
+        return {limit.price: limit.total_size for limit in limits} if self.depth != 0 else {}
+
+    def _windowDeltas(self, log):
+        # compares the top depth levels of each side with the ones sent last time, a side
+        # is only rebuilt when a logged change reached into its window
+        deltas = []
+        window = []
+        for side in (0, 1):
+            previous = self.window[side]
+            if previous and len(previous) >= self.depth:
+                edge = min(previous) if side else max(previous)
+                if not any(entry[0] == side and (entry[1] >= edge if side else entry[1] <= edge) for entry in log):
+                    window.append(previous)
+                    continue
+            current = self._levels(side)
+            for price, size in current.items():
+                if previous.get(price) != size:
+                    deltas.append((side, price, size))
+            for price in previous:
+                if price not in current:
+                    deltas.append((side, price, 0))
+            window.append(current)
+        self.window = tuple(window)
+        return deltas
@@ -1,9 +1,127 @@
-from OrderBook import Order
+import uuid
+from datetime import datetime
+from OrderBook import Order, OPEN, DONE, CHANGE, MATCH
+
+# use a faster JSON backend when one is installed, fall back to the standard library
+try:
+    from orjson import loads
+except ImportError:
+    try:
+        from ujson import loads
+    except ImportError:
+        from json import loads
+
+def rawString(raw, field):
+    """
+    extracts the value of a string field from a raw JSON frame without decoding it
+
+    :param raw: the JSON text received from the websocket
+    :param field: the name of the field, e.g. "type"
+    :return: the field value, or None if the frame does not have the field
+    """
+    start = raw.find(f'"{field}"')
+    if start < 0:
+        return None
+    start = raw.find('"', raw.find(":", start + len(field) + 2)) + 1
+    return raw[start:raw.find('"', start)]
+
+def messageType(raw):
+    """
+    extracts the value of the "type" field from a raw JSON frame without decoding it
+
+    :param raw: the JSON text received from the websocket
+    :return: the type string, or None if the frame has no type field
+    """
+    return rawString(raw, "type")
+
+def messageProduct(raw):
+    """
+    extracts the value of the "product_id" field from a raw JSON frame without decoding it
+
+    :param raw: the JSON text received from the websocket
+    :return: the product id, or None if the frame has no product_id field
+    """
+    return rawString(raw, "product_id")
+
+def messageSequence(raw):
+    """
+    extracts the value of the "sequence" field from a raw JSON frame without decoding it,
+    every message on the full channel carries one, including the types the book drops
+
+    :param raw: the JSON text received from the websocket
+    :return: the sequence number, or None if the frame has no sequence field
+    """
+    start = raw.find('"sequence"')
+    if start < 0:
+        return None
+    start = raw.find(":", start + 10) + 1
+    end = raw.find(",", start)
+    if end < 0:
+        end = raw.find("}", start)
+    return int(raw[start:end])
+
+def uuidToInt(text):
+    """
+    converts a canonical UUID string into its 128-bit integer, other ids are returned as is
+
+    :param text: the order id from the message
+    :return: the integer handle, or text when it is not a canonical UUID
+    """
+    if len(text) == 36 and text[8] == "-" and text[13] == "-" and text[18] == "-" and text[23] == "-":
+        try:
+            return int(text.replace("-", ""), 16)
+        except ValueError:
+            pass
+    return text
+
+def idText(iden):
+    """
+    returns the order id string of a book key, undoing uuidToInt
+
+    :param iden: the order id as stored in the book, an integer handle or a string
+    """
+    if isinstance(iden, int):
+        return str(uuid.UUID(int=iden))
+    return iden
+
+def parseTime(text):
+    """
+    converts an ISO 8601 message time such as "2014-11-07T08:19:27.028459Z" into seconds
+    since the epoch
+
+    :param text: the time field of a message
+    """
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    return datetime.fromisoformat(text).timestamp()
 
 class MessageParser:
     """
     A MessageParser is an object that is used to parse incoming order messages
+
+    Attributes:
+        spec: optional ProductSpec, when given prices and sizes are parsed into scaled
+              integers instead of floats
+        internIds: True to convert UUID order ids into 128-bit integer handles, which are
+                   smaller than the strings and cheaper to hash, idText recovers the string
+        matchTimes: True to decode the time of match messages into Order.time for the
+                    trade tape, the other messages never decode their time
     """
+    def __init__(self, spec=None, internIds=False, matchTimes=False):
+        self.spec = spec
+        self.internIds = internIds
+        self.matchTimes = matchTimes
+        self.toPrice = float if spec is None else spec.priceUnits
+        self.toSize = float if spec is None else spec.sizeUnits
+
+        # the message types the book consumes and their parse methods
+        self.parsers = {
+            OPEN: self.parseOpen,
+            DONE: self.parseDone,
+            CHANGE: self.parseChange,
+            MATCH: self.parseMatch,
+        }
+
     def __call__(self, message):
         """
         Special method used so that you can direclty call the object on messages
@@ -14,20 +132,24 @@ class MessageParser:
 
         :param message: message receieved from the websocket that is to be parsed
         """
-        # extract the type for matching
-        orderType = message["type"]
-        
         # dispatch to proper parse method
-        if orderType == "open":
-            return self.parseOpen(message)
-        elif orderType == "done":
-            return self.parseDone(message)
-        elif orderType == "change":
-            return self.parseChange(message)
-        elif orderType == "match":
-            return self.parseMatch(message)
-        else:
+        parse = self.parsers.get(message["type"])
+        if parse is None:
+            return None
+        return parse(message)
+
+    def parseRaw(self, raw):
+        """
+        parses a raw JSON frame straight from the websocket
+        the type is read from the text first so frames the book does not consume
+        (received, activate, heartbeats, ...) are dropped without being decoded
+
+        :param raw: the JSON text received from the websocket
+        """
+        parse = self.parsers.get(messageType(raw))
+        if parse is None:
             return None
+        return parse(loads(raw))
 
     def parseOpen(self, message):
         """
@@ -36,11 +158,13 @@ class MessageParser:
         :param message: the open message to be parsed
         """
         orderId = message["order_id"]
-        orderPrice = float(message["price"])
-        orderSize = float(message["remaining_size"])
+        if self.internIds:
+            orderId = uuidToInt(orderId)
+        orderPrice = self.toPrice(message["price"])
+        orderSize = self.toSize(message["remaining_size"])
         orderSide = 0 if message["side"] == "sell" else 1
         orderSeq = int(message["sequence"])
-        return Order("open", orderId, orderPrice, orderSize, orderSide, orderSeq)
+        return Order(OPEN, orderId, orderPrice, orderSize, orderSide, orderSeq, message.get("product_id"))
 
     def parseDone(self, message):
         """
@@ -49,15 +173,17 @@ class MessageParser:
         :param message: the done message to be parsed
         """
         orderId = message["order_id"]
+        if self.internIds:
+            orderId = uuidToInt(orderId)
         # deal with case where done message is sent without price
         if "price" in message:
-            orderPrice = float(message["price"])
+            orderPrice = self.toPrice(message["price"])
         else:
             return None
-        orderSize = float(message["remaining_size"])
+        orderSize = self.toSize(message["remaining_size"])
         orderSide = 0 if message["side"] == "sell" else 1
         orderSeq = int(message["sequence"])
-        return Order("done", orderId, orderPrice, orderSize, orderSide, orderSeq)
+        return Order(DONE, orderId, orderPrice, orderSize, orderSide, orderSeq, message.get("product_id"))
 
     def parseChange(self, message):
         """
@@ -66,18 +192,20 @@ class MessageParser:
         :param message: the change message to be parsed
         """
         orderId = message["order_id"]
+        if self.internIds:
+            orderId = uuidToInt(orderId)
         orderReason = message["reason"]
-        orderSize = float(message["new_size"])
+        orderSize = self.toSize(message["new_size"])
 
         # differentiate between STP and price change
         if orderReason == "STP":
-            orderPrice = float(message["price"])
+            orderPrice = self.toPrice(message["price"])
         else:
-            orderPrice = float(message["new_price"])
+            orderPrice = self.toPrice(message["new_price"])
 
         orderSide = 0 if message["side"] == "sell" else 1
         orderSeq = int(message["sequence"])
-        return Order("change", orderId, orderPrice, orderSize, orderSide, orderSeq)
+        return Order(CHANGE, orderId, orderPrice, orderSize, orderSide, orderSeq, message.get("product_id"))
 
     def parseMatch(self, message):
         """
@@ -86,11 +214,15 @@ class MessageParser:
         :param message: the match message to be parsed
         """
         orderId = message["maker_order_id"]
-        orderPrice = float(message["price"])
-        orderSize = float(message["size"])
+        if self.internIds:
+            orderId = uuidToInt(orderId)
+        orderPrice = self.toPrice(message["price"])
+        orderSize = self.toSize(message["size"])
         orderSide = 0 if message["side"] == "sell" else 1
         orderSeq = int(message["sequence"])
-        return Order("match", orderId, orderPrice, orderSize, orderSide, orderSeq)
+        # the trade time is only decoded for the trade tape, see Trades.py
+        orderTime = parseTime(message["time"]) if self.matchTimes and "time" in message else None
+        return Order(MATCH, orderId, orderPrice, orderSize, orderSide, orderSeq, message.get("product_id"), orderTime)
 
 
 
@@ -0,0 +1,371 @@
+import asyncio
+from time import perf_counter_ns
+from MessageParser import MessageParser, messageType, loads
+from OrderBook import OrderBook, sortedSide
+"""
+Optional hot path instrumentation for the parser and the book
+
+Structure:
+    A Metrics registry holds counters, gauges and latency histograms, each identified by a
+    name and a set of labels. InstrumentedMessageParser and InstrumentedOrderBook are drop
+    in subclasses that time every message per type into the registry, the plain classes
+    are untouched so an uninstrumented book pays nothing. Book size gauges are callables
+    evaluated when the metrics are read, never on the message path.
+
+    LatencyHistogram is HDR style: values below 2 * 2 ** subBits nanoseconds get a bucket
+    each, above that every power of two is split into 2 ** subBits buckets, so the
+    relative error of a percentile stays under 2 ** -subBits at any magnitude and
+    recording is a couple of integer operations.
+
+    snapshot() is the pull API, text() renders the Prometheus text exposition format
+    (histograms as summaries) and serveMetrics() exposes it over HTTP. Collectors add
+    series rendered elsewhere, e.g. by the shard worker processes, to text().
+"""
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+class Counter:
+    """
+    Represents a monotonically increasing count, hot paths increment value directly
+
+    Attributes:
+        value: the current count
+    """
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        """
+        increments the counter
+
+        :param amount: the amount to add
+        """
+        self.value += amount
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of integer latencies in nanoseconds
+
+    Attributes:
+        subBits: log2 of the number of buckets each power of two is split into
+        counts: the number of values recorded in each bucket
+        count: the number of values recorded
+        total: the sum of the values recorded
+        min: the smallest value recorded, None when empty
+        max: the largest value recorded, None when empty
+    """
+    def __init__(self, subBits=5):
+        self.subBits = subBits
+        self.subCount = 1 << subBits
+        self.counts = [0] * ((66 - subBits) << subBits)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """
+        records a value
+
+        :param value: the latency in nanoseconds, a non negative int
+        """
+        if value < self.subCount << 1:
+            index = value
+        else:
+            shift = value.bit_length() - self.subBits - 1
+            index = (shift << self.subBits) + (value >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def bucketMax(self, index):
+        """
+        returns the largest value that falls in a bucket
+
+        :param index: the bucket index
+        """
+        if index < self.subCount << 1:
+            return index
+        shift = (index >> self.subBits) - 1
+        top = self.subCount + (index & (self.subCount - 1))
+        return ((top + 1) << shift) - 1
+
+    def percentile(self, q):
+        """
+        returns the value below which a fraction q of the recorded values fall, it is
+        accurate to the bucket width and never above max, None when empty
+
+        :param q: the fraction, between 0 and 1
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, round(q * self.count))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                return min(self.bucketMax(index), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        returns count, sum, min, max, mean and the QUANTILES of the recorded values
+        """
+        summary = {"count": self.count, "sum": self.total, "min": self.min, "max": self.max,
+                   "mean": self.total / self.count if self.count else None}
+        for q in QUANTILES:
+            summary[f"p{q * 100:g}"] = self.percentile(q)
+        return summary
+
+class Metrics:
+    """
+    Registry of named, labelled counters, gauges and histograms
+
+    Attributes:
+        kinds: the kind of each metric name, "counter", "gauge" or "summary"
+        help: the help text of each metric name
+        series: the labelled series of each metric name as a list of (labels, metric)
+        collectors: callables returning more families to render, see collect()
+    """
+    def __init__(self):
+        self.kinds = {}
+        self.help = {}
+        self.series = {}
+        self.collectors = []
+
+    def _register(self, kind, name, help, labels, metric):
+        if self.kinds.setdefault(name, kind) != kind:
+            raise ValueError(f"{name} is already registered as a {self.kinds[name]}")
+        self.help.setdefault(name, help)
+        self.series.setdefault(name, []).append((labels, metric))
+        return metric
+
+    def counter(self, name, help, **labels):
+        """
+        registers and returns a Counter
+
+        :param name: the metric name
+        :param help: the help text
+        :param labels: the labels of the series
+        """
+        return self._register("counter", name, help, labels, Counter())
+
+    def histogram(self, name, help, **labels):
+        """
+        registers and returns a LatencyHistogram
+
+        :param name: the metric name
+        :param help: the help text
+        :param labels: the labels of the series
+        """
+        return self._register("summary", name, help, labels, LatencyHistogram())
+
+    def gauge(self, name, help, read, **labels):
+        """
+        registers a gauge whose value is read when the metrics are collected
+
+        :param name: the metric name
+        :param help: the help text
+        :param read: callable returning the current value
+        :param labels: the labels of the series
+        """
+        return self._register("gauge", name, help, labels, read)
+
+    def snapshot(self):
+        """
+        returns the current value of every series as name : list of (labels, value), a
+        histogram's value is its summary()
+        """
+        values = {}
+        for name, series in self.series.items():
+            kind = self.kinds[name]
+            values[name] = [
+                (labels, metric.value if kind == "counter" else metric() if kind == "gauge" else metric.summary())
+                for labels, metric in series
+            ]
+        return values
+
+    def collect(self, read):
+        """
+        registers a source of families rendered elsewhere, read when text() is called
+
+        :param read: callable returning families in the form returned by families()
+        """
+        self.collectors.append(read)
+
+    def families(self):
+        """
+        returns every series rendered in the Prometheus text exposition format, grouped
+        as name : (kind, help, lines), collected families included
+        """
+        families = {}
+        for name, series in self.series.items():
+            kind = self.kinds[name]
+            lines = []
+            for labels, metric in series:
+                if kind == "counter":
+                    lines.append(f"{name}{formatLabels(labels)} {metric.value}")
+                elif kind == "gauge":
+                    lines.append(f"{name}{formatLabels(labels)} {metric()}")
+                else:
+                    for q in QUANTILES:
+                        value = metric.percentile(q)
+                        lines.append(f"{name}{formatLabels({**labels, 'quantile': q})} {'NaN' if value is None else value}")
+                    lines.append(f"{name}_sum{formatLabels(labels)} {metric.total}")
+                    lines.append(f"{name}_count{formatLabels(labels)} {metric.count}")
+            families[name] = (kind, self.help[name], lines)
+        for read in self.collectors:
+            for name, (kind, help, lines) in read().items():
+                if name in families:
+                    families[name][2].extend(lines)
+                else:
+                    families[name] = (kind, help, list(lines))
+        return families
+
+    def text(self):
+        """
+        returns every series in the Prometheus text exposition format
+        """
+        lines = []
+        for name, (kind, help, series) in self.families().items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += series
+        return "\n".join(lines) + "\n"
+
+def formatLabels(labels):
+    """
+    formats labels as a Prometheus label set, e.g. {type="open"}
+
+    :param labels: dict of label name : value
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+class InstrumentedMessageParser(MessageParser):
+    """
+    MessageParser that records the parse latency of each consumed message type and
+    counts the frames it drops
+
+    Attributes:
+        parseLatency: the LatencyHistogram of each message type, decoding included for raw frames
+        ignored: Counter of frames whose type the book does not consume
+    """
+    def __init__(self, spec=None, metrics=None, internIds=False, matchTimes=False, **labels):
+        super().__init__(spec, internIds, matchTimes)
+        metrics = metrics if metrics is not None else Metrics()
+        self.parseLatency = {
+            orderType: metrics.histogram("orderbook_parse_latency_ns", "message parse latency", type=orderType, **labels)
+            for orderType in self.parsers
+        }
+        self.ignored = metrics.counter("orderbook_parse_ignored_total", "frames of types the book does not consume", **labels)
+
+    def __call__(self, message):
+        start = perf_counter_ns()
+        orderType = message["type"]
+        parse = self.parsers.get(orderType)
+        if parse is None:
+            self.ignored.value += 1
+            return None
+        order = parse(message)
+        self.parseLatency[orderType].record(perf_counter_ns() - start)
+        return order
+
+    def parseRaw(self, raw):
+        start = perf_counter_ns()
+        orderType = messageType(raw)
+        parse = self.parsers.get(orderType)
+        if parse is None:
+            self.ignored.value += 1
+            return None
+        order = parse(loads(raw))
+        self.parseLatency[orderType].record(perf_counter_ns() - start)
+        return order
+
+class InstrumentedOrderBook(OrderBook):
+    """
+    OrderBook that records the apply latency of each message type, counts messages that
+    had no effect and exposes its size as gauges
+
+    Attributes:
+        applyLatency: the LatencyHistogram of each message type, listeners included
+        noops: Counter of each message type for messages about orders not in the book
+        stale: Counter of messages dropped by the sequence guard
+    """
+    def __init__(self, spec=None, metrics=None, engine=sortedSide, **labels):
+        super().__init__(spec, engine)
+        metrics = metrics if metrics is not None else Metrics()
+        self.applyLatency = {
+            orderType: metrics.histogram("orderbook_apply_latency_ns", "message apply latency", type=orderType, **labels)
+            for orderType in ("open", "done", "change", "match")
+        }
+        self.noops = {
+            orderType: metrics.counter("orderbook_noop_total", "messages for orders not in the book", type=orderType, **labels)
+            for orderType in ("done", "change", "match")
+        }
+        self.stale = metrics.counter("orderbook_stale_total", "messages older than the book", **labels)
+        metrics.gauge("orderbook_orders", "resting orders", lambda: len(self.orderBook), **labels)
+        metrics.gauge("orderbook_levels", "price levels", lambda: len(self.buyLimits), side="buy", **labels)
+        metrics.gauge("orderbook_levels", "price levels", lambda: len(self.askLimits), side="sell", **labels)
+        metrics.gauge("orderbook_sequence", "last applied sequence", lambda: self.currSeqNum, **labels)
+
+    def _classify(self, order):
+        # counts stale messages and messages about orders the book does not hold
+        if order.sequence < self.currSeqNum:
+            self.stale.value += 1
+        elif order.type != "open" and order.id not in self.orderBook:
+            self.noops[order.type].value += 1
+
+    def processMessage(self, order):
+        start = perf_counter_ns()
+        self._classify(order)
+        super().processMessage(order)
+        self.applyLatency[order.type].record(perf_counter_ns() - start)
+
+    def processBatch(self, orders):
+        super().processBatch(self._observe(orders))
+
+    def _observe(self, orders):
+        # times each order as the span between handing it to processBatch and
+        # processBatch asking for the next one
+        histograms = self.applyLatency
+        for order in orders:
+            if order is None:
+                yield order
+                continue
+            self._classify(order)
+            start = perf_counter_ns()
+            yield order
+            histograms[order.type].record(perf_counter_ns() - start)
+
+async def serveMetrics(metrics, host="127.0.0.1", port=9100):
+    """
+    serves metrics.text() to every HTTP request, e.g. a Prometheus scrape of /metrics
+
+    :param metrics: the Metrics registry
+    :param host: the host to listen on
+    :param port: the port to listen on, 0 picks a free one
+    :return: the asyncio server
+    """
+    async def handle(reader, writer):
+        try:
+            # the request line and headers are read and ignored
+            while (await reader.readline()).strip():
+                pass
+            body = metrics.text().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -1,4 +1,12 @@
+import gc
+import sys
+from collections import namedtuple
 from sortedcontainers import SortedDict
+from Checkpoint import captureEntries, encodeSnapshot, writeSnapshot, readSnapshot
+try:
+    import numpy as np
+except ImportError:
+    np = None
 """
 L2 orderbook that operates on a full channel data stream
 Processes orders of type:
@@ -12,29 +20,87 @@ Structure:
     It contains 3 dictionaries: 1 to track active orders, 1 to track the buy side,
     and 1 to track the sell side. The buy and sell side are set up identically. The
     price of a limit will be used as a key and a limit object will be stored as the value.
-    Within the limit object, there is a linked list of orders which is used to facilitate 
+    Within the limit object, there is a linked list of RestingOrder nodes which is used to facilitate 
     the matching in FIFO manner. Additionally, the Limit object will only keep track of the
     head and tail limit in the linked list to facilitate for quick insert and removal. 
+    Parsed Order messages are never stored in the book, only the RestingOrder nodes built from them.
+
+Fixed-point mode:
+    When the book and the MessageParser share a ProductSpec, every price and size below
+    is a scaled integer instead of a float, see FixedPoint.py. Book keys and size
+    arithmetic are then exact, priceOf/sizeOf/snapshot convert back to Decimal.
 """
 
+# message types the book consumes, interned so dispatch compares and hashes by identity
+OPEN = sys.intern("open")
+DONE = sys.intern("done")
+CHANGE = sys.intern("change")
+MATCH = sys.intern("match")
+
+# top of book view handed out to publishers, bids and asks are lists of
+# (price, total_size, order_count) ordered best first
+BookSnapshot = namedtuple("BookSnapshot", ["sequence", "bids", "asks"])
+
+# top of book as NumPy float64 arrays ordered best first, see OrderBook.depthArrays
+DepthArrays = namedtuple("DepthArrays", ["sequence", "bidPrices", "bidSizes", "askPrices", "askSizes"])
+
+def sortedSide(buy):
+    """
+    the default book engine, returns an empty SortedDict for one side of the book
+
+    :param buy: True for the buy side, False for the sell side
+    """
+    return SortedDict()
+
 class Limit:
     """
     Represents a limit order at a certain price level
 
     Attributes:
         Price: float to represent the price of the limit
-        Head: Order object that represents the next order to be filled
-        Tail: Order object that represents the last order to be filled
+        Head: RestingOrder object that represents the next order to be filled
+        Tail: RestingOrder object that represents the last order to be filled
+        Total_size: float representing the aggregated quantity of all orders resting at this level
+        Order_count: int representing the number of orders resting at this level
     """
+    __slots__ = ("price", "head", "tail", "total_size", "order_count")
+
     def __init__(self, price: float):
         self.price = price
         self.head = None
         self.tail = None
+        self.total_size = 0
+        self.order_count = 0
+
+class RestingOrder:
+    """
+    Represents an order that is resting in the book
+    Objects get stored in a limit level object as a FIFO linked list, only the
+    fields needed to keep the queue are stored so each node stays small
+
+    Attributes:
+        Identifier: a string representing the unique id for each order
+        Price: a float representing the price of the Limit the order rests at
+        Quantity: a float representing the remaining quantity of the order
+        Prev: None by default, updated to contain a pointer to the previous RestingOrder in the queue
+        Next: None by default, updated to contain a pointer to the next RestingOrder in the queue
+        Limit: the Limit the order rests at, so it can be unlinked without looking its price up
+    """
+    __slots__ = ("id", "price", "quantity", "prev", "next", "limit")
+
+    def __init__(self, identifier: str, price: float, quantity: float, limit=None):
+        self.id = identifier
+        self.price = price
+        self.quantity = quantity
+        self.prev = None
+        self.next = None
+        self.limit = limit
 
 class Order:
     """
-    Represents each order that comes in
-    Object get stored in a limit level object as a FIFO linked list
+    Represents each parsed message that comes in
+    Objects are produced by the MessageParser and consumed by OrderBook.processMessage,
+    they are never stored in the book
 
     Attributes:
         Type: a string representing the order type ["open", "done", "change", "match"]
@@ -43,18 +109,20 @@ class Order:
         Quantity: a float representing the quantity of the order or the new quantity of the order depending on the type
         Side: a int representing if an order is on the sell side (0) or the buy side (1)
         Sequence: a int representing where in the order sequence the Order was received
-        Prev: None by default, updated to contain a pointer to the previous Order in the queue
-        Next: None by default, updated to contain a pointer to the next Order in the queue
+        Product: a string representing the product the message belongs to, e.g. "BTC-USD"
+        Time: a float representing the message time in seconds since the epoch, only parsed for "match"
     """
-    def __init__(self, orderType: str, identifier: str, price: float, quantity: float, side: int, sequence: int):
+    __slots__ = ("type", "id", "price", "quantity", "side", "sequence", "product", "time")
+
+    def __init__(self, orderType: str, identifier: str, price: float, quantity: float, side: int, sequence: int, product: str = None, time: float = None):
         self.type = orderType
         self.id = identifier
         self.price = price
         self.quantity = quantity
         self.side = side
         self.sequence = sequence
-        self.prev = None
-        self.next = None
+        self.product = product
+        self.time = time
 
 class OrderBook:
     """
@@ -62,196 +130,426 @@ class OrderBook:
     a linked list of orders
 
     Attributes:
-        orderBook: tracks all active orders in the form of Order.id : Order Object
+        orderBook: tracks all active orders in the form of RestingOrder.id : RestingOrder Object
         askLimits: tracks all the limits on the sell side, in the form of Limit.price: Limit Object
             - Limit object then contains a linked list or orders at that level
         buyLimits: tracks all the limits on the buy side, in the form of Limit.price: Limit Object
             - Limit object then contains a linked list or orders at that level
         currSeqNum: tracks the sequence number of the current order
+        updateCount: tracks the number of messages that have been applied to the book
+        listeners: callables that are invoked with the book after each applied message or batch
+        depthCache: the last depthArrays result with the updateCount and n it was built for
+        levelLog: None, or a list that receives (side, price, total_size) every time a level
+                  changes (side 1 for buy, 0 for sell, total_size 0 once the level is gone)
+                  and None when bulkLoad replaces the book, see L2Diff.py
+        spec: optional ProductSpec, when given prices and sizes are scaled integers and
+              are converted back to Decimal on output
+        engine: callable taking buy (a bool) and returning an empty side, sortedSide by
+                default, see TickLadder.py for the array backed alternative
+        handlers: the handler of each message type, subclasses may replace entries
     """
-    def __init__(self):
+    def __init__(self, spec=None, engine=sortedSide):
+        self.spec = spec
+        self.engine = engine
         self.orderBook = {}
-        self.askLimits = SortedDict() 
-        self.buyLimits = SortedDict() 
+        self.askLimits = engine(False)
+        self.buyLimits = engine(True)
         self.currSeqNum = -1
+        self.updateCount = 0
+        self.listeners = []
+        self.depthCache = None
+        self.levelLog = None
+
+        # the handler of each message type, every handler takes (order, side)
+        self.handlers = {
+            OPEN: self.addOrder,
+            DONE: self.removeOrder,
+            CHANGE: self.changeOrder,
+            MATCH: self.matchOrder,
+        }
+
+    def addListener(self, listener):
+        """
+        registers a callable to be invoked with the book after each applied message
+        listeners run on the processing thread so they should only do constant work
+
+        :param listener: callable taking the book as its only argument
+        """
+        self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        """
+        unregisters a previously added listener
+
+        :param listener: the listener to be removed
+        """
+        self.listeners.remove(listener)
 
     def processMessage(self, order):
         """
-        processes an order by extracting the relevant attributes and dispatching it 
-        to the correct processing method
+        processes an order by dispatching it to the handler of its type
 
         :param order: the order to be processes
         """
-        # extract the relevant data
-        orderType = order.type
-        orderIden = order.id
-        orderPrice = order.price 
-        orderSize = order.quantity
-        orderSide = self.askLimits if order.side == 0 else self.buyLimits
-
         # guard against out of order messages
         if order.sequence < self.currSeqNum:
             return
         self.currSeqNum = order.sequence
 
         # execute correct order
-        if orderType == "open":
-            self.addOrder(order, orderPrice, orderSide)
-        elif orderType == "done":
-            self.removeOrder(orderIden, orderPrice, orderSide)
-        elif orderType == "change":
-            self.changeOrder(order, orderIden, orderPrice, orderSide)
-        elif orderType == "match":
-            self.matchOrder(orderIden, orderSize, orderSide)
-
-    def changeOrder(self, order, iden, price, side):
-        """
-        processes an order of type "change"
-
-        :param order: the change order object 
-        :param iden: the id of the order to be changed
-        :param price: the changed or unchanged price of the order depending on the change reason
+        handler = self.handlers.get(order.type)
+        if handler is not None:
+            handler(order, self.buyLimits if order.side else self.askLimits)
+
+        # let the listeners know the book has changed
+        self.updateCount += 1
+        for listener in self.listeners:
+            listener(self)
+
+    def processBatch(self, orders):
+        """
+        processes a sequence ordered batch of orders in one loop, the result is the same as
+        calling processMessage on each order but the listeners are only notified once at
+        the end of the batch
+
+        :param orders: iterable of parsed orders, None entries (messages the parser dropped) are skipped
+        """
+        sides = (self.askLimits, self.buyLimits)
+        handlers = self.handlers
+        applied = 0
+
+        for order in orders:
+            # guard against out of order messages
+            if order is None or order.sequence < self.currSeqNum:
+                continue
+            self.currSeqNum = order.sequence
+
+            # execute correct order
+            handler = handlers.get(order.type)
+            if handler is not None:
+                handler(order, sides[order.side])
+            applied += 1
+
+        # let the listeners know the book has changed, once per batch
+        if applied:
+            self.updateCount += applied
+            for listener in self.listeners:
+                listener(self)
+
+    def bulkLoad(self, sequence, bids, asks):
+        """
+        replaces the contents of the book with a level 3 snapshot in one pass, the limits
+        and their queues are built directly instead of going through addOrder per order
+
+        :param sequence: the sequence number the snapshot was taken at
+        :param bids: iterable of (price, size, id) on the buy side, in queue order within a price
+        :param asks: iterable of (price, size, id) on the sell side, in queue order within a price
+        """
+        # the collector would otherwise run many times over the freshly allocated nodes
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            orderBook = {}
+            for side, entries in ((self.buyLimits, bids), (self.askLimits, asks)):
+                levels = {}
+                for price, size, iden in entries:
+                    limit = levels.get(price)
+                    if limit is None:
+                        limit = levels[price] = Limit(price)
+                        order = RestingOrder(iden, price, size, limit)
+                        limit.head = order
+                    else:
+                        order = RestingOrder(iden, price, size, limit)
+                        order.prev = limit.tail
+                        limit.tail.next = order
+                    limit.tail = order
+                    limit.total_size += size
+                    limit.order_count += 1
+                    orderBook[iden] = order
+
+                # a single update sorts all the new keys at once
+                side.clear()
+                side.update(levels)
+        finally:
+            if gcEnabled:
+                gc.enable()
+
+        self.orderBook = orderBook
+        self.currSeqNum = sequence
+        if self.levelLog is not None:
+            self.levelLog.clear()
+            self.levelLog.append(None)
+
+        # let the listeners know the book has changed
+        self.updateCount += 1
+        for listener in self.listeners:
+            listener(self)
+
+    def snapshotEntries(self):
+        """
+        returns every order of the book as (bids, asks) lists of (price, size, id), in FIFO
+        order at each price, the entries a checkpoint is written from
+        """
+        return captureEntries(self)
+
+    def save_snapshot(self, path, captureOffset=None):
+        """
+        writes the book (every order in FIFO order at each Limit and currSeqNum) to a
+        compact binary checkpoint, see Checkpoint.py for the format
+
+        :param path: the checkpoint file
+        :param captureOffset: optional capture position up to which every frame is in the book
+        """
+        bids, asks = self.snapshotEntries()
+        writeSnapshot(path, encodeSnapshot(self.spec, self.currSeqNum, bids, asks, captureOffset))
+
+    def load_snapshot(self, path):
+        """
+        replaces the contents of the book with a checkpoint written by save_snapshot
+
+        :param path: the checkpoint file
+        :return: the capture offset stored with the checkpoint, None when it has none
+        """
+        sequence, bids, asks, captureOffset = readSnapshot(path, self.spec)
+        self.bulkLoad(sequence, bids, asks)
+        return captureOffset
+
+    def changeOrder(self, order, side):
+        """
+        processes an order of type "change", the order loses its place in the queue
+
+        :param order: the change order object, its price is the changed or unchanged price
+                      of the order depending on the change reason
         :param side: reference to the side of the order (buy or ask)
         """
         # check if the order exists
-        if iden in self.orderBook:
-            # remove the old order
-            oldOrder = self.orderBook[iden]
-            self.removeOrder(iden, oldOrder.price, side);
-            self.addOrder(order, price, side)
+        resting = self.orderBook.get(order.id)
+        if resting is not None:
+            # remove the old order and queue it again with the new price and size
+            self.unlinkOrder(resting, side)
+            self.addOrder(order, side)
 
-    def matchOrder(self, makerId, size, side):
+    def matchOrder(self, order, side):
         """
         processes an order of type "match"
 
-        :param order: the match order object 
-        :param makerId: the id of the order maker
-        :param size: the size of the match order that is to be executed
+        :param order: the match order object, its id is the id of the order maker and its
+                      quantity is the size that was executed
         :param side: reference to the side of the order (buy or ask)
         """
         # check if the order exists
-        if makerId in self.orderBook:
-
-            # if it exists, get the limit object
-            orderToAdjust = self.orderBook[makerId]
-
+        resting = self.orderBook.get(order.id)
+        if resting is not None:
             # update the order size
-            originalSize = orderToAdjust.quantity
-            newSize = originalSize - size
+            size = order.quantity
+            newSize = resting.quantity - size
 
             # if the order is filled, just remove it right away
             # else update quantity
             if newSize <= 0:
-                self.removeOrder(orderToAdjust.id, orderToAdjust.price, side)
+                self.unlinkOrder(resting, side)
             else:
-                orderToAdjust.quantity = newSize
+                resting.quantity = newSize
+                limit = resting.limit
+                limit.total_size -= size
+                if self.levelLog is not None:
+                    self.levelLog.append((1 if side is self.buyLimits else 0, limit.price, limit.total_size))
 
-            # output the top bid/ask prices
-            self.outputBidAsk()
-
-    def addOrder(self, order, price, side):
+    def addOrder(self, order, side):
         """
-        processes an order of type "add"
+        processes an order of type "open"
 
-        :param order: the add order object
-        :param price: the price at which the object corresponds to and is to be added at
+        :param order: the open order object, it is queued at its price
         :param side: reference to the side of the order (buy or ask)
         """
-        
-        if price in side: 
-            # add the order to an existing limit level
-            limit = side[price]
-            if limit.head == None and limit.tail == None:
-                limit.head = order
-                limit.tail = order
-            else:
-                tmpTail = limit.tail
-                tmpTail.next = order
-                order.prev = tmpTail
-                limit.tail = order
-        else:  
+        price = order.price
+        limit = side.get(price)
+        if limit is not None:
+            # add the order to the tail of an existing limit level
+            resting = RestingOrder(order.id, price, order.quantity, limit)
+            tail = limit.tail
+            tail.next = resting
+            resting.prev = tail
+            limit.tail = resting
+        else:
             # make a new limit level and add the order in
-            limit = Limit(order.price)
+            limit = Limit(price)
             side[price] = limit
-            limit.head = order
-            limit.tail = order
+            resting = RestingOrder(order.id, price, order.quantity, limit)
+            limit.head = resting
+            limit.tail = resting
+
+        # keep the level aggregates in sync
+        limit.total_size += resting.quantity
+        limit.order_count += 1
+        if self.levelLog is not None:
+            self.levelLog.append((1 if side is self.buyLimits else 0, price, limit.total_size))
 
         # order is now active, add it to orderbook
-        self.orderBook[order.id] = order
+        self.orderBook[resting.id] = resting
 
-    def removeOrder(self, iden, price, side):
+    def removeOrder(self, order, side):
         """
-        processes an order of type "remove"
+        processes an order of type "done"
 
-        :param iden: the id of the order to be removed
-        :param price: the price at which the object corresponds to and is to be added at
+        :param order: the done order object, only its id is used
         :param side: reference to the side of the order (buy or ask)
         """
-        # if there is a limit open and the order is in the orderbook, proceed
-        if price in side and iden in self.orderBook:
-            limit = side[price]
-            order = self.orderBook[iden]
-            
-            # guard against case where a limit with a single order was previously
-            # removed by a match
-            if limit.head == None or limit.tail == None:
-                del self.orderBook[order.id]
-                return
-
-            # adjust the head and tail pointers of the limit if necessary
-            if limit.head.id == order.id and limit.tail.id == order.id:
-                limit.head = None
-                limit.tail = None
-            elif limit.head.id == order.id:
-                limit.head = order.next
-            elif limit.tail.id == order.id:
-                limit.tail = order.prev
-
-            # remove the order from the order list
-            if order.prev != None and order.next != None:
-                order.prev.next =  order.next
-                order.next.prev = order.prev
-            elif order.next != None:
-                order.next.prev = None
-                order.next = None
-            elif order.prev != None:
-                order.prev.next = None
-                order.prev = None
-
-            # remove the order out of the active orders
-            del self.orderBook[order.id]
-
-    def outputBidAsk(self):
-        """
-        outputs the top 5 bid and ask prices 
-        called after each match order is processed
-        """
-        i = 0
-        bestAsks = []
-        print("Best Asks")
-        for limit in self.askLimits:
-            topOrder = self.askLimits[limit]
-            if topOrder.head != None:
-                bestAsks.append((topOrder.head.quantity, topOrder.head.price))
-                i += 1
-                if i == 5: break
-        for ele in reversed(bestAsks):
-            print(f"{ele[0]: <.5f} @ {ele[1]: <.2f}")
-        print("-----------------------------")
-        i = 0
-        for limit in reversed(self.buyLimits):
-            topOrder = self.buyLimits[limit]
-            if topOrder.head != None:
-                print(f"{topOrder.head.quantity: <.5f} @ {topOrder.head.price: <.2f}")
-                i += 1
-                if i == 5: break
-        print("Best Bids")
-        print("\n")
+        resting = self.orderBook.get(order.id)
+        if resting is not None:
+            self.unlinkOrder(resting, side)
 
+    def unlinkOrder(self, resting, side):
+        """
+        removes a resting order from its Limit and from the active orders, the node knows
+        its Limit and neighbours so no lookup by price or id comparison is needed
 
+        :param resting: the RestingOrder to be removed
+        :param side: reference to the side the order rests on (buy or ask)
+        """
+        limit = resting.limit
+        prev = resting.prev
+        following = resting.next
+
+        # relink the neighbours, or move the head and tail of the limit
+        if prev is None:
+            limit.head = following
+        else:
+            prev.next = following
+        if following is None:
+            limit.tail = prev
+        else:
+            following.prev = prev
+        resting.prev = resting.next = None
+
+        # update the level aggregates and prune the level once it is empty
+        # so dead levels never accumulate in the side
+        limit.order_count -= 1
+        if limit.order_count == 0:
+            limit.total_size = 0
+            del side[limit.price]
+        else:
+            limit.total_size -= resting.quantity
+        if self.levelLog is not None:
+            self.levelLog.append((1 if side is self.buyLimits else 0, limit.price, limit.total_size))
+
+        # remove the order out of the active orders
+        del self.orderBook[resting.id]
+
+    def depth(self, n):
+        """
+        returns the top n price levels of each side using the aggregates kept on each Limit,
+        the orders resting at a level are never visited and empty levels never exist
 
+        :param n: the number of levels to return per side
+        :return: tuple of (bids, asks), each a list of (price, total_size, order_count) ordered best first
+        """
+        bids = [(limit.price, limit.total_size, limit.order_count)
+                for limit in reversed(self.buyLimits.values()[-n:])] if n > 0 else []
+        asks = [(limit.price, limit.total_size, limit.order_count)
+                for limit in self.askLimits.values()[:n]]
+        return bids, asks
 
+    def depthArrays(self, n):
+        """
+        returns the top n levels of each side as read-only NumPy float64 arrays, in fixed-point
+        mode the scaled integers are converted to prices and sizes. The arrays are built from the
+        Limit aggregates with np.fromiter and reused until the next applied message, so repeated
+        reads between updates are free. See Analytics.py for functions over the arrays.
 
+        :param n: the number of levels to export per side
+        :return: DepthArrays with the prices and sizes of each side ordered best first
+        """
+        if np is None:
+            raise RuntimeError("NumPy is required for OrderBook.depthArrays")
+        cached = self.depthCache
+        if cached is not None and cached[0] == self.updateCount and cached[1] == n:
+            return cached[2]
+        bidLimits = list(reversed(self.buyLimits.values()[-n:])) if n > 0 else []
+        askLimits = self.askLimits.values()[:n] if n > 0 else []
+        arrays = []
+        for limits in (bidLimits, askLimits):
+            count = len(limits)
+            prices = np.fromiter((limit.price for limit in limits), np.float64, count)
+            sizes = np.fromiter((limit.total_size for limit in limits), np.float64, count)
+            if self.spec is not None:
+                prices /= 10 ** self.spec.priceDecimals
+                sizes /= 10 ** self.spec.sizeDecimals
+            prices.flags.writeable = False
+            sizes.flags.writeable = False
+            arrays += (prices, sizes)
+        result = DepthArrays(self.currSeqNum, *arrays)
+        self.depthCache = (self.updateCount, n, result)
+        return result
+
+    def orderCount(self):
+        """
+        returns the number of resting orders
+        """
+        return len(self.orderBook)
 
+    def best_bid(self):
+        """
+        returns the highest bid price, or None if the buy side is empty
+        """
+        if not self.buyLimits:
+            return None
+        return self.buyLimits.peekitem(-1)[0]
 
+    def best_ask(self):
+        """
+        returns the lowest ask price, or None if the sell side is empty
+        """
+        if not self.askLimits:
+            return None
+        return self.askLimits.peekitem(0)[0]
 
+    def spread(self):
+        """
+        returns the difference between the best ask and the best bid, or None if either side is empty
+        """
+        bid = self.best_bid()
+        ask = self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return ask - bid
+
+    def mid(self):
+        """
+        returns the midpoint between the best bid and the best ask, or None if either side is empty
+        in fixed-point mode the result is in price units and may be a half unit
+        """
+        bid = self.best_bid()
+        ask = self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def priceOf(self, price):
+        """
+        converts a book price to its output form, a Decimal in fixed-point mode
+
+        :param price: the price as stored in the book
+        """
+        return price if self.spec is None else self.spec.price(price)
+
+    def sizeOf(self, size):
+        """
+        converts a book size to its output form, a Decimal in fixed-point mode
+
+        :param size: the size as stored in the book
+        """
+        return size if self.spec is None else self.spec.size(size)
+
+    def snapshot(self, n):
+        """
+        returns a BookSnapshot of the top n levels of each side, prices and sizes
+        are converted to their output form
+
+        :param n: the number of levels to include per side
+        """
+        bids, asks = self.depth(n)
+        if self.spec is not None:
+            bids = [(self.priceOf(p), self.sizeOf(s), c) for p, s, c in bids]
+            asks = [(self.priceOf(p), self.sizeOf(s), c) for p, s, c in asks]
+        return BookSnapshot(self.currSeqNum, bids, asks)
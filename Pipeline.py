@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+"""
+Staged feed pipeline that decouples network receive from book processing
+
+Structure:
+    The receiver (the websocket loop) only timestamps each raw frame and puts it on a
+    bounded queue with put(). A processor drains the queue in batches of up to batchSize
+    frames and hands each batch to the handler, either as an asyncio task on the same
+    loop or on its own thread. A slow book update therefore never delays socket reads.
+
+    When the queue is full the policy decides what happens:
+        block: the receiver waits for room, socket reads stall but nothing is lost
+        drop_newest: the incoming frame is discarded
+        drop_oldest: the oldest queued frame is discarded to make room
+    Dropped frames leave a sequence gap, which the Sequencer turns into a resync.
+
+    An exception raised by the handler is logged and counted and only costs the rest of
+    its batch, the processor carries on with the next one. Frame level failures are
+    best caught by the handler, BookManager.onFrame does so per frame, so a bad frame
+    does not take the rest of its batch along. Should the processor stop anyway, put()
+    raises instead of queueing (or blocking) for frames nobody will read.
+
+    metrics() reports queue depth, drops, handler errors and the lag between a frame
+    being received and its batch being processed.
+"""
+
+logger = logging.getLogger(__name__)
+
+BLOCK = "block"
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+
+class FeedPipeline:
+    """
+    Bounded queue between a frame receiver and a batch processor
+
+    Attributes:
+        handler: callable invoked with each batch as a list of raw frames
+        maxsize: the maximum number of frames held by the queue
+        policy: what to do when the queue is full, one of BLOCK, DROP_NEWEST, DROP_OLDEST
+        batchSize: the maximum number of frames handed to the handler at once
+        threaded: True to run the processor on its own thread instead of the event loop
+        received: the number of frames put on the pipeline
+        processed: the number of frames handed to the handler
+        dropped: the number of frames discarded by the full queue policy
+        batches: the number of batches handed to the handler
+        errors: the number of batches whose handler raised
+        maxDepth: the highest queue depth seen
+        lastLag: seconds between receive and processing of the oldest frame of the last batch
+        maxLag: the highest lastLag seen
+    """
+    def __init__(self, handler, maxsize=10000, policy=BLOCK, batchSize=256, threaded=False):
+        if policy not in (BLOCK, DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"unknown full queue policy {policy}")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.policy = policy
+        self.batchSize = batchSize
+        self.threaded = threaded
+        self.queue = queue.Queue(maxsize) if threaded else asyncio.Queue(maxsize)
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.maxDepth = 0
+        self.lastLag = 0.0
+        self.maxLag = 0.0
+        self.task = None
+        self.thread = None
+        self.failure = None
+
+    def start(self):
+        """
+        starts the processor, must be called from a running event loop when not threaded
+        """
+        if self.threaded:
+            self.thread = threading.Thread(target=self._processThread, name="FeedPipeline", daemon=True)
+            self.thread.start()
+        else:
+            self.task = asyncio.ensure_future(self._processTask())
+
+    async def stop(self):
+        """
+        processes every queued frame and stops the processor
+        """
+        if self.threaded:
+            if self.thread is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self._stopThread)
+        elif self.task is not None:
+            while not self.queue.empty():
+                await asyncio.sleep(0)
+            self.task.cancel()
+            self.task = None
+
+    def _stopThread(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    async def put(self, raw):
+        """
+        queues a raw frame, applying the full queue policy
+
+        :param raw: the JSON text received from the websocket
+        """
+        self._checkProcessor()
+        item = (time.perf_counter(), raw)
+        self.received += 1
+        frames = self.queue
+        while True:
+            try:
+                frames.put_nowait(item)
+                break
+            except (asyncio.QueueFull, queue.Full):
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.policy == DROP_OLDEST:
+                    try:
+                        frames.get_nowait()
+                        self.dropped += 1
+                    except (asyncio.QueueEmpty, queue.Empty):
+                        pass
+                elif self.threaded:
+                    await asyncio.sleep(0.0005)
+                    self._checkProcessor()
+                else:
+                    await self._putBlocking(item)
+                    break
+        depth = frames.qsize()
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+
+    async def _putBlocking(self, item):
+        # waits for room in the queue, or for the processor that makes room to stop
+        if self.task is None:
+            await self.queue.put(item)
+            return
+        putter = asyncio.ensure_future(self.queue.put(item))
+        await asyncio.wait((putter, self.task), return_when=asyncio.FIRST_COMPLETED)
+        if not putter.done():
+            putter.cancel()
+            self._checkProcessor()
+
+    def _checkProcessor(self):
+        # raises once the started processor has stopped without being asked to
+        if self.threaded:
+            if self.thread is not None and not self.thread.is_alive():
+                raise RuntimeError("the feed pipeline processor thread has stopped") from self.failure
+        elif self.task is not None and self.task.done():
+            error = None if self.task.cancelled() else self.task.exception()
+            raise RuntimeError("the feed pipeline processor has stopped") from error
+
+    def _handle(self, batch):
+        lag = time.perf_counter() - batch[0][0]
+        self.lastLag = lag
+        if lag > self.maxLag:
+            self.maxLag = lag
+        try:
+            self.handler([raw for _, raw in batch])
+        except Exception:
+            # a failing handler loses its batch, not the processor
+            self.errors += 1
+            logger.exception("feed pipeline handler failed on a batch of %d frames", len(batch))
+        self.processed += len(batch)
+        self.batches += 1
+
+    async def _processTask(self):
+        frames = self.queue
+        while True:
+            batch = [await frames.get()]
+            while len(batch) < self.batchSize and not frames.empty():
+                batch.append(frames.get_nowait())
+            self._handle(batch)
+            # give the receiver a turn even when the queue never runs empty
+            await asyncio.sleep(0)
+
+    def _processThread(self):
+        try:
+            self._drainThread()
+        except BaseException as error:
+            self.failure = error
+            raise
+
+    def _drainThread(self):
+        frames = self.queue
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batchSize:
+                try:
+                    item = frames.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._handle(batch)
+                    return
+                batch.append(item)
+            self._handle(batch)
+
+    def metrics(self):
+        """
+        returns the pipeline counters, lags are in seconds
+        """
+        return {
+            "depth": self.queue.qsize(),
+            "maxDepth": self.maxDepth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "lastLag": self.lastLag,
+            "maxLag": self.maxLag,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import time
+"""
+Top of book publisher that moves snapshot formatting and delivery off the message path
+
+Structure:
+    A BookPublisher registers itself as a listener on an OrderBook. The listener only
+    checks whether a publish is due, it never builds a snapshot itself. Snapshots are built
+    and handed to the sinks by either poll(), which the caller runs between messages, or
+    run(), an asyncio task that publishes in the background. Publishing is coalesced by
+    an interval (seconds) and/or an every-N-updates policy, so bursts of messages only
+    produce one snapshot. A sink is any callable that takes a BookSnapshot, asyncio queues
+    can be attached with queue() and the old console view is available as consoleSink.
+"""
+
+def consoleSink(snapshot):
+    """
+    prints the snapshot as the top bid and ask levels, best prices closest to the divider
+
+    :param snapshot: the BookSnapshot to be printed
+    """
+    print("Best Asks")
+    for price, size, _ in reversed(snapshot.asks):
+        print(f"{size: <.5f} @ {price: <.2f}")
+    print("-----------------------------")
+    for price, size, _ in snapshot.bids:
+        print(f"{size: <.5f} @ {price: <.2f}")
+    print("Best Bids")
+    print("\n")
+
+class BookPublisher:
+    """
+    Publishes coalesced top of book snapshots of an OrderBook to a set of sinks
+
+    Attributes:
+        book: the OrderBook being published
+        depth: the number of levels per side included in each snapshot
+        interval: minimum number of seconds between snapshots, None to disable
+        everyN: number of book updates that force a snapshot, None to disable
+        sinks: callables that receive each BookSnapshot
+        lastCount: the book updateCount at the time of the last publish
+        lastTime: the monotonic time of the last publish
+        due: set by the listener once everyN updates have been applied
+        published: the number of snapshots published so far
+    """
+    def __init__(self, book, depth=5, interval=1.0, everyN=None):
+        if interval is None and everyN is None:
+            raise ValueError("BookPublisher needs an interval or an everyN policy")
+        self.book = book
+        self.depth = depth
+        self.interval = interval
+        self.everyN = everyN
+        self.sinks = []
+        self.lastCount = book.updateCount
+        self.lastTime = time.monotonic()
+        self.due = False
+        self.published = 0
+        self.wakeup = None
+        book.addListener(self.onUpdate)
+
+    def subscribe(self, sink):
+        """
+        adds a sink that receives every published snapshot
+
+        :param sink: callable taking a BookSnapshot
+        """
+        self.sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        """
+        removes a previously subscribed sink
+
+        :param sink: the sink to be removed
+        """
+        self.sinks.remove(sink)
+
+    def queue(self, maxsize=1):
+        """
+        creates an asyncio queue sink, when the queue is full the oldest snapshot
+        is discarded so a slow reader always sees the freshest book
+
+        :param maxsize: the maximum number of snapshots held by the queue
+        :return: the asyncio.Queue the snapshots are put on
+        """
+        snapshotQueue = asyncio.Queue(maxsize)
+
+        def sink(snapshot):
+            if snapshotQueue.full():
+                snapshotQueue.get_nowait()
+            snapshotQueue.put_nowait(snapshot)
+
+        self.subscribe(sink)
+        return snapshotQueue
+
+    def close(self):
+        """
+        detaches the publisher from the book
+        """
+        self.book.removeListener(self.onUpdate)
+
+    def onUpdate(self, book):
+        """
+        book listener, only flags that a publish is due under the everyN policy
+
+        :param book: the OrderBook that was updated
+        """
+        if self.everyN is not None and book.updateCount - self.lastCount >= self.everyN:
+            self.due = True
+            if self.wakeup is not None:
+                self.wakeup.set()
+
+    def poll(self):
+        """
+        publishes a snapshot if the interval or everyN policy says one is due
+        meant to be called between messages by the processing loop
+
+        :return: True if a snapshot was published
+        """
+        if not self.due:
+            if self.interval is None or self.book.updateCount == self.lastCount:
+                return False
+            if time.monotonic() - self.lastTime < self.interval:
+                return False
+        self.publish()
+        return True
+
+    def publish(self):
+        """
+        builds a snapshot of the book and hands it to every sink
+        """
+        snapshot = self.book.snapshot(self.depth)
+        self.lastCount = self.book.updateCount
+        self.lastTime = time.monotonic()
+        self.due = False
+        self.published += 1
+        for sink in self.sinks:
+            sink(snapshot)
+
+    async def run(self):
+        """
+        background task that publishes whenever the interval elapses or everyN updates
+        have been applied, runs until cancelled
+        """
+        self.wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                self.poll()
+        finally:
+            self.wakeup = None
@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import os
+import struct
+import time
+"""
+Record and replay of raw feed captures
+
+Capture format:
+    An append-only file starting with the 4 byte magic b"CBF1", followed by one record
+    per frame: the receive time in nanoseconds since the epoch (int64), the payload
+    length (uint32), both little endian, then the raw frame as UTF-8. Files whose name
+    ends in ".gz" are gzip compressed, appending to them adds a new gzip member which
+    readers handle transparently.
+
+    readCapture also accepts newline delimited JSON files (one frame per line, no
+    timestamps) so hand made corpora can be replayed the same way.
+
+    FeedRecorder.offset() is the byte offset of the end of an uncompressed capture,
+    readCapture can start reading at such an offset instead of the first record. A
+    checkpoint stores the offset its book was taken at, so a warm start skips the frames
+    the checkpoint already holds without reading them (see Checkpoint.py).
+"""
+
+MAGIC = b"CBF1"
+RECORD = struct.Struct("<qI")
+
+def openCapture(path, mode):
+    """
+    opens a capture file, gzip compressed when the name ends in ".gz"
+
+    :param path: the capture file
+    :param mode: binary file mode, e.g. "rb" or "ab"
+    """
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+class FeedRecorder:
+    """
+    Appends raw frames with their receive time to a capture file
+
+    Attributes:
+        path: the capture file
+        count: the number of frames recorded by this recorder
+        end: the byte offset of the end of the capture, None for a gzip capture
+    """
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.file = openCapture(path, "ab")
+        if not size:
+            self.file.write(MAGIC)
+            size = len(MAGIC)
+        # offsets into a gzip capture would be positions in the uncompressed stream, which
+        # an appending recorder does not know
+        self.end = None if path.endswith(".gz") else size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, raw, timestamp=None):
+        """
+        appends a frame to the capture
+
+        :param raw: the JSON text received from the websocket
+        :param timestamp: the receive time in nanoseconds since the epoch, now when omitted
+        """
+        payload = raw.encode() if isinstance(raw, str) else raw
+        self.file.write(RECORD.pack(time.time_ns() if timestamp is None else timestamp, len(payload)))
+        self.file.write(payload)
+        self.count += 1
+        if self.end is not None:
+            self.end += RECORD.size + len(payload)
+
+    def offset(self):
+        """
+        syncs the recorded frames to disk and returns the byte offset right after the last
+        one, None for a gzip capture. The offset is only handed out once the frames before
+        it are durable, so it never points past the end of the file.
+        """
+        if self.end is None:
+            return None
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.end
+
+    def flush(self):
+        """
+        flushes the recorded frames to disk
+        """
+        self.file.flush()
+
+    def close(self):
+        """
+        flushes and closes the capture
+        """
+        self.file.close()
+
+def readCapture(path, offset=None):
+    """
+    yields (timestamp, raw) for every frame of a capture, timestamp is in nanoseconds
+    since the epoch, or None for newline delimited JSON files. A torn last record (the
+    recorder was killed mid write) or a truncated gzip stream ends the capture, the
+    partial frame is not yielded
+
+    :param path: the capture file
+    :param offset: optional byte offset of a record to start at, see FeedRecorder.offset()
+    """
+    with openCapture(path, "rb") as capture:
+        try:
+            if capture.read(len(MAGIC)) != MAGIC:
+                capture.seek(0)
+                for line in capture:
+                    line = line.strip()
+                    if line:
+                        yield None, line.decode()
+                return
+            if offset is not None:
+                capture.seek(offset)
+            read = capture.read
+            header = RECORD.size
+            while True:
+                record = read(header)
+                if len(record) < header:
+                    return
+                timestamp, length = RECORD.unpack(record)
+                payload = read(length)
+                if len(payload) < length:
+                    return
+                yield timestamp, payload.decode()
+        except EOFError:
+            # gzip raises once the compressed stream ends before its end marker
+            return
+
+class FeedReplayer:
+    """
+    Feeds the frames of a capture to a handler, as fast as possible or at original speed
+
+    Attributes:
+        handler: callable invoked with each raw frame, e.g. BookManager.onFrame
+        count: the number of frames replayed
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.count = 0
+
+    def replay(self, path):
+        """
+        replays every frame of a capture as fast as possible
+
+        :param path: the capture file
+        """
+        handler = self.handler
+        for _, raw in readCapture(path):
+            handler(raw)
+            self.count += 1
+
+    async def replayRealtime(self, path, speed=1.0):
+        """
+        replays a capture keeping the original spacing between frames
+
+        :param path: the capture file
+        :param speed: playback speed multiplier, 2.0 replays twice as fast
+        """
+        handler = self.handler
+        start = None
+        for timestamp, raw in readCapture(path):
+            if timestamp is not None:
+                if start is None:
+                    start = (timestamp, time.perf_counter())
+                delay = (timestamp - start[0]) / 1e9 / speed - (time.perf_counter() - start[1])
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            handler(raw)
+            self.count += 1
@@ -0,0 +1,119 @@
+import time
+"""
+Sequence gap and duplicate detection for the full channel
+
+Structure:
+    Every full channel message carries a per product sequence number that increments by
+    one, including the types the book does not consume. A Sequencer sits between the
+    parser and the book (or the Bootstrapper) and checks every sequence number:
+        - older or repeated sequences are duplicates and are dropped
+        - a sequence past the expected one opens a gap, the frame is held in a small
+          reorder buffer and delivered once the missing frames arrive
+        - a gap that is still open once the buffer holds reorderWindow frames, or after
+          maxDelay seconds, can not be filled and triggers a resync
+    A resync calls the resync callback (normally Bootstrapper.start, which re-snapshots
+    and replays) and hands the held frames on in sequence order. Without a resync
+    callback the sequencer skips over the gap instead.
+"""
+
+class Sequencer:
+    """
+    Orders messages by sequence number before they are delivered
+
+    Attributes:
+        deliver: callable invoked with each parsed message in sequence order
+        resync: callable invoked when a gap can not be filled, None to skip over gaps
+        reorderWindow: the maximum number of frames held while a gap is open
+        maxDelay: the maximum number of seconds a gap may stay open, None for no limit
+        expected: the next sequence number to be delivered, None until the first message
+        pending: frames held behind a gap in the form of sequence : parsed message
+        gaps: the number of gaps that were opened
+        reorders: the number of late frames that filled a gap
+        duplicates: the number of stale or repeated frames that were dropped
+        resyncs: the number of gaps that could not be filled
+    """
+    def __init__(self, deliver, resync=None, reorderWindow=64, maxDelay=1.0):
+        self.deliver = deliver
+        self.resync = resync
+        self.reorderWindow = reorderWindow
+        self.maxDelay = maxDelay
+        self.expected = None
+        self.pending = {}
+        self.gapSince = None
+        self.gaps = 0
+        self.reorders = 0
+        self.duplicates = 0
+        self.resyncs = 0
+
+    def push(self, sequence, order):
+        """
+        accepts a frame, delivering it and any frames it unblocks in sequence order
+
+        :param sequence: the sequence number of the frame, None for frames outside the sequence
+        :param order: the parsed message, None for frames the parser dropped
+        """
+        if sequence is None:
+            return
+        if self.expected is None:
+            self.expected = sequence
+
+        if sequence == self.expected:
+            if order is not None:
+                self.deliver(order)
+            self.expected += 1
+            if self.pending:
+                self.reorders += 1
+                self._drain()
+        elif sequence < self.expected or sequence in self.pending:
+            self.duplicates += 1
+        else:
+            if not self.pending:
+                self.gaps += 1
+                self.gapSince = time.monotonic()
+            self.pending[sequence] = order
+            if len(self.pending) >= self.reorderWindow or (
+                    self.maxDelay is not None and time.monotonic() - self.gapSince > self.maxDelay):
+                self._unfillable()
+
+    def _drain(self):
+        # deliver the frames the last delivery unblocked
+        pending = self.pending
+        while self.expected in pending:
+            order = pending.pop(self.expected)
+            if order is not None:
+                self.deliver(order)
+            self.expected += 1
+        if pending:
+            self.gapSince = time.monotonic()
+
+    def _unfillable(self):
+        # the missing frames are not coming, either resync or skip over the gap
+        if self.resync is not None:
+            self.resyncs += 1
+            self.resync()
+        held = sorted(self.pending.items())
+        self.pending = {}
+        for sequence, order in held:
+            if order is not None:
+                self.deliver(order)
+        self.expected = held[-1][0] + 1
+
+    def reset(self):
+        """
+        forgets the expected sequence and any held frames, e.g. after a reconnect
+        """
+        self.expected = None
+        self.pending = {}
+
+    def stats(self):
+        """
+        returns the sequencing counters
+        """
+        return {
+            "expected": self.expected,
+            "pending": len(self.pending),
+            "gaps": self.gaps,
+            "reorders": self.reorders,
+            "duplicates": self.duplicates,
+            "resyncs": self.resyncs,
+        }
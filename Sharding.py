@@ -0,0 +1,275 @@
+import asyncio
+import multiprocessing
+import os
+import zlib
+from collections import deque
+from BookManager import BookManager
+from MessageParser import messageProduct
+from Metrics import Metrics
+"""
+Multi process sharding of product books
+
+Structure:
+    A single process caps all book processing at one core. A ShardedBookManager hash
+    partitions the products across worker processes, each running its own BookManager
+    for its products. The parent only reads the product_id of each raw frame and appends
+    the frame to the batch of the owning shard, batches are sent over a pipe once they
+    reach batchSize so the per frame channel cost is a list append. Frames of one product
+    always go to the same worker over the same pipe, so their order is preserved.
+
+    Queries (top of book, stats, metrics) travel over the same pipe, behind any frames
+    already sent, so an answer always reflects every frame the parent received before
+    asking. top() blocks until the worker has worked through its backlog, topAsync()
+    waits for the answer on the event loop instead. Answers come back in the order the
+    queries were sent, a blocking query hands the answers of the async queries sent
+    before it to their waiters first. A ShardedBookManager is used from one thread. The per product options of BookManager (specs, internIds, engines, windows,
+    trades) are handed to the workers, so they must pickle. With a Metrics registry every
+    worker instruments its books in a registry of its own and the parent's registry
+    collects their series whenever it is read. start() starts the snapshot bootstraps in
+    the workers, call it once the subscription is confirmed like BookManager.start().
+"""
+
+# message kinds sent from the parent to a worker
+FRAMES = 0
+QUERY = 1
+STATS = 2
+STOP = 3
+START = 4
+METRICS = 5
+
+def shardOf(productId, shards):
+    """
+    returns the shard a product belongs to, stable across processes and runs
+
+    :param productId: the product id
+    :param shards: the number of shards
+    """
+    return zlib.crc32(productId.encode()) % shards
+
+def shardWorker(conn, productIds, options, instrumented=False):
+    """
+    worker process entry point, runs the worker loop on its own event loop so the
+    bootstrappers of its books can fetch snapshots in the background
+
+    :param conn: the worker end of the pipe to the parent
+    :param productIds: the products owned by this worker
+    :param options: the BookManager keyword arguments (specs, source, internIds, engines, windows, trades)
+    :param instrumented: True to instrument the books in a worker Metrics registry
+    """
+    metrics = Metrics() if instrumented else None
+    asyncio.run(serveShard(conn, BookManager(productIds, metrics=metrics, **options), metrics))
+
+async def serveShard(conn, manager, metrics=None):
+    """
+    applies frame batches to the worker's books and answers queries until told to stop
+
+    :param conn: the worker end of the pipe to the parent
+    :param manager: the BookManager owning the worker's books
+    :param metrics: the worker's Metrics registry, None when not instrumented
+    """
+    loop = asyncio.get_running_loop()
+    onFrame = manager.onFrame
+    while True:
+        # wait for the next batch off the event loop so snapshot fetches keep running
+        message = conn.recv() if conn.poll() else await loop.run_in_executor(None, conn.recv)
+        kind = message[0]
+        if kind == FRAMES:
+            for raw in message[1]:
+                onFrame(raw)
+        elif kind == QUERY:
+            conn.send(manager.book(message[1]).snapshot(message[2]))
+        elif kind == STATS:
+            conn.send(manager.stats())
+        elif kind == METRICS:
+            conn.send(metrics.families() if metrics is not None else {})
+        elif kind == START:
+            manager.start()
+        elif kind == STOP:
+            conn.close()
+            return
+
+class ShardedBookManager:
+    """
+    Spreads product books over worker processes and routes raw frames to them
+
+    Attributes:
+        shards: the number of worker processes
+        routes: the shard of every product in the form of product id : shard index
+        batchSize: the number of frames buffered per shard before they are sent
+        pending: per shard, the frames not sent yet
+        waiting: per shard, the futures of the async queries not answered yet, oldest first
+
+    specs, source, internIds, engines, windows and trades are passed to the BookManager of
+    every worker, see BookManager. metrics is the parent's Metrics registry, the workers'
+    series are added to it.
+    """
+    def __init__(self, productIds, shards=None, specs=None, source=None, batchSize=256, metrics=None,
+                 internIds=False, engines=None, windows=None, trades=False):
+        if windows and metrics is not None:
+            raise ValueError("a depth windowed book can not be instrumented")
+        productIds = list(productIds)
+        self.shards = max(1, min(shards or os.cpu_count(), len(productIds)))
+        self.routes = {productId: shardOf(productId, self.shards) for productId in productIds}
+        self.batchSize = batchSize
+        self.pending = [[] for _ in range(self.shards)]
+        self.waiting = [deque() for _ in range(self.shards)]
+        self.conns = []
+        self.workers = []
+        options = {"specs": specs, "source": source, "internIds": internIds, "engines": engines,
+                   "windows": windows, "trades": trades}
+        for shard in range(self.shards):
+            owned = [productId for productId, index in self.routes.items() if index == shard]
+            parentConn, childConn = multiprocessing.Pipe()
+            args = (childConn, owned, options, metrics is not None)
+            worker = multiprocessing.Process(target=shardWorker, args=args, daemon=True)
+            worker.start()
+            childConn.close()
+            self.conns.append(parentConn)
+            self.workers.append(worker)
+        if metrics is not None:
+            metrics.collect(self.metricFamilies)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def subscription(self):
+        """
+        returns the subscribe message for every managed product
+        """
+        return {"type": "subscribe", "product_ids": list(self.routes), "channels": ["full"]}
+
+    def start(self):
+        """
+        starts the snapshot bootstraps in every worker, call it once the subscription is confirmed
+        """
+        for conn in self.conns:
+            conn.send((START,))
+
+    def onFrame(self, raw):
+        """
+        queues a raw JSON frame for the worker owning its product, frames of other products are ignored
+
+        :param raw: the JSON text received from the websocket
+        """
+        shard = self.routes.get(messageProduct(raw))
+        if shard is None:
+            return
+        batch = self.pending[shard]
+        batch.append(raw)
+        if len(batch) >= self.batchSize:
+            self._send(shard)
+
+    def _send(self, shard):
+        self.conns[shard].send((FRAMES, self.pending[shard]))
+        self.pending[shard] = []
+
+    def flush(self):
+        """
+        sends every buffered frame to its worker
+        """
+        for shard in range(self.shards):
+            if self.pending[shard]:
+                self._send(shard)
+
+    def top(self, productId, depth=1):
+        """
+        returns a BookSnapshot of a product's book, after every frame received so far is applied
+
+        :param productId: the product id
+        :param depth: the number of levels per side
+        """
+        shard = self.routes[productId]
+        if self.pending[shard]:
+            self._send(shard)
+        self.conns[shard].send((QUERY, productId, depth))
+        return self._receive(shard)
+
+    async def topAsync(self, productId, depth=1):
+        """
+        returns a BookSnapshot of a product's book like top(), without blocking the event
+        loop while the worker catches up
+
+        :param productId: the product id
+        :param depth: the number of levels per side
+        """
+        shard = self.routes[productId]
+        if self.pending[shard]:
+            self._send(shard)
+        conn = self.conns[shard]
+        future = asyncio.get_running_loop().create_future()
+        conn.send((QUERY, productId, depth))
+        waiting = self.waiting[shard]
+        if not waiting:
+            future.get_loop().add_reader(conn.fileno(), self._onReadable, shard)
+        waiting.append(future)
+        return await future
+
+    def _onReadable(self, shard):
+        conn = self.conns[shard]
+        while self.waiting[shard] and conn.poll():
+            self._answer(shard, conn.recv())
+
+    def _answer(self, shard, reply):
+        # hands an answer to the oldest async query of the shard
+        waiting = self.waiting[shard]
+        future = waiting.popleft()
+        if not waiting:
+            future.get_loop().remove_reader(self.conns[shard].fileno())
+        if not future.done():
+            future.set_result(reply)
+
+    def _receive(self, shard):
+        # returns the answer to the last blocking query, the answers ahead of it belong to async queries
+        conn = self.conns[shard]
+        while self.waiting[shard]:
+            self._answer(shard, conn.recv())
+        return conn.recv()
+
+    def stats(self):
+        """
+        returns the processing counters of every product across all workers
+        """
+        self.flush()
+        for conn in self.conns:
+            conn.send((STATS,))
+        stats = {}
+        for shard in range(self.shards):
+            stats.update(self._receive(shard))
+        return stats
+
+    def metricFamilies(self):
+        """
+        returns the metric families of every worker merged, see Metrics.families(), empty
+        once the workers are stopped
+        """
+        self.flush()
+        for conn in self.conns:
+            conn.send((METRICS,))
+        families = {}
+        for shard in range(self.shards):
+            for name, (kind, help, lines) in self._receive(shard).items():
+                families.setdefault(name, (kind, help, []))[2].extend(lines)
+        return families
+
+    def close(self):
+        """
+        flushes the pending frames and stops the workers
+        """
+        if not self.workers:
+            return
+        for shard, waiting in enumerate(self.waiting):
+            if waiting:
+                waiting[0].get_loop().remove_reader(self.conns[shard].fileno())
+            while waiting:
+                waiting.popleft().cancel()
+        self.flush()
+        for conn in self.conns:
+            conn.send((STOP,))
+        for worker, conn in zip(self.workers, self.conns):
+            worker.join()
+            conn.close()
+        self.workers = []
+        self.conns = []
@@ -0,0 +1,76 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3
+import math
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook, np
+
+if np is not None:
+    from Analytics import cumulativeDepth, imbalance, sweepCost, vwapForNotional
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestClass(unittest.TestCase):
+    def build(self, bookSpec=None):
+        mp = MessageParser(bookSpec)
+        book = OrderBook(bookSpec)
+        # asks: 200.2 x 1, 200.3 x 2 ; bids: 199.5 x 1.25, 199 x 1.25
+        book.processMessage(mp({**openOrder1, "remaining_size": "1", "sequence": 1}))
+        book.processMessage(mp({**openOrder2, "price": "200.3", "remaining_size": "2", "sequence": 2}))
+        book.processMessage(mp({**openOrder3, "side": "buy", "price": "199.5", "remaining_size": "1.25", "sequence": 3}))
+        book.processMessage(mp({**openOrder3, "order_id": "order4", "side": "buy", "price": "199",
+                                "remaining_size": "1.25", "sequence": 4}))
+        return book
+
+    def testDepthArrays(self):
+        for bookSpec in (None, spec):
+            book = self.build(bookSpec)
+            arrays = book.depthArrays(5)
+            self.assertEqual(arrays.sequence, 4)
+            self.assertEqual(arrays.bidPrices.tolist(), [199.5, 199.0])
+            self.assertEqual(arrays.bidSizes.tolist(), [1.25, 1.25])
+            self.assertEqual(arrays.askPrices.tolist(), [200.2, 200.3])
+            self.assertEqual(arrays.askSizes.tolist(), [1.0, 2.0])
+            self.assertEqual(book.depthArrays(1).askPrices.tolist(), [200.2])
+            self.assertFalse(arrays.askSizes.flags.writeable)
+
+    def testCache(self):
+        book = self.build()
+        arrays = book.depthArrays(5)
+        self.assertIs(book.depthArrays(5), arrays)
+        book.processMessage(MessageParser()({**openOrder1, "order_id": "order5", "remaining_size": "1", "sequence": 5}))
+        self.assertEqual(book.depthArrays(5).askSizes.tolist(), [2.0, 2.0])
+
+    def testAnalytics(self):
+        arrays = self.build().depthArrays(10)
+        sizes, notionals = cumulativeDepth(arrays.askPrices, arrays.askSizes)
+        self.assertEqual(sizes.tolist(), [1.0, 3.0])
+        self.assertAlmostEqual(notionals[-1], 200.2 + 2 * 200.3)
+
+        self.assertAlmostEqual(imbalance(arrays.bidSizes, arrays.askSizes), (2.5 - 3) / 5.5)
+        self.assertAlmostEqual(imbalance(arrays.bidSizes, arrays.askSizes, levels=1), (1.25 - 1) / 2.25)
+
+        # buying 2 takes all of 200.2 and 1 of 200.3
+        fill = sweepCost(arrays.askPrices, arrays.askSizes, 2)
+        self.assertAlmostEqual(fill.notional, 200.2 + 200.3)
+        self.assertAlmostEqual(fill.averagePrice, 200.25)
+        self.assertEqual((fill.levels, fill.complete), (2, True))
+
+        fill = sweepCost(arrays.bidPrices, arrays.bidSizes, 5)
+        self.assertEqual((fill.quantity, fill.complete), (2.5, False))
+
+        fill = vwapForNotional(arrays.askPrices, arrays.askSizes, 200.2 + 200.3)
+        self.assertAlmostEqual(fill.quantity, 2)
+        self.assertAlmostEqual(fill.averagePrice, 200.25)
+
+        fill = sweepCost(arrays.askPrices[:0], arrays.askSizes[:0], 1)
+        self.assertTrue(math.isnan(fill.averagePrice))
+
+if __name__ == "__main__":
+    unittest.main()
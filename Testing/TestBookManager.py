@@ -0,0 +1,95 @@
+from DummyOrders import openOrder1, openOrder2, matchOrder1
+import asyncio
+import json
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser, messageProduct
+from TickLadder import TickLadder, ladderEngine
+from WindowedBook import WindowedOrderBook
+
+class TestClass(unittest.TestCase):
+    def testProductOnMessage(self):
+        self.assertEqual(MessageParser()(openOrder1).product, "BTC-USD")
+        self.assertEqual(messageProduct(json.dumps(openOrder1)), "BTC-USD")
+
+    def testRouting(self):
+        manager = BookManager(["BTC-USD", "ETH-USD"])
+        self.assertEqual(manager.subscription()["product_ids"], ["BTC-USD", "ETH-USD"])
+
+        # each product has its own sequence numbers
+        manager.onMessage({**openOrder1, "sequence": 1})
+        manager.onFrame(json.dumps({**openOrder2, "product_id": "ETH-USD", "price": "10.5", "sequence": 7}))
+        manager.onFrame(json.dumps({**matchOrder1, "sequence": 2}))
+        self.assertIsNone(manager.onMessage({**openOrder1, "product_id": "SOL-USD"}))
+
+        btc = manager.book("BTC-USD")
+        eth = manager.book("ETH-USD")
+        self.assertEqual(btc.depth(5), ([], [(200.2, 0.25, 1)]))
+        self.assertEqual(eth.depth(5), ([], [(10.5, 1.0, 1)]))
+
+        stats = manager.stats()
+        self.assertEqual(stats["BTC-USD"]["frames"], 2)
+        self.assertEqual(stats["ETH-USD"]["frames"], 1)
+        self.assertEqual(stats["ETH-USD"]["sequence"], 7)
+        self.assertEqual(stats["BTC-USD"]["orders"], 1)
+
+    def testPerProductBooks(self):
+        manager = BookManager(["BTC-USD", "ETH-USD"], engines={"BTC-USD": ladderEngine(0.01)},
+                              windows={"ETH-USD": 10}, trades=True)
+        self.assertIsInstance(manager.book("BTC-USD").askLimits, TickLadder)
+        self.assertIsInstance(manager.book("ETH-USD"), WindowedOrderBook)
+        manager.onMessage({**openOrder1, "sequence": 1})
+        manager.onMessage({**matchOrder1, "sequence": 2})
+        self.assertEqual(manager.book("BTC-USD").depth(5), ([], [(200.2, 0.25, 1)]))
+        self.assertEqual(manager.products["BTC-USD"].trades.last().size, 0.75)
+        self.assertEqual(manager.stats()["BTC-USD"]["trades"], 1)
+
+    def testTradesDuringBootstrap(self):
+        class PendingSource:
+            # hands out the snapshot once the test releases it
+            def __init__(self):
+                self.released = asyncio.Event()
+
+            async def fetch(self, productId):
+                await self.released.wait()
+                return {"sequence": 3, "bids": [], "asks": [["200.2", "1.00", "order1"]]}
+
+        async def scenario():
+            source = PendingSource()
+            manager = BookManager(["BTC-USD"], source=source, trades=True)
+            manager.start()
+            # matches 2 and 3 are older than the snapshot, the book drops them
+            for sequence in (2, 3):
+                manager.onMessage({**matchOrder1, "size": "0.1", "sequence": sequence})
+            source.released.set()
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            for sequence in (4, 5):
+                manager.onMessage({**matchOrder1, "size": "0.1", "sequence": sequence})
+            return manager
+
+        manager = asyncio.run(scenario())
+        product = manager.products["BTC-USD"]
+        self.assertTrue(product.bootstrapper.ready)
+        self.assertEqual(product.book.orderBook["order1"].quantity, 0.8)
+        self.assertEqual([trade.sequence for trade in product.trades.recent(10)], [2, 3, 4, 5])
+
+        # a repeated match is recorded once
+        product.trades.recordOrder(product.parser({**matchOrder1, "sequence": 5}))
+        self.assertEqual(product.trades.total, 4)
+
+    def testPerProductSpec(self):
+        manager = BookManager(["BTC-USD", "ETH-USD"], specs={"BTC-USD": ProductSpec("BTC-USD", "0.01", "0.00000001")})
+        manager.onMessage({**openOrder1, "sequence": 1})
+        manager.onMessage({**openOrder1, "product_id": "ETH-USD", "sequence": 1})
+        self.assertEqual(manager.book("BTC-USD").best_ask(), 20020)
+        self.assertEqual(manager.book("ETH-USD").best_ask(), 200.2)
+
+if __name__ == "__main__":
+    unittest.main()
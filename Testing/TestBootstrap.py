@@ -0,0 +1,130 @@
+from DummyOrders import openOrder2, doneOrder1, matchOrder1
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from Bootstrap import Bootstrapper, FileSnapshotSource, loadSnapshot
+from OrderBook import OrderBook
+from MessageParser import MessageParser
+
+mp = MessageParser()
+
+# level 3 snapshot taken at sequence 20, order1 is resting before we connect
+snapshot = {
+    "sequence": 20,
+    "bids": [["199.5", "2.0", "bid1"], ["199.5", "1.0", "bid2"], ["199.0", "3.0", "bid3"]],
+    "asks": [["200.2", "1.00", "order1"]],
+}
+
+class TestClass(unittest.TestCase):
+    def testLoadSnapshot(self):
+        ob = OrderBook()
+        loadSnapshot(ob, mp, snapshot)
+
+        self.assertEqual(ob.currSeqNum, 20)
+        self.assertEqual(ob.depth(5), ([(199.5, 3.0, 2), (199.0, 3.0, 1)], [(200.2, 1.0, 1)]))
+
+        # queue order within a level follows the snapshot
+        limit = ob.buyLimits[199.5]
+        self.assertEqual(limit.head.id, "bid1")
+        self.assertEqual(limit.head.next.id, "bid2")
+        self.assertEqual(limit.tail.prev.id, "bid1")
+
+        # the loaded orders behave like any other order
+        ob.processMessage(mp({**doneOrder1, "sequence": 21}))
+        self.assertNotIn(200.2, ob.askLimits)
+
+    def testLoadSnapshotInternIds(self):
+        uuid = "414c343c-1e2f-7ed4-c2ce-78e57311d8a3"
+        interning = MessageParser(internIds=True)
+        ob = OrderBook()
+        loadSnapshot(ob, interning, {**snapshot, "asks": [["200.2", "1.00", uuid]]})
+        self.assertEqual(ob.askLimits[200.2].head.id, int(uuid.replace("-", ""), 16))
+
+        # live messages are keyed the same way as the snapshot
+        ob.processMessage(interning({**doneOrder1, "order_id": uuid, "sequence": 21}))
+        self.assertEqual(len(ob.askLimits), 0)
+
+    def testBootstrap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "{}.json")
+            with open(path.format("BTC-USD"), "w") as snapshotFile:
+                json.dump(snapshot, snapshotFile)
+
+            async def scenario():
+                ob = OrderBook()
+                bootstrapper = Bootstrapper(ob, mp, FileSnapshotSource(path), "BTC-USD")
+                bootstrapper.start()
+
+                # received before the snapshot was loaded, order2 is already in the snapshot
+                # sequence range so it is dropped, the match is newer and is replayed
+                bootstrapper.onMessage(mp(openOrder2))
+                bootstrapper.onMessage(None)
+                self.assertEqual(len(ob.orderBook), 0)
+                await asyncio.sleep(0)
+                bootstrapper.onMessage(mp(matchOrder1))
+                return ob, bootstrapper
+
+            ob, bootstrapper = asyncio.run(scenario())
+
+        self.assertTrue(bootstrapper.ready)
+        self.assertEqual(bootstrapper.snapshotSequence, 20)
+        self.assertEqual(ob.currSeqNum, 50)
+        self.assertNotIn("order2", ob.orderBook)
+        self.assertEqual(ob.orderBook["order1"].quantity, 0.25)
+
+        # once ready messages are applied directly
+        bootstrapper.onMessage(mp({**doneOrder1, "sequence": 51}))
+        self.assertEqual(len(ob.askLimits), 0)
+
+    def testRetryFailedFetch(self):
+        class FlakySource:
+            # fails the first two fetches the way a timeout and a bad response would
+            def __init__(self):
+                self.calls = 0
+
+            async def fetch(self, productId):
+                self.calls += 1
+                if self.calls == 1:
+                    raise TimeoutError("timed out")
+                if self.calls == 2:
+                    return {**snapshot, "asks": [["200.2", "1.00"]]}
+                return snapshot
+
+        async def scenario():
+            ob = OrderBook()
+            source = FlakySource()
+            bootstrapper = Bootstrapper(ob, mp, source, "BTC-USD", retryDelay=0.001)
+            bootstrapper.start()
+            await asyncio.sleep(0)
+            # the failed fetch is retried, the messages keep buffering
+            bootstrapper.onMessage(mp(openOrder2))
+            self.assertIsInstance(bootstrapper.lastError, TimeoutError)
+            while source.calls < 2 or not bootstrapper.task.done():
+                await asyncio.sleep(0.001)
+            bootstrapper.onMessage(None)
+            self.assertIsInstance(bootstrapper.lastError, ValueError)
+            self.assertEqual(bootstrapper.attempts, 2)
+            self.assertFalse(bootstrapper.ready)
+            while not bootstrapper.task.done():
+                await asyncio.sleep(0.001)
+            bootstrapper.onMessage(mp(matchOrder1))
+            return ob, bootstrapper, source
+
+        with self.assertLogs("Bootstrap", "WARNING") as logs:
+            ob, bootstrapper, source = asyncio.run(scenario())
+        self.assertEqual(len(logs.output), 2)
+        self.assertTrue(bootstrapper.ready)
+        self.assertEqual((source.calls, bootstrapper.failures), (3, 2))
+        self.assertEqual(ob.currSeqNum, 50)
+        self.assertEqual(ob.orderBook["order1"].quantity, 0.25)
+        self.assertNotIn("order2", ob.orderBook)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3, matchOrder1
+import json
+import os
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager, checkpointPath
+from Checkpoint import Checkpointer, warmStart, HEADER, V1_HEADER, MAGIC
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import FeedRecorder
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+
+def levelOrders(book):
+    # the FIFO order ids of every level, best first
+    levels = []
+    for side in (reversed(book.buyLimits.values()), book.askLimits.values()):
+        for limit in side:
+            ids = []
+            order = limit.head
+            while order is not None:
+                ids.append((order.id, order.quantity))
+                order = order.next
+            levels.append((limit.price, ids))
+    return levels
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "book.ckpt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self, book, mp):
+        book.processMessage(mp({**openOrder1, "sequence": 1}))
+        book.processMessage(mp({**openOrder2, "sequence": 2}))
+        book.processMessage(mp({**openOrder3, "sequence": 3}))
+        book.processMessage(mp({**openOrder3, "order_id": "order4", "sequence": 4}))
+        book.processMessage(mp({**openOrder3, "order_id": 2 ** 100, "side": "buy", "price": "199", "sequence": 5}))
+
+    def testRoundTrip(self):
+        for bookSpec in (None, spec):
+            mp = MessageParser(bookSpec)
+            book = OrderBook(bookSpec)
+            self.build(book, mp)
+            book.save_snapshot(self.path)
+            self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+            restored = OrderBook(bookSpec)
+            restored.load_snapshot(self.path)
+            self.assertEqual(restored.currSeqNum, 5)
+            self.assertEqual(levelOrders(restored), levelOrders(book))
+            self.assertEqual(restored.depth(5), book.depth(5))
+            self.assertIn(2 ** 100, restored.orderBook)
+
+    def testSpecMismatch(self):
+        book = OrderBook()
+        self.build(book, MessageParser())
+        book.save_snapshot(self.path)
+        with self.assertRaises(ValueError):
+            OrderBook(spec).load_snapshot(self.path)
+
+    def testCheckpointer(self):
+        mp = MessageParser()
+        book = OrderBook()
+        self.build(book, mp)
+        for useFork in ((True, False) if hasattr(os, "fork") else (False,)):
+            checkpointer = Checkpointer(book, self.path, interval=0.0, useFork=useFork)
+            self.assertTrue(checkpointer.poll())
+            checkpointer.wait()
+            # unchanged book, nothing to write
+            self.assertFalse(checkpointer.poll())
+            restored = OrderBook()
+            restored.load_snapshot(self.path)
+            self.assertEqual(levelOrders(restored), levelOrders(book))
+            os.remove(self.path)
+
+    def testWarmStart(self):
+        mp = MessageParser()
+        book = OrderBook()
+        self.build(book, mp)
+        book.save_snapshot(checkpointPath(self.directory.name, "BTC-USD"))
+
+        # the capture holds frames from before and after the checkpoint
+        capture = os.path.join(self.directory.name, "capture.bin")
+        with FeedRecorder(capture) as recorder:
+            recorder.record(json.dumps({**openOrder1, "sequence": 1}))
+            recorder.record(json.dumps({**matchOrder1, "sequence": 6}))
+            # the recorder died while writing the last frame
+            recorder.record(json.dumps({**openOrder1, "order_id": "torn", "sequence": 7}))
+        with open(capture, "r+b") as torn:
+            torn.truncate(os.path.getsize(capture) - 20)
+        self.assertFalse(warmStart(OrderBook(), mp, os.path.join(self.directory.name, "missing.ckpt")))
+
+        manager = BookManager(["BTC-USD", "ETH-USD"])
+        self.assertEqual(manager.warmStart(self.directory.name, capture), ["BTC-USD"])
+        restored = manager.book("BTC-USD")
+        self.assertEqual(restored.currSeqNum, 6)
+        self.assertEqual(restored.orderBook["order1"].quantity, 0.25)
+        self.assertEqual(manager.products["BTC-USD"].sequencer.expected, 7)
+
+        # the live stream continues from the restored sequence
+        manager.onMessage({**openOrder1, "order_id": "order5", "sequence": 7})
+        self.assertIn("order5", restored.orderBook)
+
+    def testCaptureOffset(self):
+        mp = MessageParser()
+        book = OrderBook()
+        self.build(book, mp)
+        capture = os.path.join(self.directory.name, "capture.bin")
+        with FeedRecorder(capture) as recorder:
+            # applied before the checkpoint in a live run, so behind its capture offset
+            recorder.record(json.dumps({**openOrder1, "order_id": "before", "sequence": 6}))
+            for useFork in ((True, False) if hasattr(os, "fork") else (False,)):
+                checkpointer = Checkpointer(book, self.path, interval=0.0, useFork=useFork, offset=recorder.offset)
+                checkpointer.checkpoint()
+                checkpointer.wait()
+            recorder.record(json.dumps({**openOrder1, "order_id": "after", "sequence": 7}))
+
+        restored = OrderBook()
+        self.assertTrue(warmStart(restored, mp, self.path, capture, "BTC-USD"))
+        self.assertNotIn("before", restored.orderBook)
+        self.assertIn("after", restored.orderBook)
+        self.assertEqual(restored.currSeqNum, 7)
+
+        # without an offset the whole capture is read
+        book.save_snapshot(self.path)
+        restored = OrderBook()
+        warmStart(restored, mp, self.path, capture, "BTC-USD")
+        self.assertIn("before", restored.orderBook)
+
+    def testVersion1(self):
+        book = OrderBook()
+        self.build(book, MessageParser())
+        book.save_snapshot(self.path, captureOffset=123)
+        with open(self.path, "rb") as checkpoint:
+            data = checkpoint.read()
+        header = HEADER.unpack_from(data)
+        with open(self.path, "wb") as checkpoint:
+            checkpoint.write(V1_HEADER.pack(MAGIC, 1, *header[2:-1]) + data[HEADER.size:])
+        restored = OrderBook()
+        self.assertIsNone(restored.load_snapshot(self.path))
+        self.assertEqual(levelOrders(restored), levelOrders(book))
+        book.save_snapshot(self.path, captureOffset=123)
+        self.assertEqual(OrderBook().load_snapshot(self.path), 123)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3, doneOrder1, changeOrder2, matchOrder1
+import json
+import os
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from EventLog import EventLog, convertCapture, np
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import FeedRecorder
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+
+messages = [
+    {**openOrder1, "sequence": 1},
+    {"type": "received", "product_id": "BTC-USD", "sequence": 2},
+    {**openOrder2, "sequence": 3},
+    {**openOrder3, "product_id": "ETH-USD", "sequence": 4},
+    {**openOrder3, "side": "buy", "price": "199.5", "sequence": 5},
+    {**matchOrder1, "sequence": 6},
+    {**changeOrder2, "product_id": "BTC-USD", "sequence": 7},
+    {**doneOrder1, "sequence": 8},
+]
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        capture = os.path.join(self.directory.name, "capture.bin")
+        with FeedRecorder(capture) as recorder:
+            for message in messages:
+                recorder.record(json.dumps(message))
+        self.log = os.path.join(self.directory.name, "btc.events")
+        self.written = convertCapture(capture, self.log, spec, productId="BTC-USD")
+
+        # the same messages applied through the JSON path
+        mp = MessageParser(spec)
+        self.expected = OrderBook(spec)
+        for message in messages:
+            order = mp(message)
+            if order is not None and order.product == "BTC-USD":
+                self.expected.processMessage(order)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testConvert(self):
+        # received and the other product are left out
+        self.assertEqual(self.written, 6)
+        with EventLog(self.log) as log:
+            self.assertEqual(log.count, 6)
+            self.assertEqual((log.spec.priceDecimals, log.spec.sizeDecimals), (2, 8))
+            self.assertEqual(log.orderId(0), "order1")
+            self.assertEqual(next(log.events()), (0, 0, 0, 20020, 100000000, 1))
+
+    def testReplay(self):
+        for useNumpy in (False, True):
+            if useNumpy and np is None:
+                continue
+            with EventLog(self.log, useNumpy=useNumpy) as log:
+                book = OrderBook(log.spec)
+                log.replay(book)
+                self.assertEqual(book.depth(5), self.expected.depth(5))
+                self.assertEqual(book.currSeqNum, 8)
+                self.assertEqual(sorted(log.orderId(index) for index in book.orderBook), sorted(self.expected.orderBook))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def testArray(self):
+        with EventLog(self.log) as log:
+            events = log.array()
+            self.assertEqual(events["sequence"].tolist(), [1, 3, 5, 6, 7, 8])
+            self.assertEqual(int(events["price"][0]), 20020)
+            del events
+
+if __name__ == "__main__":
+    unittest.main()
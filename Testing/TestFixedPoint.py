@@ -0,0 +1,66 @@
+from DummyOrders import openOrder1, openOrder2, matchOrder1, changeOrder2
+from decimal import Decimal
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec, toUnits, decimalPlaces
+from OrderBook import OrderBook
+from MessageParser import MessageParser
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+mp = MessageParser(spec)
+
+class TestClass(unittest.TestCase):
+    def testToUnits(self):
+        self.assertEqual(toUnits("200.2", 2), 20020)
+        self.assertEqual(toUnits("200.20000", 2), 20020)
+        self.assertEqual(toUnits("200", 2), 20000)
+        self.assertEqual(toUnits("0.00000001", 8), 1)
+        self.assertEqual(toUnits("-0.5", 2), -50)
+        with self.assertRaises(ValueError):
+            toUnits("200.205", 2)
+
+    def testSpec(self):
+        self.assertEqual(decimalPlaces("0.01"), 2)
+        self.assertEqual(decimalPlaces("1.00"), 0)
+        self.assertEqual(decimalPlaces("1"), 0)
+        self.assertEqual(spec.tick, 1)
+        self.assertEqual(spec.price(20020), Decimal("200.20"))
+        self.assertEqual(spec.size(75000000), Decimal("0.75"))
+
+        halfTick = ProductSpec.fromProduct({"id": "X-USD", "quote_increment": "0.5", "base_increment": "1"})
+        self.assertEqual((halfTick.priceDecimals, halfTick.tick, halfTick.sizeDecimals), (1, 5, 0))
+
+    def testParse(self):
+        openOrder = mp(openOrder1)
+        self.assertEqual(openOrder.price, 20020)
+        self.assertEqual(openOrder.quantity, 100000000)
+        self.assertIsInstance(openOrder.price, int)
+
+        changeOrder = mp(changeOrder2)
+        self.assertEqual(changeOrder.price, 10020)
+        self.assertEqual(changeOrder.quantity, 50000000)
+
+    def testExactFills(self):
+        ob = OrderBook(spec)
+        ob.processMessage(mp({**openOrder1, "remaining_size": "0.3"}))
+        ob.processMessage(mp(openOrder2))
+
+        # 0.1 + 0.2 fills the order exactly, no dust is left behind
+        ob.processMessage(mp({**matchOrder1, "size": "0.1"}))
+        ob.processMessage(mp({**matchOrder1, "size": "0.2", "sequence": 51}))
+        self.assertNotIn("order1", ob.orderBook)
+
+        limit = ob.askLimits[20020]
+        self.assertEqual(limit.order_count, 1)
+        self.assertEqual(limit.total_size, 100000000)
+
+        snapshot = ob.snapshot(5)
+        self.assertEqual(snapshot.asks, [(Decimal("200.20"), Decimal("1.00000000"), 1)])
+        self.assertEqual(ob.best_ask(), 20020)
+
+if __name__ == "__main__":
+    unittest.main()
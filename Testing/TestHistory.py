@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from History import HistoryStore, buildHistory
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from Replay import FeedRecorder
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+START = 1700000000 * 10 ** 9
+
+def randomMessages(count, seed=11):
+    # opens, cancels, fills and changes around a drifting mid with gaps in the sequence
+    rng = random.Random(seed)
+    resting = {}
+    mid = 30000.0
+    sequence = 100
+    messages = []
+    for number in range(count):
+        sequence += rng.randrange(1, 3)
+        roll = rng.random()
+        if roll < 0.5 or len(resting) < 20:
+            side = rng.choice(("buy", "sell"))
+            price = mid - rng.randrange(1, 200) / 100 if side == "buy" else mid + rng.randrange(1, 200) / 100
+            iden = f"order-{number}"
+            resting[iden] = [side, price, rng.randrange(1, 100) / 1000]
+            messages.append({"type": "open", "order_id": iden, "price": f"{price:.2f}",
+                             "remaining_size": f"{resting[iden][2]:.8f}", "side": side})
+        else:
+            iden = rng.choice(list(resting))
+            side, price, size = resting[iden]
+            if roll < 0.8:
+                del resting[iden]
+                messages.append({"type": "done", "order_id": iden, "price": f"{price:.2f}",
+                                 "remaining_size": "0", "side": side, "reason": "canceled"})
+            else:
+                del resting[iden]
+                messages.append({"type": "match", "maker_order_id": iden, "taker_order_id": "taker",
+                                 "price": f"{price:.2f}", "size": f"{size:.8f}", "side": side})
+                mid += 0.01 if side == "sell" else -0.01
+        messages[-1].update(product_id="BTC-USD", sequence=sequence)
+    return messages
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        capture = os.path.join(self.directory.name, "capture.bin")
+        self.messages = randomMessages(3000)
+        with FeedRecorder(capture) as recorder:
+            for number, message in enumerate(self.messages):
+                recorder.record(json.dumps(message), START + number * 1000)
+                if number == 10:
+                    recorder.record(json.dumps({**message, "product_id": "ETH-USD", "sequence": 1}), START + number * 1000)
+        self.history = os.path.join(self.directory.name, "history")
+        self.written = buildHistory(capture, self.history, spec, productId="BTC-USD", interval=250)
+        self.store = HistoryStore(self.history)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def reference(self, sequence):
+        # the same messages applied through the JSON path from the start
+        parser = MessageParser(spec)
+        book = OrderBook(spec)
+        for message in self.messages:
+            if message["sequence"] > sequence:
+                break
+            book.processMessage(parser.parseRaw(json.dumps(message)))
+        return book
+
+    def assertSameBook(self, book, reference):
+        self.assertEqual(book.depth(1000), reference.depth(1000))
+        self.assertEqual(book.orderCount(), reference.orderCount())
+        self.assertEqual(book.currSeqNum, reference.currSeqNum)
+
+    def testIndex(self):
+        self.assertEqual(self.written, len(self.messages))
+        self.assertEqual(len(self.store), len(self.messages))
+        self.assertEqual(len(self.store.checkpoints), len(self.messages) // 250)
+        self.assertEqual(self.store.orderId(0), self.messages[0]["order_id"])
+        self.assertEqual(self.store.time(5), START + 5000)
+
+    def testBookAtSequence(self):
+        rng = random.Random(4)
+        sequences = [message["sequence"] for message in self.messages]
+        # checkpoint boundaries, sequences in the gaps and random positions
+        targets = [sequences[249], sequences[250], sequences[-1], sequences[-1] + 50, sequences[500] + 1]
+        targets += rng.sample(sequences, 10)
+        for sequence in targets:
+            self.assertSameBook(self.store.book_at(sequence), self.reference(sequence))
+
+    def testBookBeforeFirstMessage(self):
+        book = self.store.book_at(self.messages[0]["sequence"] - 1)
+        self.assertEqual(book.depth(10), ([], []))
+        self.assertIsNone(self.store.sequenceAt(START - 1))
+
+    def testBookAtTime(self):
+        timestamp = START + 1234 * 1000 + 500
+        sequence = self.store.sequenceAt(timestamp)
+        self.assertEqual(sequence, self.messages[1234]["sequence"])
+        self.assertSameBook(self.store.book_at_time(timestamp), self.reference(sequence))
+
+if __name__ == "__main__":
+    unittest.main()
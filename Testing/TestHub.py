@@ -0,0 +1,106 @@
+from DummyOrders import openOrder1, openOrder2
+import asyncio
+import os
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from FixedPoint import ProductSpec
+from Hub import BookHub, DISCONNECT, RESNAPSHOT, hubMessages
+from L2Diff import L2DiffStream
+
+def burst(manager, first, count):
+    # applies count opens without yielding to the event loop
+    for sequence in range(first, first + count):
+        manager.onMessage({**openOrder2, "order_id": f"o{sequence}", "price": str(300 + sequence), "sequence": sequence})
+
+class TestClass(unittest.TestCase):
+    def testSnapshotThenUpdates(self):
+        async def scenario():
+            manager = BookManager(["BTC-USD", "ETH-USD"])
+            hub = BookHub(manager)
+            await hub.start(host="127.0.0.1", port=0)
+            host, port = hub.addresses()[0][:2]
+            manager.onMessage({**openOrder1, "sequence": 1})
+            # another L2 consumer of the same book keeps its stream next to the hub's
+            local = L2DiffStream(manager.book("BTC-USD"), depth=1)
+            local.subscribe(localUpdates.append)
+
+            messages = hubMessages(["BTC-USD", "DOGE-USD"], host, port)
+            error = await messages.__anext__()
+            snapshot = await messages.__anext__()
+            manager.onMessage({**openOrder2, "sequence": 2})
+            update = await messages.__anext__()
+            stats = hub.stats()
+            await messages.aclose()
+            await hub.close()
+            return error, snapshot, update, stats
+
+        localUpdates = []
+        error, snapshot, update, stats = asyncio.run(scenario())
+        self.assertEqual([update.deltas for update in localUpdates], [[(0, 200.2, 2.0)]])
+        self.assertEqual(error["products"], ["DOGE-USD"])
+        self.assertEqual(snapshot, {"type": "snapshot", "product": "BTC-USD", "sequence": 1,
+                                    "bids": [], "asks": [[200.2, 1.0]]})
+        self.assertEqual(update, {"type": "l2", "product": "BTC-USD", "sequence": 2, "changes": [[0, 200.2, 2.0]]})
+        self.assertEqual(stats["subscriptions"], {"BTC-USD": 1, "ETH-USD": 0})
+        self.assertEqual(stats["streams"], 1)
+
+    def testFixedPoint(self):
+        async def scenario(path):
+            spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+            manager = BookManager(["BTC-USD"], specs={"BTC-USD": spec})
+            hub = BookHub(manager, depth=1)
+            await hub.start(path=path)
+            manager.onMessage({**openOrder1, "sequence": 1})
+            messages = hubMessages(["BTC-USD"], path=path)
+            snapshot = await messages.__anext__()
+            await messages.aclose()
+            await hub.close()
+            return snapshot
+
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = asyncio.run(scenario(os.path.join(directory, "hub.sock")))
+        self.assertEqual(snapshot["asks"], [["200.20", "1.00000000"]])
+
+    def testWindowedDepth(self):
+        manager = BookManager(["BTC-USD", "ETH-USD"], windows={"ETH-USD": 10})
+        self.assertIsNone(BookHub(manager).streamDepth("BTC-USD"))
+        self.assertEqual(BookHub(manager).streamDepth("ETH-USD"), 10)
+        self.assertEqual(BookHub(manager, depth=5).streamDepth("ETH-USD"), 5)
+        self.assertEqual(BookHub(manager, depth=50).streamDepth("ETH-USD"), 10)
+
+    def testSlowConsumer(self):
+        async def scenario(policy):
+            manager = BookManager(["BTC-USD"])
+            hub = BookHub(manager, maxQueue=3, policy=policy)
+            await hub.start(host="127.0.0.1", port=0)
+            host, port = hub.addresses()[0][:2]
+            manager.onMessage({**openOrder1, "sequence": 1})
+            messages = hubMessages(["BTC-USD"], host, port)
+            await messages.__anext__()
+
+            # the fourth update overflows the queue before the writer gets to run
+            burst(manager, 2, 5)
+            received = [message async for message in messages] if policy == DISCONNECT else \
+                [await messages.__anext__(), await messages.__anext__()]
+            stats = hub.stats()
+            await messages.aclose()
+            await hub.close()
+            return received, stats
+
+        received, stats = asyncio.run(scenario(RESNAPSHOT))
+        self.assertEqual([(m["type"], m["sequence"]) for m in received], [("snapshot", 5), ("l2", 6)])
+        self.assertEqual(len(received[0]["asks"]), 5)
+        self.assertEqual(stats["resnapshots"], 1)
+
+        received, stats = asyncio.run(scenario(DISCONNECT))
+        self.assertEqual(received, [])
+        self.assertEqual((stats["disconnects"], stats["clients"]), (1, 0))
+
+if __name__ == "__main__":
+    unittest.main()
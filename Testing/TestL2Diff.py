@@ -0,0 +1,129 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3, doneOrder1, changeOrder2, matchOrder1
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from L2Diff import L2DiffStream, LevelLog
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+
+mp = MessageParser()
+
+def applyUpdates(levels, updates):
+    # replays L2Updates into {side: {price: size}} the way a consumer would
+    for update in updates:
+        if update.reset:
+            levels = {0: {}, 1: {}}
+        for side, price, size in update.deltas:
+            if size == 0:
+                levels[side].pop(price, None)
+            else:
+                levels[side][price] = size
+    return levels
+
+def bookLevels(book, n=None):
+    bids, asks = book.depth(n if n is not None else len(book.orderBook) + 1)
+    return {1: {p: s for p, s, _ in bids}, 0: {p: s for p, s, _ in asks}}
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook()
+        self.messages = [
+            mp({**openOrder1, "sequence": 1}),
+            mp({**openOrder2, "sequence": 2}),
+            mp({**openOrder3, "side": "buy", "price": "199.5", "sequence": 3}),
+            mp({**matchOrder1, "sequence": 4}),
+            mp({**changeOrder2, "sequence": 5}),
+            mp({**doneOrder1, "sequence": 6}),
+        ]
+
+    def testPerMessage(self):
+        stream = L2DiffStream(self.book, coalesce=False)
+        updates = []
+        stream.subscribe(updates.append)
+        for order in self.messages:
+            self.book.processMessage(order)
+        self.assertEqual(updates[0].deltas, [(0, 200.2, 1.0)])
+        self.assertEqual(updates[1].deltas, [(0, 200.2, 2.0)])
+        self.assertEqual(updates[3].deltas, [(0, 200.2, 1.25)])
+        self.assertEqual(updates[3].sequence, 4)
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates), bookLevels(self.book))
+
+    def testCoalesce(self):
+        stream = L2DiffStream(self.book)
+        updates = []
+        stream.subscribe(updates.append)
+        self.book.processBatch(self.messages)
+        self.assertEqual(len(updates), 1)
+        # one delta per level even though 200.2 was touched five times, it ends up removed
+        self.assertEqual(sorted(updates[0].deltas), [(0, 100.2, 0.5), (0, 200.2, 0), (1, 199.5, 1.0)])
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates), bookLevels(self.book))
+
+        # a consumer joining later starts from the snapshot
+        self.book.processMessage(mp({**openOrder2, "order_id": "order5", "price": "201", "sequence": 7}))
+        self.assertEqual(applyUpdates({}, [stream.snapshot()]), bookLevels(self.book))
+
+    def testWindow(self):
+        stream = L2DiffStream(self.book, depth=1)
+        updates = []
+        stream.subscribe(updates.append)
+        self.book.processMessage(mp({**openOrder1, "sequence": 1}))
+        self.book.processMessage(mp({**openOrder2, "order_id": "far", "price": "300", "sequence": 2}))
+        # outside the window, nothing is sent
+        self.assertEqual(len(updates), 1)
+        self.book.processMessage(mp({**doneOrder1, "sequence": 3}))
+        # the best ask leaves and 300 enters the window
+        self.assertEqual(sorted(updates[-1].deltas), [(0, 200.2, 0), (0, 300.0, 1.0)])
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates), bookLevels(self.book, 1))
+
+    def testReset(self):
+        stream = L2DiffStream(self.book)
+        updates = []
+        stream.subscribe(updates.append)
+        self.book.processMessage(mp({**openOrder1, "sequence": 1}))
+        self.book.bulkLoad(10, [(199.0, 2.0, "a")], [(201.0, 1.0, "b")])
+        self.assertTrue(updates[-1].reset)
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates), bookLevels(self.book))
+
+        stream.close()
+        self.assertIsNone(self.book.levelLog)
+        self.book.processMessage(mp({**openOrder1, "sequence": 11}))
+        self.assertEqual(len(updates), 2)
+
+    def testSharedBook(self):
+        full = L2DiffStream(self.book)
+        top = L2DiffStream(self.book, depth=1)
+        perMessage = L2DiffStream(self.book, coalesce=False)
+        self.assertIsInstance(self.book.levelLog, LevelLog)
+        updates = {stream: [] for stream in (full, top, perMessage)}
+        for stream, received in updates.items():
+            stream.subscribe(received.append)
+
+        for order in self.messages[:4]:
+            self.book.processMessage(order)
+        self.book.processBatch(self.messages[4:])
+        # every stream sees every change, each in its own form
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates[full]), bookLevels(self.book))
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates[top]), bookLevels(self.book, 1))
+        self.assertEqual(applyUpdates({0: {}, 1: {}}, updates[perMessage]), bookLevels(self.book))
+        self.assertEqual(updates[perMessage][1].deltas, [(0, 200.2, 2.0)])
+
+        # closing one stream leaves the others attached
+        top.close()
+        self.book.processMessage(mp({**openOrder2, "order_id": "order5", "price": "201", "sequence": 7}))
+        self.assertEqual(updates[full][-1].deltas, [(0, 201.0, 1.0)])
+        self.assertEqual(len(updates[top]), 5)
+        full.close()
+        perMessage.close()
+        self.assertIsNone(self.book.levelLog)
+        self.assertEqual(self.book.listeners, [])
+
+        # a level log that is not a LevelLog is not taken over
+        self.book.levelLog = []
+        with self.assertRaises(ValueError):
+            L2DiffStream(self.book)
+
+if __name__ == "__main__":
+    unittest.main()
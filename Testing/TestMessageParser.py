@@ -1,11 +1,13 @@
 from DummyOrders import openOrder1, doneOrder1, changeOrder1, changeOrder2, matchOrder1
+import json
 import unittest
 #---------------
 # quick hack to import from parent
 import sys
 sys.path.append("../")
 #---------------
-from MessageParser import MessageParser
+from MessageParser import MessageParser, messageType, uuidToInt, idText, parseTime
+from OrderBook import OrderBook
 
 mp = MessageParser()
 
@@ -54,5 +56,46 @@ class TestClass(unittest.TestCase):
         self.assertEqual(matchOrder.side,     0)
         self.assertEqual(matchOrder.sequence, 50)
 
+        # the time is only decoded when the parser feeds a trade tape
+        self.assertIsNone(matchOrder.time)
+        self.assertEqual(MessageParser(matchTimes=True)(matchOrder1).time, parseTime(matchOrder1["time"]))
+
+    def testMessageType(self):
+        self.assertEqual(messageType(json.dumps(openOrder1)), "open")
+        self.assertEqual(messageType('{"type":"received","sequence":1}'), "received")
+        self.assertEqual(messageType('{"sequence":1}'), None)
+
+    def testParseRaw(self):
+        # compact and spaced frames parse the same as the decoded dict
+        for raw in (json.dumps(matchOrder1), json.dumps(matchOrder1, separators=(",", ":"))):
+            matchOrder = mp.parseRaw(raw)
+            self.assertEqual(matchOrder.type,    "match")
+            self.assertEqual(matchOrder.id,      "order1")
+            self.assertEqual(matchOrder.price,    200.2)
+            self.assertEqual(matchOrder.quantity, 0.75)
+            self.assertEqual(matchOrder.sequence, 50)
+
+        # types the book does not consume are dropped
+        self.assertIsNone(mp.parseRaw('{"type":"received","order_id":"order1","sequence":9}'))
+        self.assertIsNone(mp.parseRaw('{"type":"heartbeat","sequence":9}'))
+
+    def testInternIds(self):
+        uuid = "414c343c-1e2f-7ed4-c2ce-78e57311d8a3"
+        self.assertEqual(uuidToInt(uuid), 0x414c343c1e2f7ed4c2ce78e57311d8a3)
+        self.assertEqual(idText(uuidToInt(uuid)), uuid)
+        # ids that are not canonical UUIDs stay strings
+        for iden in ("order1", "414c343c1e2f7ed4c2ce78e57311d8a3", "zzzzzzzz-1e2f-7ed4-c2ce-78e57311d8a3"):
+            self.assertEqual(uuidToInt(iden), iden)
+            self.assertEqual(idText(iden), iden)
+
+        interning = MessageParser(internIds=True)
+        ob = OrderBook()
+        ob.processMessage(interning({**openOrder1, "order_id": uuid}))
+        ob.processMessage(interning.parseRaw(json.dumps({**matchOrder1, "maker_order_id": uuid})))
+        self.assertEqual([idText(iden) for iden in ob.orderBook], [uuid])
+        self.assertEqual(ob.orderBook[uuidToInt(uuid)].quantity, 0.25)
+        ob.processMessage(interning({**doneOrder1, "order_id": uuid, "sequence": 51}))
+        self.assertEqual(ob.orderBook, {})
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+from DummyOrders import openOrder1, openOrder2, doneOrder1, matchOrder1
+import asyncio
+import json
+import random
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from Metrics import LatencyHistogram, Metrics, InstrumentedMessageParser, InstrumentedOrderBook, serveMetrics
+from OrderBook import OrderBook
+
+class TestClass(unittest.TestCase):
+    def testHistogram(self):
+        histogram = LatencyHistogram()
+        values = [random.randrange(10 ** 7) for _ in range(10000)] + [3]
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        self.assertEqual((histogram.count, histogram.min, histogram.max), (len(values), 3, values[-1]))
+        self.assertEqual(histogram.percentile(0), 3)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[round(q * len(values)) - 1]
+            self.assertLessEqual(abs(histogram.percentile(q) - exact), exact / 32 + 1)
+
+        # small values are exact
+        histogram = LatencyHistogram()
+        for value in range(64):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(0.5), 31)
+
+    def testInstrumented(self):
+        metrics = Metrics()
+        mp = InstrumentedMessageParser(metrics=metrics, product="BTC-USD")
+        book = InstrumentedOrderBook(metrics=metrics, product="BTC-USD")
+        book.processMessage(mp({**openOrder1, "sequence": 1}))
+        self.assertIsNone(mp.parseRaw(json.dumps({"type": "received", "sequence": 2})))
+        book.processBatch([
+            mp.parseRaw(json.dumps({**openOrder2, "sequence": 3})),
+            None,
+            mp({**matchOrder1, "sequence": 4}),
+            mp({**doneOrder1, "order_id": "unknown", "sequence": 5}),
+            mp({**doneOrder1, "sequence": 2}),
+        ])
+        self.assertEqual(book.applyLatency["open"].count, 2)
+        self.assertEqual(book.applyLatency["done"].count, 2)
+        self.assertEqual(mp.parseLatency["open"].count, 2)
+        self.assertEqual(mp.ignored.value, 1)
+        self.assertEqual(book.noops["done"].value, 1)
+        self.assertEqual(book.stale.value, 1)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["orderbook_orders"], [({"product": "BTC-USD"}, 2)])
+        self.assertEqual(snapshot["orderbook_apply_latency_ns"][0][1]["count"], 2)
+
+        text = metrics.text()
+        self.assertIn("# TYPE orderbook_apply_latency_ns summary", text)
+        self.assertIn('orderbook_levels{side="sell",product="BTC-USD"} 1', text)
+        self.assertIn('orderbook_noop_total{type="done",product="BTC-USD"} 1', text)
+
+        # the same results as a plain book
+        plain = OrderBook()
+        plain.processMessage(mp({**openOrder1, "sequence": 1}))
+        plain.processMessage(mp({**openOrder2, "sequence": 3}))
+        plain.processMessage(mp({**matchOrder1, "sequence": 4}))
+        self.assertEqual(plain.depth(5), book.depth(5))
+
+    def testManagerAndEndpoint(self):
+        metrics = Metrics()
+        manager = BookManager(["BTC-USD", "ETH-USD"], metrics=metrics)
+        self.assertIsInstance(manager.book("BTC-USD"), InstrumentedOrderBook)
+        manager.onFrame(json.dumps({**openOrder1, "sequence": 1}))
+
+        async def scrape():
+            server = await serveMetrics(metrics, port=0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response.decode()
+
+        response = asyncio.run(scrape())
+        self.assertTrue(response.startswith("HTTP/1.1 200 OK"))
+        self.assertIn('orderbook_orders{product="BTC-USD"} 1', response)
+        self.assertIn('orderbook_orders{product="ETH-USD"} 0', response)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,7 @@ import unittest
 import sys
 sys.path.append("../")
 #---------------
-from OrderBook import OrderBook
+from OrderBook import OrderBook, RestingOrder, MATCH
 from MessageParser import MessageParser
 
 mp = MessageParser()
@@ -66,6 +66,9 @@ class TestClass(unittest.TestCase):
         self.assertEqual(limit.head, None)
         self.assertEqual(limit.tail, None)
 
+        # the empty level is pruned from the side
+        self.assertNotIn(200.2, ob.askLimits)
+
     def testChange(self):
         ob = OrderBook()
         #                  head                  tail
@@ -111,6 +114,198 @@ class TestClass(unittest.TestCase):
         ob.processMessage(mp(matchOrder1))
         self.assertEqual(limit.head.quantity, .25)
 
+    def testRestingNodes(self):
+        ob = OrderBook()
+        message = mp(openOrder1)
+        ob.processMessage(message)
+
+        # the parsed message is not the node that rests in the book
+        node = ob.orderBook["order1"]
+        self.assertIsInstance(node, RestingOrder)
+        self.assertIsNot(node, message)
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertFalse(hasattr(ob.askLimits[200.2], "__dict__"))
+        self.assertEqual((node.id, node.price, node.quantity), ("order1", 200.2, 1.0))
+
+    def testLevelAggregates(self):
+        ob = OrderBook()
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp(openOrder2))
+        ob.processMessage(mp(openOrder3))
+
+        limit = ob.askLimits[200.2]
+        self.assertEqual(limit.order_count, 3)
+        self.assertEqual(limit.total_size, 3.0)
+
+        # partial fill only reduces the size
+        ob.processMessage(mp(matchOrder1))
+        self.assertEqual(limit.order_count, 3)
+        self.assertAlmostEqual(limit.total_size, 2.25)
+
+        # change re-queues order1 with the new size
+        ob.processMessage(mp(changeOrder1))
+        self.assertEqual(limit.order_count, 3)
+        self.assertAlmostEqual(limit.total_size, 2.5)
+
+        # moving order2 to a new price moves its size with it
+        ob.processMessage(mp(changeOrder2))
+        self.assertEqual(limit.order_count, 2)
+        self.assertAlmostEqual(limit.total_size, 1.5)
+        self.assertEqual(ob.askLimits[100.2].total_size, 0.5)
+
+        ob.processMessage(mp({**doneOrder1, "sequence": 24754}))
+        ob.processMessage(mp({**doneOrder3, "sequence": 24755}))
+        self.assertEqual(limit.order_count, 0)
+        self.assertEqual(limit.total_size, 0)
+
+    def testDepth(self):
+        ob = OrderBook()
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp(openOrder2))
+        ob.processMessage(mp({**openOrder3, "side": "buy", "price": "99.5"}))
+        ob.processMessage(mp(changeOrder2))
+
+        bids, asks = ob.depth(5)
+        self.assertEqual(bids, [(99.5, 1.0, 1)])
+        self.assertEqual(asks, [(100.2, 0.5, 1), (200.2, 1.0, 1)])
+
+        bids, asks = ob.depth(1)
+        self.assertEqual(asks, [(100.2, 0.5, 1)])
+
+    def testProcessBatch(self):
+        messages = [mp(openOrder1), mp(openOrder2), mp(openOrder3), mp(matchOrder1), None,
+                    mp(changeOrder1), mp({**doneOrder2, "sequence": 90}), mp(changeOrder2)]
+
+        single = OrderBook()
+        for message in messages:
+            if message is not None:
+                single.processMessage(message)
+
+        batched = OrderBook()
+        notifications = []
+        batched.addListener(notifications.append)
+        batched.processBatch(messages)
+
+        # same book, one notification for the whole batch
+        self.assertEqual(batched.depth(5), single.depth(5))
+        self.assertEqual(batched.currSeqNum, single.currSeqNum)
+        self.assertEqual(batched.updateCount, single.updateCount)
+        self.assertEqual(list(batched.orderBook), list(single.orderBook))
+        self.assertEqual(notifications, [batched])
+
+        # a batch where every message is stale does not notify
+        batched.processBatch([mp(openOrder1)])
+        self.assertEqual(len(notifications), 1)
+
+    def testBestBidAsk(self):
+        ob = OrderBook()
+        self.assertIsNone(ob.best_bid())
+        self.assertIsNone(ob.best_ask())
+        self.assertIsNone(ob.spread())
+        self.assertIsNone(ob.mid())
+
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp({**openOrder2, "price": "201.2"}))
+        ob.processMessage(mp({**openOrder3, "side": "buy", "price": "199.2"}))
+        self.assertEqual(ob.best_ask(), 200.2)
+        self.assertEqual(ob.best_bid(), 199.2)
+        self.assertAlmostEqual(ob.spread(), 1.0)
+        self.assertAlmostEqual(ob.mid(), 199.7)
+
+        # removing the touch moves the best ask to the next level
+        ob.processMessage(mp(doneOrder1))
+        self.assertEqual(ob.best_ask(), 201.2)
+        self.assertEqual(len(ob.askLimits), 1)
+
+    def testRestingLimit(self):
+        ob = OrderBook()
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp(openOrder2))
+        ob.processMessage(mp({**openOrder3, "price": "201.2"}))
+
+        # every node points at the Limit of the level it rests at
+        limit = ob.askLimits[200.2]
+        self.assertIs(ob.orderBook["order1"].limit, limit)
+        self.assertIs(ob.orderBook["order2"].limit, limit)
+        self.assertIs(ob.orderBook["order3"].limit, ob.askLimits[201.2])
+
+    def testUnlinkOrder(self):
+        def build():
+            ob = OrderBook()
+            ob.processMessage(mp(openOrder1))
+            ob.processMessage(mp(openOrder2))
+            ob.processMessage(mp(openOrder3))
+            return ob, ob.askLimits[200.2]
+
+        def queue(limit):
+            ids, node = [], limit.head
+            while node is not None:
+                if node.next is not None:
+                    self.assertIs(node.next.prev, node)
+                ids.append(node.id)
+                node = node.next
+            return ids
+
+        # head: the next node becomes the head
+        ob, limit = build()
+        node = ob.orderBook["order1"]
+        ob.unlinkOrder(node, ob.askLimits)
+        self.assertEqual(queue(limit), ["order2", "order3"])
+        self.assertIsNone(limit.head.prev)
+        self.assertEqual(limit.tail.id, "order3")
+        self.assertIsNone(node.prev)
+        self.assertIsNone(node.next)
+
+        # middle: the neighbours are linked to each other
+        ob, limit = build()
+        node = ob.orderBook["order2"]
+        ob.unlinkOrder(node, ob.askLimits)
+        self.assertEqual(queue(limit), ["order1", "order3"])
+        self.assertIs(limit.head.next, limit.tail)
+        self.assertIs(limit.tail.prev, limit.head)
+        self.assertIsNone(node.prev)
+        self.assertIsNone(node.next)
+
+        # tail: the previous node becomes the tail
+        ob, limit = build()
+        node = ob.orderBook["order3"]
+        ob.unlinkOrder(node, ob.askLimits)
+        self.assertEqual(queue(limit), ["order1", "order2"])
+        self.assertEqual(limit.tail.id, "order2")
+        self.assertIsNone(limit.tail.next)
+        self.assertEqual((limit.order_count, limit.total_size), (2, 2.0))
+        self.assertNotIn("order3", ob.orderBook)
+
+        # the last node prunes the level
+        ob.unlinkOrder(ob.orderBook["order1"], ob.askLimits)
+        ob.unlinkOrder(ob.orderBook["order2"], ob.askLimits)
+        self.assertNotIn(200.2, ob.askLimits)
+        self.assertEqual(ob.orderBook, {})
+
+    def testReplacedHandler(self):
+        ob = OrderBook()
+        seen = []
+        bookHandler = ob.handlers[MATCH]
+
+        def onMatch(order, side):
+            seen.append((order.id, side is ob.askLimits))
+            bookHandler(order, side)
+        ob.handlers[MATCH] = onMatch
+
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp(matchOrder1))
+        self.assertEqual(seen, [("order1", True)])
+        self.assertEqual(ob.askLimits[200.2].head.quantity, .25)
+
+        # batches dispatch through the same table, unknown types are ignored
+        ob.processBatch([mp({**matchOrder1, "size": "0.05", "sequence": 51})])
+        self.assertEqual(len(seen), 2)
+        self.assertAlmostEqual(ob.askLimits[200.2].head.quantity, .2)
+        del ob.handlers[MATCH]
+        ob.processMessage(mp({**matchOrder1, "sequence": 52}))
+        self.assertEqual(len(seen), 2)
+        self.assertAlmostEqual(ob.askLimits[200.2].head.quantity, .2)
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,204 @@
+from DummyOrders import openOrder1, openOrder2
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from Bootstrap import FileSnapshotSource
+from BookManager import BookManager
+from Pipeline import FeedPipeline, BLOCK, DROP_NEWEST, DROP_OLDEST
+
+async def fill(pipeline, frames):
+    # queue every frame before the processor has had a chance to run
+    for raw in frames:
+        await pipeline.put(raw)
+
+class Fatal(BaseException):
+    # stops the processor, unlike an Exception the pipeline does not catch it
+    pass
+
+class TestClass(unittest.TestCase):
+    def testBatches(self):
+        batches = []
+
+        async def scenario():
+            pipeline = FeedPipeline(batches.append, maxsize=100, batchSize=3)
+            await fill(pipeline, [str(i) for i in range(7)])
+            pipeline.start()
+            await pipeline.stop()
+            return pipeline.metrics()
+
+        metrics = asyncio.run(scenario())
+        self.assertEqual(batches, [["0", "1", "2"], ["3", "4", "5"], ["6"]])
+        self.assertEqual((metrics["received"], metrics["processed"], metrics["batches"]), (7, 7, 3))
+        self.assertEqual((metrics["depth"], metrics["maxDepth"], metrics["dropped"]), (0, 7, 0))
+        self.assertGreaterEqual(metrics["maxLag"], metrics["lastLag"])
+
+    def testDropPolicies(self):
+        for policy, expected in ((DROP_NEWEST, ["0", "1", "2"]), (DROP_OLDEST, ["3", "4", "5"])):
+            batches = []
+
+            async def scenario():
+                pipeline = FeedPipeline(batches.extend, maxsize=3, policy=policy)
+                await fill(pipeline, [str(i) for i in range(6)])
+                pipeline.start()
+                await pipeline.stop()
+                return pipeline.metrics()
+
+            metrics = asyncio.run(scenario())
+            self.assertEqual(batches, expected)
+            self.assertEqual(metrics["dropped"], 3)
+
+    def testBlock(self):
+        processed = []
+
+        async def scenario():
+            pipeline = FeedPipeline(processed.extend, maxsize=2, policy=BLOCK, batchSize=1)
+            pipeline.start()
+            # the receiver waits for room instead of dropping
+            await fill(pipeline, [str(i) for i in range(10)])
+            await pipeline.stop()
+            return pipeline.metrics()
+
+        metrics = asyncio.run(scenario())
+        self.assertEqual(processed, [str(i) for i in range(10)])
+        self.assertEqual(metrics["dropped"], 0)
+        self.assertLessEqual(metrics["maxDepth"], 2)
+
+    def testThreaded(self):
+        processed = []
+
+        async def scenario():
+            pipeline = FeedPipeline(processed.extend, maxsize=4, batchSize=2, threaded=True)
+            pipeline.start()
+            await fill(pipeline, [str(i) for i in range(50)])
+            await pipeline.stop()
+            return pipeline.metrics()
+
+        metrics = asyncio.run(scenario())
+        self.assertEqual(processed, [str(i) for i in range(50)])
+        self.assertEqual((metrics["received"], metrics["processed"], metrics["dropped"]), (50, 50, 0))
+
+    def testHandlerErrors(self):
+        processed = []
+
+        def handler(batch):
+            if "bad" in batch:
+                raise ValueError("bad frame")
+            processed.extend(batch)
+
+        for threaded in (False, True):
+            processed.clear()
+
+            async def scenario():
+                pipeline = FeedPipeline(handler, maxsize=2, batchSize=1, threaded=threaded)
+                pipeline.start()
+                await fill(pipeline, ["0", "bad", "1", "bad", "2"])
+                await pipeline.stop()
+                return pipeline.metrics()
+
+            with self.assertLogs("Pipeline", "ERROR"):
+                metrics = asyncio.run(scenario())
+            self.assertEqual(processed, ["0", "1", "2"])
+            self.assertEqual((metrics["processed"], metrics["errors"]), (5, 2))
+
+    def testPoisonedFrame(self):
+        manager = BookManager(["BTC-USD", "ETH-USD"])
+
+        def handler(batch):
+            for raw in batch:
+                manager.onFrame(raw)
+
+        eth = {**openOrder2, "product_id": "ETH-USD"}
+        frames = [
+            json.dumps({**openOrder1, "sequence": 1}),
+            json.dumps({**eth, "sequence": 1}),
+            json.dumps({**openOrder2, "price": "not a price", "sequence": 2}),
+            json.dumps({**eth, "order_id": "eth2", "sequence": 2}),
+            json.dumps({**openOrder2, "order_id": "btc3", "sequence": 3}),
+        ]
+
+        async def scenario():
+            pipeline = FeedPipeline(handler, batchSize=512)
+            pipeline.start()
+            await fill(pipeline, frames)
+            await pipeline.stop()
+            return pipeline.metrics()
+
+        with self.assertLogs("BookManager", "ERROR"):
+            metrics = asyncio.run(scenario())
+        self.assertEqual((metrics["batches"], metrics["errors"]), (1, 0))
+
+        # the frames after the bad one were processed, the other product is untouched
+        stats = manager.stats()
+        self.assertEqual(set(manager.book("ETH-USD").orderBook), {"order2", "eth2"})
+        self.assertEqual((stats["ETH-USD"]["errors"], stats["ETH-USD"]["gaps"]), (0, 0))
+        # the bad frame is a gap in its own product's sequence, the next frame waits behind it
+        self.assertEqual(stats["BTC-USD"]["errors"], 1)
+        self.assertEqual((stats["BTC-USD"]["gaps"], stats["BTC-USD"]["pending"]), (1, 1))
+        self.assertEqual(set(manager.book("BTC-USD").orderBook), {"order1"})
+
+    def testProcessorStopped(self):
+        def handler(batch):
+            raise Fatal()
+
+        hook = threading.excepthook
+        threading.excepthook = lambda args: None
+        try:
+            for threaded in (False, True):
+                async def scenario():
+                    pipeline = FeedPipeline(handler, maxsize=2, batchSize=1, threaded=threaded)
+                    pipeline.start()
+                    # the receiver fails instead of blocking on a queue nobody drains
+                    with self.assertRaises(RuntimeError):
+                        await fill(pipeline, [str(i) for i in range(10)])
+                    if threaded:
+                        self.assertIsInstance(pipeline.failure, Fatal)
+
+                asyncio.run(asyncio.wait_for(scenario(), 5))
+        finally:
+            threading.excepthook = hook
+
+    def testThreadedResync(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "{}.json")
+            with open(path.format("BTC-USD"), "w") as snapshotFile:
+                json.dump({"sequence": 1, "bids": [], "asks": [["200.2", "1.00", "order1"]]}, snapshotFile)
+
+            async def scenario():
+                manager = BookManager(["BTC-USD"], source=FileSnapshotSource(path))
+                pipeline = FeedPipeline(lambda batch: [manager.onFrame(raw) for raw in batch], batchSize=8, threaded=True)
+                manager.start()
+                pipeline.start()
+                await asyncio.sleep(0.01)
+                # a gap the reorder window can not fill resyncs from the processing thread
+                frames = [2, 3] + list(range(10, 80))
+                for sequence in frames:
+                    await pipeline.put(json.dumps({**openOrder2, "order_id": f"o{sequence}", "sequence": sequence}))
+                while manager.products["BTC-USD"].sequencer.resyncs == 0:
+                    await asyncio.sleep(0.001)
+                await asyncio.sleep(0.01)
+                await pipeline.put(json.dumps({**openOrder1, "order_id": "last", "sequence": 80}))
+                await pipeline.stop()
+                return manager, pipeline
+
+            manager, pipeline = asyncio.run(asyncio.wait_for(scenario(), 5))
+        product = manager.products["BTC-USD"]
+        self.assertEqual(pipeline.metrics()["errors"], 0)
+        self.assertEqual(product.sequencer.resyncs, 1)
+        self.assertTrue(product.bootstrapper.ready)
+        self.assertEqual(product.bootstrapper.failures, 0)
+        # the book was reloaded from the snapshot and the 70 held frames plus the last replayed
+        book = manager.book("BTC-USD")
+        self.assertEqual(book.orderCount(), 72)
+        self.assertNotIn("o2", book.orderBook)
+        self.assertIn("last", book.orderBook)
+
+if __name__ == "__main__":
+    unittest.main()
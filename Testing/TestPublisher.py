@@ -0,0 +1,75 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3, matchOrder1
+import asyncio
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from OrderBook import OrderBook
+from MessageParser import MessageParser
+from Publisher import BookPublisher
+
+mp = MessageParser()
+
+class TestClass(unittest.TestCase):
+    def testEveryN(self):
+        ob = OrderBook()
+        publisher = BookPublisher(ob, depth=5, interval=None, everyN=2)
+        snapshots = []
+        publisher.subscribe(snapshots.append)
+
+        # nothing is published from inside processMessage
+        ob.processMessage(mp(openOrder1))
+        ob.processMessage(mp(openOrder2))
+        self.assertEqual(snapshots, [])
+
+        # a poll after two updates publishes once
+        self.assertTrue(publisher.poll())
+        self.assertFalse(publisher.poll())
+        self.assertEqual(len(snapshots), 1)
+        self.assertEqual(snapshots[0].asks, [(200.2, 2.0, 2)])
+
+        ob.processMessage(mp(openOrder3))
+        self.assertFalse(publisher.poll())
+        ob.processMessage(mp(matchOrder1))
+        self.assertTrue(publisher.poll())
+        self.assertEqual(snapshots[1].sequence, 50)
+        self.assertEqual(snapshots[1].asks, [(200.2, 2.25, 3)])
+
+    def testInterval(self):
+        ob = OrderBook()
+        publisher = BookPublisher(ob, depth=5, interval=60.0)
+        snapshots = []
+        publisher.subscribe(snapshots.append)
+
+        # interval has not elapsed yet
+        ob.processMessage(mp(openOrder1))
+        self.assertFalse(publisher.poll())
+
+        # once it has elapsed a changed book is published, an unchanged one is not
+        publisher.lastTime -= 60.0
+        self.assertTrue(publisher.poll())
+        publisher.lastTime -= 60.0
+        self.assertFalse(publisher.poll())
+        self.assertEqual(len(snapshots), 1)
+
+    def testQueueSink(self):
+        async def scenario():
+            ob = OrderBook()
+            publisher = BookPublisher(ob, depth=1, interval=None, everyN=1)
+            snapshotQueue = publisher.queue(maxsize=1)
+            task = asyncio.create_task(publisher.run())
+            await asyncio.sleep(0)
+
+            ob.processMessage(mp(openOrder1))
+            ob.processMessage(mp(openOrder2))
+            snapshot = await asyncio.wait_for(snapshotQueue.get(), 1)
+            task.cancel()
+            return snapshot
+
+        snapshot = asyncio.run(scenario())
+        self.assertEqual(snapshot.asks, [(200.2, 2.0, 2)])
+
+if __name__ == "__main__":
+    unittest.main()
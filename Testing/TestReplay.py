@@ -0,0 +1,102 @@
+from DummyOrders import openOrder1, openOrder2, matchOrder1
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from Replay import FeedRecorder, FeedReplayer, readCapture
+
+frames = [
+    json.dumps({**openOrder1, "sequence": 1}),
+    '{"type":"received","product_id":"BTC-USD","sequence":2}',
+    json.dumps({**openOrder2, "sequence": 3}),
+    json.dumps({**matchOrder1, "sequence": 4}),
+]
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRoundTrip(self):
+        for name in ("capture.bin", "capture.bin.gz"):
+            path = os.path.join(self.directory.name, name)
+
+            # two recorder sessions append to the same capture
+            with FeedRecorder(path) as recorder:
+                for index, raw in enumerate(frames[:2]):
+                    recorder.record(raw, 1000 + index)
+            with FeedRecorder(path) as recorder:
+                for index, raw in enumerate(frames[2:]):
+                    recorder.record(raw, 2000 + index)
+                self.assertEqual(recorder.count, 2)
+
+            self.assertEqual(list(readCapture(path)), list(zip([1000, 1001, 2000, 2001], frames)))
+
+    def testOffset(self):
+        path = os.path.join(self.directory.name, "capture.bin")
+        with FeedRecorder(path) as recorder:
+            recorder.record(frames[0], 1000)
+            first = recorder.offset()
+        # a later session carries on from the end of the file
+        with FeedRecorder(path) as recorder:
+            self.assertEqual(recorder.offset(), first)
+            for index, raw in enumerate(frames[1:]):
+                recorder.record(raw, 2000 + index)
+            self.assertEqual(recorder.offset(), os.path.getsize(path))
+        self.assertEqual(list(readCapture(path, first)), list(zip([2000, 2001, 2002], frames[1:])))
+
+        with FeedRecorder(os.path.join(self.directory.name, "capture.bin.gz")) as recorder:
+            self.assertIsNone(recorder.offset())
+
+    def testNewlineDelimited(self):
+        path = os.path.join(self.directory.name, "corpus.jsonl")
+        with open(path, "w") as corpus:
+            corpus.write("\n".join(frames) + "\n\n")
+        self.assertEqual(list(readCapture(path)), [(None, raw) for raw in frames])
+
+    def testTornRecord(self):
+        for name in ("capture.bin", "capture.bin.gz"):
+            path = os.path.join(self.directory.name, name)
+            with FeedRecorder(path) as recorder:
+                for index, raw in enumerate(frames):
+                    recorder.record(raw, 1000 + index)
+
+            # a crash mid write leaves part of the last record behind
+            with open(path, "r+b") as capture:
+                capture.truncate(os.path.getsize(path) - 10)
+            read = list(readCapture(path))
+            if name.endswith(".gz"):
+                # the truncated gzip stream ends wherever its last complete block does
+                self.assertLessEqual(len(read), 3)
+            else:
+                self.assertEqual(len(read), 3)
+            self.assertEqual(read, list(zip([1000, 1001, 1002], frames))[:len(read)])
+
+    def testReplay(self):
+        path = os.path.join(self.directory.name, "capture.bin.gz")
+        with FeedRecorder(path) as recorder:
+            for raw in frames:
+                recorder.record(raw)
+
+        manager = BookManager(["BTC-USD"])
+        replayer = FeedReplayer(manager.onFrame)
+        replayer.replay(path)
+        self.assertEqual(replayer.count, 4)
+        self.assertEqual(manager.book("BTC-USD").depth(5), ([], [(200.2, 1.25, 2)]))
+
+        manager = BookManager(["BTC-USD"])
+        replayer = FeedReplayer(manager.onFrame)
+        asyncio.run(replayer.replayRealtime(path, speed=1000.0))
+        self.assertEqual(manager.book("BTC-USD").depth(5), ([], [(200.2, 1.25, 2)]))
+
+if __name__ == "__main__":
+    unittest.main()
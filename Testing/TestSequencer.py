@@ -0,0 +1,81 @@
+from DummyOrders import openOrder1, matchOrder1
+import json
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from Sequencer import Sequencer
+from MessageParser import messageSequence
+
+class TestClass(unittest.TestCase):
+    def testMessageSequence(self):
+        self.assertEqual(messageSequence(json.dumps(openOrder1)), 10)
+        self.assertEqual(messageSequence(json.dumps(matchOrder1, separators=(",", ":"))), 50)
+        self.assertEqual(messageSequence('{"type":"heartbeat","sequence":7}'), 7)
+        self.assertEqual(messageSequence('{"type":"subscriptions"}'), None)
+
+    def testInOrderAndDuplicates(self):
+        delivered = []
+        sequencer = Sequencer(delivered.append)
+        sequencer.push(5, "a")
+        sequencer.push(6, None)
+        sequencer.push(7, "b")
+        sequencer.push(7, "b")
+        sequencer.push(3, "old")
+        sequencer.push(None, "unsequenced")
+
+        self.assertEqual(delivered, ["a", "b"])
+        self.assertEqual(sequencer.expected, 8)
+        self.assertEqual(sequencer.duplicates, 2)
+        self.assertEqual(sequencer.gaps, 0)
+
+    def testReorder(self):
+        delivered = []
+        sequencer = Sequencer(delivered.append, reorderWindow=4)
+        sequencer.push(1, "a")
+        sequencer.push(3, "c")
+        sequencer.push(4, "d")
+        self.assertEqual(delivered, ["a"])
+
+        # the late frame fills the gap and unblocks the held frames
+        sequencer.push(2, "b")
+        self.assertEqual(delivered, ["a", "b", "c", "d"])
+        self.assertEqual(sequencer.stats()["pending"], 0)
+        self.assertEqual((sequencer.gaps, sequencer.reorders, sequencer.resyncs), (1, 1, 0))
+
+    def testResync(self):
+        delivered = []
+        resyncs = []
+        sequencer = Sequencer(delivered.append, resync=lambda: resyncs.append(len(delivered)), reorderWindow=3)
+        sequencer.push(1, "a")
+        sequencer.push(3, "c")
+        sequencer.push(4, None)
+        self.assertEqual(resyncs, [])
+
+        # the window is full, resync and hand the held frames on
+        sequencer.push(5, "e")
+        self.assertEqual(resyncs, [1])
+        self.assertEqual(delivered, ["a", "c", "e"])
+        self.assertEqual(sequencer.expected, 6)
+        self.assertEqual(sequencer.resyncs, 1)
+
+        # the frame that was missing is now stale
+        sequencer.push(2, "b")
+        self.assertEqual(sequencer.duplicates, 1)
+
+    def testMaxDelay(self):
+        delivered = []
+        sequencer = Sequencer(delivered.append, reorderWindow=100, maxDelay=0.5)
+        sequencer.push(1, "a")
+        sequencer.push(3, "c")
+        sequencer.gapSince -= 1.0
+
+        # without a resync callback the gap is skipped once it is too old
+        sequencer.push(4, "d")
+        self.assertEqual(delivered, ["a", "c", "d"])
+        self.assertEqual((sequencer.gaps, sequencer.resyncs), (1, 0))
+
+if __name__ == "__main__":
+    unittest.main()
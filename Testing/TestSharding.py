@@ -0,0 +1,111 @@
+from DummyOrders import openOrder1, openOrder2, matchOrder1
+import asyncio
+import json
+import pickle
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from BookManager import BookManager
+from Metrics import Metrics
+from Sharding import ShardedBookManager, shardOf
+from TickLadder import TickLadder, ladderEngine
+
+products = ["BTC-USD", "ETH-USD", "SOL-USD", "LTC-USD"]
+
+def frames():
+    # two orders and a partial fill per product, each product with its own sequence
+    for index, product in enumerate(products):
+        price = f"{100 + index}.5"
+        yield json.dumps({**openOrder1, "product_id": product, "price": price, "sequence": 1})
+        yield json.dumps({**openOrder2, "product_id": product, "price": price, "sequence": 2})
+        yield json.dumps({**matchOrder1, "product_id": product, "price": price, "sequence": 3})
+    yield json.dumps({**openOrder1, "product_id": "DOGE-USD", "sequence": 1})
+
+class TestClass(unittest.TestCase):
+    def testShardOf(self):
+        self.assertEqual(shardOf("BTC-USD", 4), shardOf("BTC-USD", 4))
+        self.assertTrue(all(0 <= shardOf(product, 3) < 3 for product in products))
+
+    def testMatchesSingleProcess(self):
+        single = BookManager(products)
+        for raw in frames():
+            single.onFrame(raw)
+
+        with ShardedBookManager(products, shards=2, batchSize=2) as sharded:
+            self.assertEqual(sharded.shards, 2)
+            for raw in frames():
+                sharded.onFrame(raw)
+
+            for product in products:
+                snapshot = sharded.top(product, depth=5)
+                self.assertEqual(snapshot, single.book(product).snapshot(5))
+                self.assertEqual(snapshot.sequence, 3)
+
+            stats = sharded.stats()
+            self.assertEqual(sorted(stats), sorted(products))
+            self.assertEqual(stats["ETH-USD"]["frames"], 3)
+
+    def testTopAsync(self):
+        single = BookManager(products)
+        for raw in frames():
+            single.onFrame(raw)
+
+        async def scenario(sharded):
+            for raw in frames():
+                sharded.onFrame(raw)
+            queries = [asyncio.ensure_future(sharded.topAsync(product, 5)) for product in products]
+            await asyncio.sleep(0)
+            # a blocking query sent behind the async ones still gets its own answer
+            stats = sharded.stats()
+            return stats, await asyncio.gather(*queries), await sharded.topAsync("BTC-USD", 5)
+
+        with ShardedBookManager(products, shards=2, batchSize=100) as sharded:
+            stats, snapshots, again = asyncio.run(scenario(sharded))
+            self.assertEqual([len(waiting) for waiting in sharded.waiting], [0, 0])
+        self.assertEqual(set(stats), set(products))
+        self.assertEqual(snapshots, [single.book(product).snapshot(5) for product in products])
+        self.assertEqual(again, single.book("BTC-USD").snapshot(5))
+
+    def testOptionsReachWorkers(self):
+        # engines are handed to the worker processes so they have to pickle
+        engine = pickle.loads(pickle.dumps(ladderEngine(0.5)))
+        self.assertIsInstance(engine(True), TickLadder)
+
+        options = {"engines": {"BTC-USD": ladderEngine(0.5)}, "trades": True, "internIds": True}
+        single = BookManager(products, **options)
+        for raw in frames():
+            single.onFrame(raw)
+
+        metrics = Metrics()
+        with ShardedBookManager(products, shards=2, batchSize=2, metrics=metrics, **options) as sharded:
+            sharded.start()
+            for raw in frames():
+                sharded.onFrame(raw)
+            for product in products:
+                self.assertEqual(sharded.top(product, depth=5), single.book(product).snapshot(5))
+            stats = sharded.stats()
+            text = metrics.text()
+
+        self.assertEqual(stats["SOL-USD"]["trades"], 1)
+        # every worker's series under one family per metric
+        self.assertEqual(text.count("# TYPE orderbook_orders gauge"), 1)
+        for product in products:
+            self.assertIn(f'orderbook_orders{{product="{product}"}} 2', text)
+
+        with self.assertRaises(ValueError):
+            ShardedBookManager(products, metrics=Metrics(), windows={"BTC-USD": 5})
+
+    def testWindows(self):
+        single = BookManager(products, windows={"ETH-USD": 1})
+        for raw in frames():
+            single.onFrame(raw)
+        with ShardedBookManager(products, shards=2, windows={"ETH-USD": 1}) as sharded:
+            for raw in frames():
+                sharded.onFrame(raw)
+            self.assertEqual(sharded.top("ETH-USD", depth=5), single.book("ETH-USD").snapshot(5))
+
+if __name__ == "__main__":
+    unittest.main()
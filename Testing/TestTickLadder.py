@@ -0,0 +1,95 @@
+from DummyOrders import openOrder1, openOrder2, openOrder3, doneOrder1, changeOrder2, matchOrder1
+import random
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from sortedcontainers import SortedDict
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser
+from OrderBook import OrderBook
+from TickLadder import TickLadder, ladderEngine
+
+spec = ProductSpec("BTC-USD", "0.01", "0.00000001")
+
+class TestClass(unittest.TestCase):
+    def assertSameSide(self, ladder, reference):
+        self.assertEqual(list(ladder.items()), list(reference.items()))
+        self.assertEqual(list(reversed(ladder.values())), list(reversed(reference.values())))
+        self.assertEqual(len(ladder), len(reference))
+        if reference:
+            self.assertEqual(ladder.peekitem(0), reference.peekitem(0))
+            self.assertEqual(ladder.peekitem(-1), reference.peekitem(-1))
+            self.assertEqual(ladder.values()[:3], reference.values()[:3])
+            self.assertEqual(ladder.values()[-3:], reference.values()[-3:])
+
+    def testMatchesSortedDict(self):
+        # random inserts and deletes around a drifting touch, far levels included
+        rng = random.Random(7)
+        for buy in (False, True):
+            ladder = TickLadder(1, width=64, buy=buy)
+            reference = SortedDict()
+            touch = 10000
+            for step in range(5000):
+                touch += rng.choice((-1, 0, 1))
+                price = touch + (-1 if buy else 1) * rng.choice((rng.randrange(40), rng.randrange(500)))
+                if price in reference and rng.random() < 0.6:
+                    del ladder[price]
+                    del reference[price]
+                else:
+                    ladder[price] = reference[price] = step
+                if step % 250 == 0:
+                    self.assertSameSide(ladder, reference)
+            self.assertSameSide(ladder, reference)
+            self.assertGreater(ladder.recentres, 1)
+            while reference:
+                price = reference.peekitem(-1 if buy else 0)[0]
+                del ladder[price]
+                del reference[price]
+                self.assertSameSide(ladder, reference)
+            self.assertEqual(ladder.count, 0)
+
+    def testFloatPrices(self):
+        ladder = TickLadder(0.01, width=16)
+        for price in (200.2, 100.2, 100.21, 300.05):
+            ladder[price] = price
+        self.assertEqual(list(ladder), [100.2, 100.21, 200.2, 300.05])
+        self.assertEqual(ladder.get(200.2), 200.2)
+        del ladder[100.2]
+        self.assertEqual(ladder.peekitem(0), (100.21, 100.21))
+        with self.assertRaises(ValueError):
+            ladder[100.2104] = 0
+
+    def testUpdateAndClear(self):
+        ladder = TickLadder(1, width=8, buy=True)
+        ladder.update({price: str(price) for price in (5, 50, 7, 49, 6)})
+        self.assertEqual(list(ladder), [5, 6, 7, 49, 50])
+        self.assertEqual(ladder.peekitem(-1), (50, "50"))
+        ladder.clear()
+        self.assertEqual(len(ladder), 0)
+        self.assertEqual(list(ladder.values()), [])
+        ladder[3] = "3"
+        self.assertEqual(ladder.peekitem(), (3, "3"))
+
+    def testBookEngines(self):
+        # the same messages give the same book on both engines
+        for bookSpec, engine in ((None, ladderEngine(0.01, width=16)), (spec, ladderEngine(spec=spec, width=16))):
+            mp = MessageParser(bookSpec)
+            books = [OrderBook(bookSpec), OrderBook(bookSpec, engine)]
+            self.assertIsInstance(books[1].askLimits, TickLadder)
+            for message in (openOrder1, openOrder2, openOrder3, {**openOrder3, "order_id": "order4", "side": "buy", "price": "99.5"},
+                            matchOrder1, changeOrder2, doneOrder1):
+                for book in books:
+                    book.processMessage(mp(message))
+                self.assertEqual(books[1].depth(5), books[0].depth(5))
+                self.assertEqual(books[1].best_bid(), books[0].best_bid())
+                self.assertEqual(books[1].best_ask(), books[0].best_ask())
+
+    def testLadderEngineNeedsTick(self):
+        with self.assertRaises(ValueError):
+            ladderEngine()
+
+if __name__ == "__main__":
+    unittest.main()
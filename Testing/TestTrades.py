@@ -0,0 +1,71 @@
+from DummyOrders import openOrder1, matchOrder1
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from FixedPoint import ProductSpec
+from MessageParser import MessageParser, parseTime
+from OrderBook import OrderBook, MATCH
+from Trades import TradeTape, Bar
+
+class TestClass(unittest.TestCase):
+    def testRollingWindows(self):
+        tape = TradeTape(capacity=100, windows=(10.0,), intervals=())
+        for second in range(30):
+            tape.record(100.0 + second, 1.0, second % 2, float(second), second)
+        # trades at 19 < t <= 29 are in the window
+        stats = tape.window(10.0)
+        self.assertEqual(stats.count, 10)
+        self.assertEqual(stats.volume, 10.0)
+        self.assertAlmostEqual(stats.vwap, sum(range(120, 130)) / 10)
+        self.assertEqual(tape.tradeCount(10.0, now=35.0), 4)
+        self.assertIsNone(tape.vwap(10.0, now=100.0))
+
+    def testRingOverwrite(self):
+        tape = TradeTape(capacity=4, windows=(1000.0,), intervals=())
+        for index in range(10):
+            tape.record(float(index), 2.0, 1, float(index), index)
+        self.assertEqual(len(tape), 4)
+        self.assertEqual([trade.sequence for trade in tape.recent(10)], [6, 7, 8, 9])
+        self.assertEqual(tape.last().price, 9.0)
+        self.assertEqual(tape.tradeCount(1000.0), 4)
+        self.assertEqual(tape.volume(1000.0), 8.0)
+        self.assertEqual([trade.sequence for trade in tape.since(7.0)], [8, 9])
+        with self.assertRaises(IndexError):
+            tape.trade(5)
+
+    def testBars(self):
+        tape = TradeTape(windows=(), intervals=(60.0,))
+        trades = [(0.0, 10.0, 1.0), (30.0, 12.0, 1.0), (59.0, 9.0, 2.0), (61.0, 11.0, 1.0), (200.0, 13.0, 3.0)]
+        for timestamp, price, size in trades:
+            tape.record(price, size, 0, timestamp)
+        bars = tape.ohlcv(60.0)
+        self.assertEqual(bars[0], Bar(0.0, 10.0, 12.0, 9.0, 9.0, 4.0, 3, 10.0))
+        self.assertEqual(bars[1], Bar(60.0, 11.0, 11.0, 11.0, 11.0, 1.0, 1, 11.0))
+        self.assertEqual(bars[2].start, 180.0)
+        self.assertEqual(len(tape.ohlcv(60.0, current=False)), 2)
+        self.assertEqual(tape.ohlcv(60.0, n=1), bars[-1:])
+
+    def testAttachToBook(self):
+        for spec in (None, ProductSpec("BTC-USD", "0.01", "0.00000001")):
+            mp = MessageParser(spec, matchTimes=True)
+            book = OrderBook(spec)
+            tape = TradeTape(spec=spec)
+            tape.attach(book)
+            book.processMessage(mp(openOrder1))
+            book.processMessage(mp(matchOrder1))
+            trade = tape.last()
+            self.assertEqual(trade.price, mp.toPrice(matchOrder1["price"]))
+            self.assertEqual(trade.size, mp.toSize(matchOrder1["size"]))
+            self.assertEqual(trade.time, parseTime(matchOrder1["time"]))
+            # the book still applied the match
+            self.assertEqual(book.askLimits[mp.toPrice("200.2")].total_size, mp.toSize("1.00") - mp.toSize(matchOrder1["size"]))
+            tape.detach()
+            book.processMessage(mp({**matchOrder1, "sequence": matchOrder1["sequence"] + 1}))
+            self.assertEqual(len(tape), 1)
+            self.assertNotIn("onMatch", book.handlers[MATCH].__name__)
+
+if __name__ == "__main__":
+    unittest.main()
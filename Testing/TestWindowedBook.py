@@ -0,0 +1,135 @@
+import os
+import random
+import tempfile
+import unittest
+#---------------
+# quick hack to import from parent
+import sys
+sys.path.append("../")
+#---------------
+from Checkpoint import Checkpointer
+from L2Diff import L2DiffStream
+from OrderBook import OrderBook, Order, OPEN, DONE, CHANGE, MATCH
+from WindowedBook import WindowedOrderBook
+
+def randomOrders(count, seed=3):
+    # opens, cancels, fills and changes around a drifting mid, integer prices and sizes
+    rng = random.Random(seed)
+    resting = {}
+    mid = 10000
+    orders = []
+    for sequence in range(1, count + 1):
+        roll = rng.random()
+        if roll < 0.5 or len(resting) < 20:
+            side = rng.randrange(2)
+            price = mid - rng.randrange(1, 60) if side else mid + rng.randrange(1, 60)
+            iden = f"o{sequence}"
+            resting[iden] = [side, price, rng.randrange(1, 10)]
+            orders.append(Order(OPEN, iden, price, resting[iden][2], side, sequence))
+        else:
+            iden = rng.choice(list(resting))
+            side, price, size = resting[iden]
+            if roll < 0.75:
+                del resting[iden]
+                orders.append(Order(DONE, iden, price, 0, side, sequence))
+            elif roll < 0.9:
+                fill = rng.randrange(1, size + 1)
+                resting[iden][2] -= fill
+                if resting[iden][2] == 0:
+                    del resting[iden]
+                orders.append(Order(MATCH, iden, price, fill, side, sequence))
+                mid += 1 if side == 0 else -1
+            else:
+                newPrice = price + rng.choice((-5, 0, 5))
+                resting[iden] = [side, newPrice, max(1, size // 2)]
+                orders.append(Order(CHANGE, iden, newPrice, max(1, size // 2), side, sequence))
+    return orders
+
+class TestClass(unittest.TestCase):
+    def testMatchesFullBook(self):
+        full = OrderBook()
+        windowed = WindowedOrderBook(window=5, slack=2)
+        for index, order in enumerate(randomOrders(20000)):
+            full.processMessage(order)
+            windowed.processMessage(order)
+            if index % 100 == 0:
+                self.assertEqual(windowed.depth(5), full.depth(5))
+        self.assertEqual(windowed.depth(200), full.depth(200))
+        self.assertEqual(windowed.best_bid(), full.best_bid())
+        self.assertEqual(windowed.best_ask(), full.best_ask())
+        self.assertEqual(windowed.orderCount(), len(full.orderBook))
+        self.assertLessEqual(len(windowed.askLimits), 5 + 2 * 2)
+        self.assertGreater(len(windowed.farOrders), 0)
+        self.assertGreater(windowed.promotions, 0)
+        self.assertGreater(windowed.demotions, 0)
+
+    def testPromotedQueueKeepsArrivalOrder(self):
+        windowed = WindowedOrderBook(window=1, slack=1)
+        for sequence, (iden, price) in enumerate((("a", 100), ("b", 101), ("c", 102), ("d", 102), ("e", 103)), 1):
+            windowed.processMessage(Order(OPEN, iden, price, 1, 0, sequence))
+        self.assertIn("c", windowed.farOrders)
+        windowed.processMessage(Order(DONE, "a", 100, 0, 0, 6))
+        windowed.processMessage(Order(DONE, "b", 101, 0, 0, 7))
+        limit = windowed.askLimits[102]
+        self.assertEqual((limit.head.id, limit.tail.id, limit.order_count), ("c", "d", 2))
+        self.assertEqual(windowed.best_ask(), 102)
+
+    def testSnapshotRoundTrip(self):
+        windowed = WindowedOrderBook(window=3, slack=1)
+        full = OrderBook()
+        for order in randomOrders(3000, seed=5):
+            windowed.processMessage(order)
+            full.processMessage(order)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.ckpt")
+            windowed.save_snapshot(path)
+            restored = WindowedOrderBook(window=3, slack=1)
+            restored.load_snapshot(path)
+            reference = OrderBook()
+            reference.load_snapshot(path)
+        self.assertEqual(reference.depth(100), full.depth(100))
+        self.assertEqual(restored.depth(100), full.depth(100))
+        self.assertEqual(len(restored.buyLimits), 4)
+        self.assertEqual(restored.orderCount(), len(full.orderBook))
+
+    def testCheckpointerKeepsFarOrders(self):
+        windowed = WindowedOrderBook(window=3, slack=1)
+        for order in randomOrders(3000, seed=7):
+            windowed.processMessage(order)
+        self.assertGreater(len(windowed.farOrders), 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.ckpt")
+            for useFork in ((True, False) if hasattr(os, "fork") else (False,)):
+                checkpointer = Checkpointer(windowed, path, useFork=useFork)
+                checkpointer.checkpoint()
+                checkpointer.wait()
+                restored = OrderBook()
+                restored.load_snapshot(path)
+                self.assertEqual(restored.orderCount(), windowed.orderCount())
+                self.assertEqual(restored.depth(100), windowed.depth(100))
+
+    def testL2DiffWithinWindow(self):
+        windowed = WindowedOrderBook(window=5, slack=2)
+        full = OrderBook()
+        levels = {0: {}, 1: {}}
+
+        def apply(update):
+            if update.reset:
+                levels[0].clear()
+                levels[1].clear()
+            for side, price, size in update.deltas:
+                if size == 0:
+                    levels[side].pop(price, None)
+                else:
+                    levels[side][price] = size
+
+        L2DiffStream(windowed, depth=5).subscribe(apply)
+        for order in randomOrders(5000, seed=9):
+            windowed.processMessage(order)
+            full.processMessage(order)
+            bids, asks = full.depth(5)
+            self.assertEqual(levels[1], {p: s for p, s, _ in bids})
+            self.assertEqual(levels[0], {p: s for p, s, _ in asks})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,426 @@
+from functools import partial
+from sortedcontainers import SortedDict
+"""
+Array backed tick ladder, an alternative book engine to the SortedDict sides
+
+Structure:
+    A TickLadder is one side of an OrderBook. It is a dict of price : Limit like the
+    SortedDict it replaces, so get, [] and in stay plain dict lookups, and it keeps the
+    levels ordered by price with a ladder instead of a sorted key list:
+        slots: a list of width entries, slot i holds the level whose price is
+               (low + i) ticks, or None. Inserting or removing a level inside the
+               window is a list store instead of a bisect and insert into a sorted list.
+        first, last: the indexes of the lowest and highest occupied slots, the best ask
+               is slots[first] and the best bid is slots[last], so peekitem(0) and
+               peekitem(-1) never search.
+        below, above: SortedDicts holding the levels outside the window, deep levels and
+               anything far from the touch.
+
+    The window follows the touch. When a level is added outside the window within a
+    quarter of the window of the best price (or better than it), the ladder recentres so
+    the best price sits a quarter of the window in from its edge, leaving three quarters
+    for depth. When the last level inside the window goes away the ladder recentres on
+    the best level left in the overflow. Recentring moves O(width) levels, the touch has
+    to travel at least a quarter of the window between two of them.
+
+    Prices must lie on the tick grid: the slot of a price is round(price / tick), two
+    prices that share a slot raise ValueError. With a ProductSpec the tick is spec.tick
+    in price units and every slot computation is exact, for float books it is the quote
+    increment as a float.
+
+    values(), keys() and items() return views that can be iterated in both directions
+    and sliced like the SortedDict views, which is all the book, L2Diff and Checkpoint use.
+"""
+
+DEFAULT_WIDTH = 4096
+
+class TickLadder(dict):
+    """
+    One side of an order book as a sorted mapping of price : Limit backed by a tick array
+
+    Attributes:
+        tick: the price increment of one slot, in book price units
+        width: the number of slots in the window
+        buy: True for the buy side, whose touch is the highest price, False for the sell
+             side, whose touch is the lowest
+        low: the tick number (round(price / tick)) of slot 0
+        slots: the level of each slot, None when the slot is empty
+        prices: the price of each occupied slot
+        first: the index of the lowest occupied slot, width when the window is empty
+        last: the index of the highest occupied slot, -1 when the window is empty
+        count: the number of occupied slots
+        below: the levels priced under the window as a SortedDict
+        above: the levels priced over the window as a SortedDict
+        recentres: the number of times the window was moved
+    """
+    def __init__(self, tick, width=DEFAULT_WIDTH, buy=False):
+        super().__init__()
+        if tick <= 0 or width < 4:
+            raise ValueError("a tick ladder needs a positive tick and a width of at least 4")
+        self.tick = tick
+        self.width = width
+        self.buy = buy
+        self.low = 0
+        self.slots = [None] * width
+        self.prices = [None] * width
+        self.first = width
+        self.last = -1
+        self.count = 0
+        self.below = SortedDict()
+        self.above = SortedDict()
+        self.recentres = 0
+
+    def __setitem__(self, price, value):
+        index = round(price / self.tick) - self.low
+        if 0 <= index < self.width:
+            self._place(index, price, value)
+            dict.__setitem__(self, price, value)
+            return
+
+        if price in self:
+            # replace the value of a level in the overflow
+            dict.__setitem__(self, price, value)
+            (self.below if index < 0 else self.above)[price] = value
+            return
+
+        # a new level outside the window, recentre when it is better than the touch or
+        # within a quarter of the window of it
+        number = index + self.low
+        if not self:
+            self._recentre(number)
+        else:
+            best = round(self.peekitem(-1 if self.buy else 0)[0] / self.tick)
+            distance = best - number if self.buy else number - best
+            if distance < self.width // 4:
+                self._recentre(number if distance < 0 else best)
+        index = number - self.low
+        if 0 <= index < self.width:
+            self._place(index, price, value)
+        else:
+            (self.below if index < 0 else self.above)[price] = value
+        dict.__setitem__(self, price, value)
+
+    def _place(self, index, price, value):
+        # stores a level in a slot of the window
+        slots = self.slots
+        current = slots[index]
+        if current is not None:
+            if self.prices[index] != price:
+                raise ValueError(f"prices {self.prices[index]} and {price} share a slot, they are not on a tick grid of {self.tick}")
+            slots[index] = value
+            return
+        slots[index] = value
+        self.prices[index] = price
+        self.count += 1
+        if index < self.first:
+            self.first = index
+        if index > self.last:
+            self.last = index
+
+    def __delitem__(self, price):
+        dict.__delitem__(self, price)
+        index = round(price / self.tick) - self.low
+        if 0 <= index < self.width and self.prices[index] == price:
+            slots = self.slots
+            slots[index] = None
+            self.prices[index] = None
+            self.count -= 1
+            if self.count == 0:
+                self.first = self.width
+                self.last = -1
+                # the window is empty, move it to the best level left
+                if self:
+                    self._recentre(round(self.peekitem(-1 if self.buy else 0)[0] / self.tick))
+                return
+            # walk to the next occupied slot, near the touch the gaps are short
+            if index == self.first:
+                while slots[index] is None:
+                    index += 1
+                self.first = index
+            elif index == self.last:
+                while slots[index] is None:
+                    index -= 1
+                self.last = index
+        elif index < 0:
+            del self.below[price]
+        else:
+            del self.above[price]
+
+    def _recentre(self, touch):
+        # moves the window so the touch tick sits a quarter of the width in from the edge
+        # on the touch side, levels leaving the window go to the overflow and levels
+        # entering it are taken out of the overflow
+        width = self.width
+        tick = self.tick
+        levels = [(self.prices[index], self.slots[index]) for index in range(self.first, self.last + 1)
+                  if self.slots[index] is not None]
+        self.low = touch - (width - 1 - width // 4 if self.buy else width // 4)
+        self.slots = [None] * width
+        self.prices = [None] * width
+        self.first = width
+        self.last = -1
+        self.count = 0
+        self.recentres += 1
+
+        lowPrice = (self.low - 0.5) * tick
+        highPrice = (self.low + width - 0.5) * tick
+        below = self.below
+        above = self.above
+        below.update((price, value) for price, value in levels if price < lowPrice)
+        above.update((price, value) for price, value in levels if price > highPrice)
+        levels = [(price, value) for price, value in levels if lowPrice < price < highPrice]
+        levels += [(price, below.pop(price)) for price in list(below.irange(minimum=lowPrice))]
+        levels += [(price, above.pop(price)) for price in list(above.irange(maximum=highPrice))]
+        for price, value in levels:
+            self._place(round(price / tick) - self.low, price, value)
+
+    def peekitem(self, index=-1):
+        """
+        returns the (price, level) at an index of the price order, 0 is the lowest price
+        and -1 the highest, both without a search
+
+        :param index: the position in price order
+        :raises IndexError: if the ladder is empty or the index is out of range
+        """
+        if index == 0:
+            if self.below:
+                return self.below.peekitem(0)
+            if self.count:
+                return self.prices[self.first], self.slots[self.first]
+            if self.above:
+                return self.above.peekitem(0)
+            raise IndexError("peekitem on an empty ladder")
+        if index == -1:
+            if self.above:
+                return self.above.peekitem(-1)
+            if self.count:
+                return self.prices[self.last], self.slots[self.last]
+            if self.below:
+                return self.below.peekitem(-1)
+            raise IndexError("peekitem on an empty ladder")
+        return self.items()[index]
+
+    def clear(self):
+        """
+        removes every level, the window is placed again by the next insert
+        """
+        dict.clear(self)
+        self.slots = [None] * self.width
+        self.prices = [None] * self.width
+        self.first = self.width
+        self.last = -1
+        self.count = 0
+        self.below.clear()
+        self.above.clear()
+
+    def update(self, *args, **kwargs):
+        """
+        adds every price : level of a mapping or iterable of pairs, an empty ladder places
+        its window around the best of the new prices once instead of following them
+
+        :param args: a mapping or an iterable of (price, level)
+        :param kwargs: not supported for numeric prices, accepted for dict compatibility
+        """
+        levels = dict(*args, **kwargs)
+        if not levels:
+            return
+        if not self:
+            touch = max(levels) if self.buy else min(levels)
+            self._recentre(round(touch / self.tick))
+        for price, value in levels.items():
+            self[price] = value
+
+    def pop(self, price, *default):
+        """
+        removes a level and returns it
+
+        :param price: the price of the level
+        :param default: returned when the price is missing, KeyError is raised without it
+        """
+        if price not in self:
+            if default:
+                return default[0]
+            raise KeyError(price)
+        value = self[price]
+        del self[price]
+        return value
+
+    def popitem(self, index=-1):
+        """
+        removes and returns the (price, level) at an index of the price order
+
+        :param index: the position in price order
+        """
+        price, value = self.peekitem(index)
+        del self[price]
+        return price, value
+
+    def setdefault(self, price, default=None):
+        """
+        returns the level at a price, adding default first when it is missing
+
+        :param price: the price of the level
+        :param default: the level to add
+        """
+        if price not in self:
+            self[price] = default
+        return self[price]
+
+    def __iter__(self):
+        return (price for price, _ in self._forward())
+
+    def __reversed__(self):
+        return (price for price, _ in self._backward())
+
+    def keys(self):
+        return LadderView(self, 0)
+
+    def values(self):
+        return LadderView(self, 1)
+
+    def items(self):
+        return LadderView(self, 2)
+
+    def _forward(self):
+        # yields (price, level) in ascending price order
+        yield from self.below.items()
+        slots = self.slots
+        prices = self.prices
+        for index in range(self.first, self.last + 1):
+            value = slots[index]
+            if value is not None:
+                yield prices[index], value
+        yield from self.above.items()
+
+    def _backward(self):
+        # yields (price, level) in descending price order
+        above = self.above
+        for price in reversed(above):
+            yield price, above[price]
+        slots = self.slots
+        prices = self.prices
+        for index in range(self.last, self.first - 1, -1):
+            value = slots[index]
+            if value is not None:
+                yield prices[index], value
+        below = self.below
+        for price in reversed(below):
+            yield price, below[price]
+
+    def _collect(self, need, ascending, kind):
+        # returns the first need prices (kind 0), levels (kind 1) or (price, level) pairs
+        # (kind 2) from the low end, or from the high end when not ascending, only the
+        # levels returned are visited
+        near, far = (self.below, self.above) if ascending else (self.above, self.below)
+        picked = overflowEntries(near, need, ascending, kind) if near else []
+        if len(picked) < need and self.count:
+            slots = self.slots
+            prices = self.prices
+            if ascending:
+                index, end, step = self.first, self.last + 1, 1
+            else:
+                index, end, step = self.last, self.first - 1, -1
+            append = picked.append
+            left = need - len(picked)
+            while index != end:
+                value = slots[index]
+                if value is not None:
+                    append(value if kind == 1 else prices[index] if kind == 0 else (prices[index], value))
+                    left -= 1
+                    if not left:
+                        break
+                index += step
+        if len(picked) < need and far:
+            picked += overflowEntries(far, need - len(picked), ascending, kind)
+        return picked
+
+    def __repr__(self):
+        return f"TickLadder({self.tick!r}, {dict(self.items())!r})"
+
+def overflowEntries(overflow, need, ascending, kind):
+    """
+    returns up to need entries of an overflow SortedDict from its low end, or from its high
+    end when not ascending, as prices (kind 0), levels (kind 1) or (price, level) pairs (kind 2)
+    """
+    prices = overflow.keys()[:need] if ascending else overflow.keys()[-need:][::-1]
+    if kind == 0:
+        return prices
+    if kind == 1:
+        return [overflow[price] for price in prices]
+    return [(price, overflow[price]) for price in prices]
+
+class LadderView:
+    """
+    Price ordered view of the keys, values or items of a TickLadder, slices from either
+    end only walk the levels they return
+
+    Attributes:
+        ladder: the TickLadder
+        kind: 0 for prices, 1 for levels, 2 for (price, level) pairs
+    """
+    __slots__ = ("ladder", "kind")
+
+    def __init__(self, ladder, kind):
+        self.ladder = ladder
+        self.kind = kind
+
+    def _pick(self, pairs):
+        if self.kind == 2:
+            return pairs
+        kind = self.kind
+        return (pair[kind] for pair in pairs)
+
+    def __len__(self):
+        return len(self.ladder)
+
+    def __iter__(self):
+        return self._pick(self.ladder._forward())
+
+    def __reversed__(self):
+        return self._pick(self.ladder._backward())
+
+    def __getitem__(self, index):
+        size = len(self.ladder)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            if step != 1:
+                return list(self)[index]
+            if stop <= start:
+                return []
+            if start < size - stop:
+                # closer to the low end
+                return self.ladder._collect(stop, True, self.kind)[start:]
+            picked = self.ladder._collect(size - start, False, self.kind)[size - stop:]
+            picked.reverse()
+            return picked
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("ladder index out of range")
+        return self[index:index + 1][0]
+
+def ladderSide(tick, width, buy):
+    """
+    returns an empty TickLadder side, the engine ladderEngine binds tick and width to
+
+    :param tick: the price increment in book price units
+    :param width: the number of slots of the window
+    :param buy: True for the buy side
+    """
+    return TickLadder(tick, width, buy)
+
+def ladderEngine(tick=None, width=DEFAULT_WIDTH, spec=None):
+    """
+    returns a book engine that builds TickLadder sides, pass it to OrderBook as engine,
+    the engine pickles so it can be handed to shard workers (see Sharding.py)
+
+    :param tick: the price increment in book price units, e.g. 0.01 for a float book
+    :param width: the number of slots of each side's window
+    :param spec: the ProductSpec of a fixed-point book, its tick is used when tick is omitted
+    :raises ValueError: if neither a tick nor a spec is given
+    """
+    if tick is None:
+        if spec is None:
+            raise ValueError("a tick ladder needs a tick or a ProductSpec")
+        tick = spec.tick
+    return partial(ladderSide, tick, width)
@@ -0,0 +1,379 @@
+import time
+from array import array
+from collections import deque, namedtuple
+from OrderBook import MATCH
+"""
+Streaming trade tape and OHLCV bars built from match messages
+
+Structure:
+    A TradeTape records the match messages of a product. tap() wraps the callable the
+    Sequencer delivers to, so the tape sees every match in sequence order including the
+    ones a Bootstrapper buffers and then drops as older than its snapshot, the trade
+    history has no holes around a bootstrap or a resync. attach() instead wraps the match
+    handler of an OrderBook and only records the matches the book applies, for books fed
+    directly. Nothing is allocated per trade:
+        ring buffer: the last capacity trades are kept in preallocated arrays of prices,
+            sizes, times, sequences and maker sides (1 buy, 0 sell), a new trade overwrites
+            the oldest one
+        rolling windows: for each configured span (e.g. 60 s) running sums of volume,
+            notional and count, trades that fall out of the span are subtracted when the
+            next trade arrives by walking the ring from the window's oldest trade, so every
+            trade is added and removed once per window
+        bars: for each configured interval the open, high, low, close, volume, count and
+            notional of the current bar, a trade past the end of the bar closes it into a
+            bounded deque of completed Bars, intervals without trades have no bar
+    Recording a trade is O(windows + intervals), independent of the number of trades kept.
+
+    Times are the match message times in seconds since the epoch (Order.time), trades
+    without one (e.g. replayed from an event log) are stamped with the wall clock. Windows
+    and bars follow the trade times, so a window's sums cover the span ending at the last
+    trade unless a query passes a later now. In fixed-point mode prices and sizes are the
+    book's scaled integers, vwap() is then in price units.
+"""
+
+# a completed or current OHLCV bar, start is the bar's start time in seconds since the epoch
+Bar = namedtuple("Bar", ["start", "open", "high", "low", "close", "volume", "count", "vwap"])
+
+# a trade read back from the ring, side is the maker side (1 buy, 0 sell)
+Trade = namedtuple("Trade", ["sequence", "time", "price", "size", "side"])
+
+# the sums of a rolling window
+WindowStats = namedtuple("WindowStats", ["seconds", "volume", "notional", "count", "vwap"])
+
+class RollingWindow:
+    """
+    Running sums of the trades in the last seconds of the tape
+
+    Attributes:
+        seconds: the span of the window
+        oldest: the tape index of the oldest trade in the window
+        volume: the summed size of the trades in the window
+        notional: the summed price * size of the trades in the window
+        count: the number of trades in the window
+    """
+    __slots__ = ("seconds", "oldest", "volume", "notional", "count")
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.oldest = 0
+        self.volume = 0
+        self.notional = 0
+        self.count = 0
+
+    def stats(self):
+        """
+        returns the window's sums as WindowStats, vwap is None for an empty window
+        """
+        return WindowStats(self.seconds, self.volume, self.notional, self.count,
+                           self.notional / self.volume if self.volume else None)
+
+class BarBuilder:
+    """
+    Builds OHLCV bars of one interval
+
+    Attributes:
+        interval: the bar length in seconds
+        bars: the completed bars, oldest first, bounded to maxBars
+        start: the start time of the current bar, None before the first trade
+        open, high, low, close: the prices of the current bar
+        volume: the summed size of the current bar
+        count: the number of trades in the current bar
+        notional: the summed price * size of the current bar
+    """
+    __slots__ = ("interval", "bars", "start", "open", "high", "low", "close", "volume", "count", "notional")
+
+    def __init__(self, interval, maxBars):
+        self.interval = interval
+        self.bars = deque(maxlen=maxBars)
+        self.start = None
+
+    def add(self, timestamp, price, size):
+        """
+        adds a trade to the current bar, closing it first when the trade is past its end
+
+        :param timestamp: the trade time in seconds since the epoch
+        :param price: the trade price
+        :param size: the trade size
+        """
+        start = self.start
+        if start is None or timestamp >= start + self.interval:
+            if start is not None:
+                self.bars.append(self.current())
+            self.start = timestamp - timestamp % self.interval
+            self.open = self.high = self.low = self.close = price
+            self.volume = size
+            self.count = 1
+            self.notional = price * size
+            return
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += size
+        self.count += 1
+        self.notional += price * size
+
+    def current(self):
+        """
+        returns the current, still open, bar or None before the first trade
+        """
+        if self.start is None:
+            return None
+        return Bar(self.start, self.open, self.high, self.low, self.close, self.volume, self.count,
+                   self.notional / self.volume if self.volume else None)
+
+class TradeTape:
+    """
+    Ring buffer of recent trades with rolling windows and OHLCV bars
+
+    Attributes:
+        capacity: the number of trades kept in the ring
+        prices, sizes, times, sequences, sides: the ring arrays, trade i is at i % capacity
+        total: the number of trades recorded, the index of the next trade
+        windows: the RollingWindow of each span as seconds : RollingWindow
+        bars: the BarBuilder of each interval as seconds : BarBuilder
+        windowList, barList: the same windows and builders as tuples for the record loop
+        book: the OrderBook the tape is attached to, None when detached
+        bookHandler: the book's own match handler, called after each trade is recorded
+        lastSequence: the sequence of the last match recorded through recordOrder()
+    """
+    def __init__(self, capacity=65536, windows=(60.0, 300.0), intervals=(60.0,), maxBars=1440, spec=None):
+        if capacity < 1:
+            raise ValueError("the trade tape needs a capacity of at least one trade")
+        # fixed-point books trade in scaled integers
+        typecode = "d" if spec is None else "q"
+        self.capacity = capacity
+        self.prices = array(typecode, [0]) * capacity
+        self.sizes = array(typecode, [0]) * capacity
+        self.times = array("d", [0.0]) * capacity
+        self.sequences = array("q", [0]) * capacity
+        self.sides = array("b", [0]) * capacity
+        self.total = 0
+        self.windows = {seconds: RollingWindow(seconds) for seconds in windows}
+        self.bars = {interval: BarBuilder(interval, maxBars) for interval in intervals}
+        self.windowList = tuple(self.windows.values())
+        self.barList = tuple(self.bars.values())
+        self.book = None
+        self.bookHandler = None
+        self.lastSequence = -1
+
+    def recordOrder(self, order):
+        """
+        records a parsed message if it is a match, other messages and matches already
+        recorded (replayed or repeated sequences) are ignored
+
+        :param order: the parsed message, None is accepted so the parser output can be passed directly
+        """
+        if order is not None and order.type == MATCH and order.sequence > self.lastSequence:
+            self.lastSequence = order.sequence
+            self.record(order.price, order.quantity, order.side, order.time, order.sequence)
+
+    def tap(self, deliver):
+        """
+        returns a callable that records each match it is given and then passes every
+        message on to deliver, meant to sit between a Sequencer and the book or Bootstrapper
+
+        :param deliver: the callable the messages are passed on to
+        """
+        recordOrder = self.recordOrder
+
+        def onMessage(order):
+            recordOrder(order)
+            deliver(order)
+        return onMessage
+
+    def attach(self, book):
+        """
+        records every match the book applies from now on
+
+        :param book: the OrderBook whose trades are recorded
+        """
+        if self.book is not None:
+            raise ValueError("the trade tape is already attached to a book")
+        self.book = book
+        self.bookHandler = handler = book.handlers[MATCH]
+        record = self.record
+
+        def onMatch(order, side):
+            record(order.price, order.quantity, order.side, order.time, order.sequence)
+            handler(order, side)
+        book.handlers[MATCH] = onMatch
+
+    def detach(self):
+        """
+        gives the book its own match handler back
+        """
+        if self.book is not None:
+            self.book.handlers[MATCH] = self.bookHandler
+            self.book = self.bookHandler = None
+
+    def record(self, price, size, side, timestamp=None, sequence=0):
+        """
+        records a trade
+
+        :param price: the trade price in book units
+        :param size: the trade size in book units
+        :param side: the maker side, 1 for buy and 0 for sell
+        :param timestamp: the trade time in seconds since the epoch, None for the wall clock
+        :param sequence: the sequence number of the match message
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        capacity = self.capacity
+        index = self.total
+        slot = index % capacity
+
+        # the trade being overwritten leaves every window still holding it
+        if index >= capacity:
+            evicted = index - capacity
+            for window in self.windowList:
+                if window.count and window.oldest == evicted:
+                    self._expire(window, None, evicted + 1)
+
+        self.prices[slot] = price
+        self.sizes[slot] = size
+        self.times[slot] = timestamp
+        self.sequences[slot] = sequence
+        self.sides[slot] = side
+        self.total = index + 1
+
+        notional = price * size
+        times = self.times
+        for window in self.windowList:
+            if not window.count:
+                window.oldest = index
+            window.volume += size
+            window.notional += notional
+            window.count += 1
+            cutoff = timestamp - window.seconds
+            if times[window.oldest % capacity] <= cutoff:
+                self._expire(window, cutoff)
+        for bars in self.barList:
+            bars.add(timestamp, price, size)
+
+    def _expire(self, window, cutoff, limit=None):
+        # removes the window's oldest trades while they are at or before cutoff, or the
+        # trades before the tape index limit when one is given
+        capacity = self.capacity
+        times = self.times
+        prices = self.prices
+        sizes = self.sizes
+        oldest = window.oldest
+        while window.count:
+            slot = oldest % capacity
+            if oldest >= limit if limit is not None else times[slot] > cutoff:
+                break
+            size = sizes[slot]
+            window.volume -= size
+            window.notional -= prices[slot] * size
+            window.count -= 1
+            oldest += 1
+        window.oldest = oldest
+        if not window.count:
+            # start again from clean sums instead of accumulated float error
+            window.volume = 0
+            window.notional = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def window(self, seconds, now=None):
+        """
+        returns the WindowStats of a configured rolling window
+
+        :param seconds: the span of the window, one of the windows the tape was created with
+        :param now: optional current time, trades at or before now - seconds are dropped first
+        """
+        window = self.windows[seconds]
+        if now is not None:
+            self._expire(window, now - seconds)
+        return window.stats()
+
+    def vwap(self, seconds, now=None):
+        """
+        returns the volume weighted average price of a configured window, None when empty
+
+        :param seconds: the span of the window
+        :param now: optional current time
+        """
+        return self.window(seconds, now).vwap
+
+    def volume(self, seconds, now=None):
+        """
+        returns the traded size of a configured window
+
+        :param seconds: the span of the window
+        :param now: optional current time
+        """
+        return self.window(seconds, now).volume
+
+    def tradeCount(self, seconds, now=None):
+        """
+        returns the number of trades of a configured window
+
+        :param seconds: the span of the window
+        :param now: optional current time
+        """
+        return self.window(seconds, now).count
+
+    def trade(self, index):
+        """
+        returns a trade still in the ring as a Trade
+
+        :param index: the tape index, negative values count back from the last trade
+        :raises IndexError: if the trade is not in the ring
+        """
+        if index < 0:
+            index += self.total
+        if not self.total - len(self) <= index < self.total:
+            raise IndexError("trade is not in the ring")
+        slot = index % self.capacity
+        return Trade(self.sequences[slot], self.times[slot], self.prices[slot], self.sizes[slot], self.sides[slot])
+
+    def last(self):
+        """
+        returns the last trade as a Trade, None before the first trade
+        """
+        return self.trade(-1) if self.total else None
+
+    def recent(self, n):
+        """
+        returns up to the last n trades as Trades, oldest first
+
+        :param n: the number of trades
+        """
+        n = min(n, len(self))
+        return [self.trade(index) for index in range(self.total - n, self.total)]
+
+    def since(self, timestamp):
+        """
+        returns the trades in the ring after a time as Trades, oldest first, found by a
+        binary search over the ring's times
+
+        :param timestamp: seconds since the epoch
+        """
+        low, high = self.total - len(self), self.total
+        capacity = self.capacity
+        times = self.times
+        while low < high:
+            middle = (low + high) // 2
+            if times[middle % capacity] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return [self.trade(index) for index in range(low, self.total)]
+
+    def ohlcv(self, interval, n=None, current=True):
+        """
+        returns the bars of a configured interval, oldest first
+
+        :param interval: the bar length in seconds, one of the intervals the tape was created with
+        :param n: optional maximum number of bars, the most recent are kept
+        :param current: True to include the current, still open, bar
+        """
+        builder = self.bars[interval]
+        bars = list(builder.bars)
+        if current and builder.start is not None:
+            bars.append(builder.current())
+        return bars[-n:] if n is not None else bars
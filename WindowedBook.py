@@ -0,0 +1,276 @@
+from OrderBook import OrderBook, RestingOrder, Limit, sortedSide
+from Checkpoint import captureEntries
+from sortedcontainers import SortedDict
+"""
+Depth windowed order book that keeps full order queues only near the touch
+
+Structure:
+    A WindowedOrderBook is an OrderBook whose sides only hold the best levels as Limits
+    with their FIFO queue of RestingOrder nodes. Every level behind them is a far level:
+        farLevels: per side (0 sell, 1 buy) a SortedDict of price : [price, total_size, orders, side],
+                   orders is a dict of id : size in arrival order
+        farOrders: id : the far level the order rests at
+    A far order costs two dict entries instead of a RestingOrder node, an orderBook entry
+    and its share of a Limit, and far levels have no linked queue to maintain.
+
+    The number of full levels per side moves between window and window + 2 * slack:
+        an open priced behind the deepest full level goes to the far levels once the side
+        has window full levels
+        when a side drops under window full levels the best far levels are promoted
+        until it has window + slack, their queues are rebuilt in arrival order from the
+        levels' orders, so a promotion only touches the orders it moves
+        when a side grows over window + 2 * slack full levels the deepest are demoted
+        until it has window + slack
+    so promotions and demotions happen in batches and the touch can move slack levels in
+    either direction before the next one.
+
+    best_bid, best_ask, spread, mid and depth(n) give the same answers as a full book,
+    depth(n) reads the far level aggregates once n goes past the full levels. depthArrays,
+    snapshot and L2Diff see the full levels only: an L2DiffStream on a windowed book
+    should use a depth of at most window, level changes behind the full levels are not
+    logged and promoted (demoted) levels are logged as appearing (disappearing).
+    snapshotEntries (and so save_snapshot and the Checkpointer) includes every order, far
+    ones included, and bulkLoad splits a snapshot into full and far levels.
+
+Memory:
+    The saving is well short of an order of magnitude. A far order still keeps its id, its
+    size and two dict entries, only the RestingOrder node, its orderBook entry and the
+    queue links go. With 200000 orders over 2000 levels per side and a window of 50,
+    WindowBenchmark.py measures about 185 bytes per order against 254 for a full book
+    (27% less), and 170 bytes (33% less) when internIds turns the UUIDs into integers.
+"""
+
+class WindowedOrderBook(OrderBook):
+    """
+    OrderBook that keeps full FIFO queues for the top levels of each side and only
+    aggregates plus a compact record per order for the levels behind them
+
+    Attributes:
+        window: the minimum number of full levels per side, as long as the side has them
+        slack: the number of levels promoted or demoted beyond window at once
+        farOrders: the far level of every order resting at one as id : level
+        farLevels: the far levels of each side (0 sell, 1 buy) as price : [price, total_size, orders, side]
+        promotions: the number of far levels turned into full levels
+        demotions: the number of full levels turned into far levels
+    """
+    def __init__(self, spec=None, window=50, engine=sortedSide, slack=None):
+        if window < 1:
+            raise ValueError("the depth window needs at least one level")
+        super().__init__(spec, engine)
+        self.window = window
+        self.slack = slack if slack is not None else max(1, window // 2)
+        self.farOrders = {}
+        self.farLevels = (SortedDict(), SortedDict())
+        self.promotions = 0
+        self.demotions = 0
+
+    def orderCount(self):
+        """
+        returns the number of resting orders, far ones included
+        """
+        return len(self.orderBook) + len(self.farOrders)
+
+    def addOrder(self, order, side):
+        """
+        processes an order of type "open", it is queued at its price when the price is
+        within the full levels and recorded as a far order otherwise
+
+        :param order: the open order object
+        :param side: reference to the side of the order (buy or ask)
+        """
+        buy = side is self.buyLimits
+        price = order.price
+        # far levels are always behind the deepest full level, and there are only far
+        # levels once the side has window full levels
+        if len(side) >= self.window and price not in side:
+            deepest = side.peekitem(0 if buy else -1)[0]
+            if price < deepest if buy else price > deepest:
+                self.addFar(order.id, price, order.quantity, buy)
+                return
+        super().addOrder(order, side)
+        if len(side) > self.window + 2 * self.slack:
+            self.demote(side, buy)
+
+    def addFar(self, iden, price, size, buy):
+        """
+        records an order resting at a far level
+
+        :param iden: the order id
+        :param price: the price of the order
+        :param size: the remaining size of the order
+        :param buy: 1 for the buy side, 0 for the sell side
+        """
+        levels = self.farLevels[buy]
+        level = levels.get(price)
+        if level is None:
+            level = levels[price] = [price, 0, {}, 1 if buy else 0]
+        level[1] += size
+        level[2][iden] = size
+        self.farOrders[iden] = level
+
+    def removeFar(self, iden):
+        """
+        forgets a far order and takes it out of its level aggregates
+
+        :param iden: the order id
+        :return: the (price, size, side) record of the order
+        """
+        level = self.farOrders.pop(iden)
+        price, _, orders, buy = level
+        size = orders.pop(iden)
+        if orders:
+            level[1] -= size
+        else:
+            del self.farLevels[buy][price]
+        return price, size, buy
+
+    def removeOrder(self, order, side):
+        if order.id in self.farOrders:
+            self.removeFar(order.id)
+        else:
+            super().removeOrder(order, side)
+
+    def matchOrder(self, order, side):
+        level = self.farOrders.get(order.id)
+        if level is None:
+            super().matchOrder(order, side)
+            return
+        orders = level[2]
+        size = orders[order.id]
+        if size - order.quantity <= 0:
+            self.removeFar(order.id)
+        else:
+            # assigning keeps the order's place in the level
+            orders[order.id] = size - order.quantity
+            level[1] -= order.quantity
+
+    def changeOrder(self, order, side):
+        if order.id in self.farOrders:
+            # the order loses its place, it is queued again wherever its new price belongs
+            self.removeFar(order.id)
+            self.addOrder(order, side)
+        else:
+            super().changeOrder(order, side)
+
+    def unlinkOrder(self, resting, side):
+        super().unlinkOrder(resting, side)
+        if len(side) < self.window:
+            buy = side is self.buyLimits
+            if self.farLevels[buy]:
+                self.promote(side, buy)
+
+    def promote(self, side, buy):
+        """
+        turns the best far levels of a side into full levels until the side has
+        window + slack of them, their queues are rebuilt in arrival order
+
+        :param side: reference to the side (buy or ask)
+        :param buy: True for the buy side
+        """
+        levels = self.farLevels[buy]
+        need = self.window + self.slack - len(side)
+        chosen = levels.keys()[-need:] if buy else levels.keys()[:need]
+        buy = 1 if buy else 0
+        farOrders = self.farOrders
+        orderBook = self.orderBook
+        promoted = 0
+
+        for price in chosen:
+            price, total, orders, _ = levels.pop(price)
+            limit = Limit(price)
+            previous = None
+            for iden, size in orders.items():
+                del farOrders[iden]
+                resting = RestingOrder(iden, price, size, limit)
+                if previous is None:
+                    limit.head = resting
+                else:
+                    resting.prev = previous
+                    previous.next = resting
+                previous = resting
+                orderBook[iden] = resting
+            limit.tail = previous
+            limit.total_size = total
+            limit.order_count = len(orders)
+            side[price] = limit
+            if self.levelLog is not None:
+                self.levelLog.append((buy, price, total))
+            promoted += 1
+        self.promotions += promoted
+
+    def demote(self, side, buy):
+        """
+        turns the deepest full levels of a side into far levels until the side has
+        window + slack of them
+
+        :param side: reference to the side (buy or ask)
+        :param buy: True for the buy side
+        """
+        orderBook = self.orderBook
+        while len(side) > self.window + self.slack:
+            price, limit = side.peekitem(0 if buy else -1)
+            resting = limit.head
+            while resting is not None:
+                del orderBook[resting.id]
+                self.addFar(resting.id, price, resting.quantity, buy)
+                resting = resting.next
+            del side[price]
+            if self.levelLog is not None:
+                self.levelLog.append((1 if buy else 0, price, 0))
+            self.demotions += 1
+
+    def bulkLoad(self, sequence, bids, asks):
+        """
+        replaces the contents of the book with a level 3 snapshot, the best window + slack
+        levels of each side are loaded as full levels and the rest as far levels
+
+        :param sequence: the sequence number the snapshot was taken at
+        :param bids: iterable of (price, size, id) on the buy side, in queue order within a price
+        :param asks: iterable of (price, size, id) on the sell side, in queue order within a price
+        """
+        self.farOrders = {}
+        self.farLevels = (SortedDict(), SortedDict())
+        full = []
+        for buy, entries in ((1, bids), (0, asks)):
+            entries = list(entries)
+            prices = sorted({entry[0] for entry in entries}, reverse=bool(buy))
+            if len(prices) <= self.window + self.slack:
+                full.append(entries)
+                continue
+            edge = prices[self.window + self.slack - 1]
+            near = []
+            for entry in entries:
+                price, size, iden = entry
+                if price >= edge if buy else price <= edge:
+                    near.append(entry)
+                else:
+                    self.addFar(iden, price, size, buy)
+            full.append(near)
+        super().bulkLoad(sequence, full[0], full[1])
+
+    def snapshotEntries(self):
+        """
+        returns every order of the book as (bids, asks) lists of (price, size, id), far
+        orders included, so save_snapshot and the Checkpointer write them
+        """
+        bids, asks = captureEntries(self)
+        for entries, levels in ((bids, self.farLevels[1]), (asks, self.farLevels[0])):
+            for price, _, orders, _ in levels.values():
+                entries += [(price, size, iden) for iden, size in orders.items()]
+        return bids, asks
+
+    def depth(self, n):
+        """
+        returns the top n price levels of each side, the far level aggregates are used
+        once n goes past the full levels
+
+        :param n: the number of levels to return per side
+        :return: tuple of (bids, asks), each a list of (price, total_size, order_count) ordered best first
+        """
+        bids, asks = super().depth(n)
+        bidLevels, askLevels = self.farLevels[1], self.farLevels[0]
+        if len(bids) < n and bidLevels:
+            bids += [(price, total, len(orders)) for price, total, orders, _ in reversed(bidLevels.values()[-(n - len(bids)):])]
+        if len(asks) < n and askLevels:
+            asks += [(price, total, len(orders)) for price, total, orders, _ in askLevels.values()[:n - len(asks)]]
+        return bids, asks
@@ -1,5 +1,13 @@
-from MessageParser import MessageParser
-from OrderBook import OrderBook
+from BookManager import BookManager, checkpointPath
+from Checkpoint import Checkpointer
+from Publisher import BookPublisher, consoleSink
+from Sharding import ShardedBookManager
+from Bootstrap import RestSnapshotSource
+from Pipeline import FeedPipeline
+from Replay import FeedRecorder
+from Hub import BookHub
+from Metrics import Metrics, serveMetrics
+from TickLadder import ladderEngine
 import websockets
 import asyncio
 import json
@@ -7,19 +15,117 @@ import json
 # url to connect to the websocket
 socketURL = 'wss://ws-feed.exchange.coinbase.com'
 
-# create the orerbook and message parser
-ob = OrderBook()
-mp = MessageParser()
+# products to track over the one connection
+tickers = ["BTC-USD"]
+
+# set to a file path (e.g. "capture.bin.gz") to record every raw frame for replay, frames
+# are recorded as they are applied so an uncompressed capture's offset at a checkpoint
+# lets the next warm start skip straight to the frames after it
+capturePath = None
+
+# set to a directory to checkpoint the books every checkpointInterval seconds and to
+# warm start from those checkpoints (plus the capture, if any) on the next run
+checkpointDir = None
+checkpointInterval = 60.0
+
+# products whose books use the array backed tick ladder engine, product id : quote increment
+ladderTicks = {}
+
+# products whose books only keep full order queues for the top levels, product id : levels
+# per side, the orders behind them are kept as compact records (not with metricsPort), the
+# hub serves these books up to their window. This saves about a quarter of the book's
+# memory, see WindowedBook.py
+depthWindows = {}
+
+# set to True to keep a tape of each product's trades with rolling VWAP/volume windows
+# and one minute OHLCV bars, read through manager.products[ticker].trades
+tradeTape = False
+
+# set to a port to time parsing and book updates and serve the metrics for Prometheus
+metricsPort = None
+metrics = Metrics() if metricsPort is not None else None
+
+# set to a number of worker processes (0 for one per core) to spread the books over
+# processes, see Sharding.py. The books then live in the workers, so checkpoints, the
+# hub and the trade tapes' direct reads are not available and the console view is
+# printed from top of book queries
+shards = None
+
+# create the books, each product is bootstrapped from a level 3 snapshot
+engines = {ticker: ladderEngine(tick) for ticker, tick in ladderTicks.items()}
+if shards is None:
+    manager = BookManager(tickers, source=RestSnapshotSource(), metrics=metrics, engines=engines, windows=depthWindows,
+                          trades=tradeTape)
+else:
+    manager = ShardedBookManager(tickers, shards or None, source=RestSnapshotSource(), metrics=metrics, engines=engines,
+                                 windows=depthWindows, trades=tradeTape)
+checkpointers = []
+if checkpointDir and shards is None:
+    restored = manager.warmStart(checkpointDir, capturePath)
+    if restored:
+        print("warm started", ", ".join(restored))
+recorder = FeedRecorder(capturePath) if capturePath else None
+if checkpointDir and shards is None:
+    checkpointers = [
+        Checkpointer(manager.book(ticker), checkpointPath(checkpointDir, ticker), checkpointInterval,
+                     offset=None if recorder is None else recorder.offset)
+        for ticker in tickers
+    ]
+
+# print the top of each book at most once a second, off the message path
+publishers = []
+if shards is None:
+    for ticker in tickers:
+        publisher = BookPublisher(manager.book(ticker), depth=5, interval=1.0)
+        publisher.subscribe(lambda snapshot, ticker=ticker: (print(ticker), consoleSink(snapshot)))
+        publishers.append(publisher)
+
+# apply a batch of received frames to the books, then publish if due
+def processFrames(frames):
+    if recorder is not None:
+        for msgJson in frames:
+            recorder.record(msgJson)
+    for msgJson in frames:
+        manager.onFrame(msgJson)
+    for publisher in publishers:
+        publisher.poll()
+    for checkpointer in checkpointers:
+        checkpointer.poll()
+    if shards is not None:
+        # hand the batch to the workers now rather than once a shard's batch fills up
+        manager.flush()
+
+# in sharded mode print the top of each book once a second, the queries wait for the
+# workers without holding up the socket reads
+async def printShards():
+    while True:
+        await asyncio.sleep(1.0)
+        for ticker in tickers:
+            snapshot = await manager.topAsync(ticker, 5)
+            print(ticker)
+            consoleSink(snapshot)
+
+# set hubPort (TCP on hubHost) and/or hubPath (Unix socket) to serve snapshots and L2
+# updates of the books to local processes, see Hub.py
+hubHost = "127.0.0.1"
+hubPort = None
+hubPath = None
+hub = BookHub(manager) if shards is None and (hubPort is not None or hubPath is not None) else None
+
+# bounded queue between the socket reads and the book processing
+pipeline = FeedPipeline(processFrames, maxsize=100000, batchSize=512)
+if metrics is not None:
+    for name in ("depth", "dropped", "errors", "lastLag"):
+        metrics.gauge(f"orderbook_pipeline_{name}", f"feed pipeline {name}", lambda name=name: pipeline.metrics()[name])
+    if shards is None:
+        for ticker in tickers:
+            metrics.gauge("orderbook_frame_errors", "frames that failed to parse or apply",
+                          lambda ticker=ticker: manager.products[ticker].errors, product=ticker)
 
 # main event loop to subscribe to the websocks and recieve messages
-async def eventLoop(ticker = "BTC-USD"):
+async def eventLoop():
     async with websockets.connect(socketURL) as websocket:
-        subscriptionMessage = json.dumps(
-                { 
-                  "type": "subscribe", 
-                  "product_ids": [ticker],
-                  "channels": ["full"] 
-                })
+        subscriptionMessage = json.dumps(manager.subscription())
 
         # subscribe to orderbook
         await websocket.send(subscriptionMessage)
@@ -31,19 +137,27 @@ async def eventLoop(ticker = "BTC-USD"):
             print(confResp["reason"])
             return
 
-        # receive a message, parse it into an order, execute the order
-        while True:
-            msgJson = await websocket.recv()
-            msg = json.loads(msgJson)
-            order = mp(msg)
+        # buffer messages while the level 3 snapshots are fetched and loaded
+        manager.start()
+        if hub is not None:
+            await hub.start(hubHost, hubPort, hubPath)
+        if metrics is not None:
+            await serveMetrics(metrics, port=metricsPort)
+
+        if shards is not None:
+            printer = asyncio.get_running_loop().create_task(printShards())
 
-            # if we have a valid order
-            if order != None:
-                ob.processMessage(order)
+        # receive messages and queue them, the pipeline routes them to the book of their product
+        pipeline.start()
+        try:
+            while True:
+                await pipeline.put(await websocket.recv())
+        finally:
+            if recorder is not None:
+                recorder.close()
 
 if __name__ == "__main__":
     try:
         asyncio.run(eventLoop())
     except:
         print("Exiting Orderbook")
-        